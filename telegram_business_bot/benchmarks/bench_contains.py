@@ -0,0 +1,75 @@
+"""
+Бенчмарк поиска contains-триггеров: линейный перебор против Ахо-Корасик
+
+Для каждого размера набора триггеров сверяет результат автомата с
+линейным перебором (`trigger in message` по сценариям в порядке приоритета)
+и печатает среднее время поиска на одно сообщение.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_contains.py --sizes 10 1000 50000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import AhoCorasick  # noqa: E402
+
+ALPHABET = string.ascii_lowercase[:12] + 'абвгдеёжзий '
+
+
+def random_word(rng: random.Random, min_len: int, max_len: int) -> str:
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len))).strip() or 'a'
+
+
+def linear_first_match(patterns, message_lower):
+    for trigger_value, rank in patterns:
+        if trigger_value in message_lower:
+            return rank
+    return None
+
+
+def bench(func, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def run(sizes, messages_count: int, message_len: int, seed: int):
+    rng = random.Random(seed)
+    messages = [random_word(rng, message_len // 2, message_len) for _ in range(messages_count)]
+
+    print(f"{'triggers':>9} {'build, ms':>10} {'linear, us':>11} {'automaton, us':>14} {'speedup':>8}")
+    for size in sizes:
+        patterns = [(random_word(rng, 4, 12), rank) for rank in range(size)]
+
+        start = time.perf_counter()
+        automaton = AhoCorasick(patterns)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        for message in messages[:200]:
+            assert automaton.first_match(message) == linear_first_match(patterns, message), message
+
+        linear_us = bench(lambda m: linear_first_match(patterns, m), messages)
+        automaton_us = bench(automaton.first_match, messages)
+        print(f"{size:>9} {build_ms:>10.1f} {linear_us:>11.1f} {automaton_us:>14.1f} "
+              f"{linear_us / automaton_us:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--message-len', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    run(args.sizes, args.messages, args.message_len, args.seed)
+
+
+if __name__ == '__main__':
+    main()
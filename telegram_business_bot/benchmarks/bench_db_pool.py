@@ -0,0 +1,158 @@
+"""
+Бенчмарк: новое соединение на каждый вызов против пула соединений
+
+Сравнивает задержку горячих методов чтения и записи:
+- get_all_scenarios(active_only=True)
+- get_business_connection
+- add_reminder_history (и построчная запись через пул, и буфер отложенной записи)
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_db_pool.py --iterations 500 --scenarios 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+import aiosqlite  # noqa: E402
+
+from db import Database  # noqa: E402
+
+
+# Реализация "как было": aiosqlite.connect() на каждый вызов
+
+async def percall_get_all_scenarios(db_path: str):
+    async with aiosqlite.connect(db_path) as conn:
+        conn.row_factory = aiosqlite.Row
+        async with conn.execute(
+            "SELECT * FROM scenarios WHERE active = 1 ORDER BY created_at DESC"
+        ) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+
+async def percall_get_business_connection(db_path: str, business_connection_id: str):
+    async with aiosqlite.connect(db_path) as conn:
+        conn.row_factory = aiosqlite.Row
+        async with conn.execute(
+            "SELECT * FROM business_connections WHERE business_connection_id = ?",
+            (business_connection_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
+
+async def percall_add_reminder_history(db_path: str, scenario_id: int, chat_id: int, bc_id: str):
+    async with aiosqlite.connect(db_path) as conn:
+        await conn.execute(
+            "INSERT INTO reminder_history (scenario_id, chat_id, business_connection_id) VALUES (?, ?, ?)",
+            (scenario_id, chat_id, bc_id)
+        )
+        await conn.commit()
+
+
+async def pooled_add_reminder_history(database: Database, scenario_id: int, chat_id: int, bc_id: str):
+    """Построчная запись через пул - как до буфера отложенной записи"""
+    async with database.pool.write() as conn:
+        await conn.execute(
+            "INSERT INTO reminder_history (scenario_id, chat_id, business_connection_id) VALUES (?, ?, ?)",
+            (scenario_id, chat_id, bc_id)
+        )
+
+
+async def measure(name: str, func, iterations: int) -> dict:
+    """Последовательно вызвать func() и вернуть статистику в микросекундах"""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await func(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'name': name,
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def print_row(result: dict):
+    print(f"{result['name']:<48} mean={result['mean']:>9.1f}us  "
+          f"p50={result['p50']:>9.1f}us  p99={result['p99']:>9.1f}us")
+
+
+async def run(iterations: int, scenarios: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        database = Database(db_path)
+        await database.init_db()
+
+        for i in range(scenarios):
+            await database.add_scenario(
+                trigger_type='contains',
+                trigger_value=f'ключ{i}',
+                response_text=f'Ответ {i}'
+            )
+        await database.save_business_connection('bc-bench', user_id=1)
+
+        results = [
+            await measure(
+                "per-call  get_all_scenarios(active_only)",
+                lambda i: percall_get_all_scenarios(db_path), iterations
+            ),
+            await measure(
+                "pooled    get_all_scenarios(active_only)",
+                lambda i: database.get_all_scenarios(active_only=True), iterations
+            ),
+            await measure(
+                "per-call  get_business_connection",
+                lambda i: percall_get_business_connection(db_path, 'bc-bench'), iterations
+            ),
+            await measure(
+                "pooled    get_business_connection",
+                lambda i: database.get_business_connection('bc-bench'), iterations
+            ),
+            await measure(
+                "per-call  add_reminder_history",
+                lambda i: percall_add_reminder_history(db_path, 1, i, 'bc-bench'), iterations
+            ),
+            await measure(
+                "pooled    add_reminder_history (row per commit)",
+                lambda i: pooled_add_reminder_history(database, 1, i, 'bc-bench'), iterations
+            ),
+            await measure(
+                "buffered  add_reminder_history",
+                lambda i: database.add_reminder_history(1, i, 'bc-bench'), iterations
+            ),
+        ]
+
+        # Буфер пишет накопленное одной транзакцией - её время отдельно
+        pending = len(database.reminder_history)
+        start = time.perf_counter()
+        await database.flush_writes()
+        flush_us = (time.perf_counter() - start) * 1e6
+
+        await database.close()
+
+    print(f"iterations={iterations}, scenarios={scenarios}")
+    for result in results:
+        print_row(result)
+    print(f"{'buffered  flush':<48} rows={pending} total={flush_us:>9.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--scenarios', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations, args.scenarios))
+
+
+if __name__ == '__main__':
+    main()
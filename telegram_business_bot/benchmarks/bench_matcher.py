@@ -0,0 +1,68 @@
+"""
+Бенчмарк in-memory матчера сценариев
+
+Измеряет задержку Database.find_matching_scenario и прежней реализации
+(полная выборка из SQLite + линейный перебор) на случайном наборе
+сценариев, сообщений и callback'ов. Эквивалентность результатов
+проверяет tests/test_matcher.py, копия прежней реализации берётся оттуда.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_matcher.py --scenarios 500 --queries 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from tests.test_matcher import (  # noqa: E402
+    add_random_scenarios,
+    legacy_find_matching_scenario,
+    random_callback,
+    random_message,
+)
+
+
+async def timed(func, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        await func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+async def run(scenario_count: int, queries: int, seed: int):
+    rng = random.Random(seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'bench.db'))
+        await database.init_db()
+        await add_random_scenarios(database, rng, scenario_count)
+        print(f"scenarios={scenario_count} queries={queries}")
+
+        workload = [(random_message(rng), random_callback(rng)) for _ in range(queries)]
+        legacy_us = await timed(lambda m, c: legacy_find_matching_scenario(database, m, c), workload)
+        snapshot_us = await timed(database.find_matching_scenario, workload)
+        await database.close()
+
+    print(f"SQLite + перебор:  {legacy_us:>10.1f} us/запрос")
+    print(f"In-memory снимок:  {snapshot_us:>10.1f} us/запрос")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.scenarios, args.queries, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Накладные расходы метрик
+
+Измеряет стоимость одного замера (Histogram.observe, контекстный
+менеджер time(), декоратор timed для корутины, Counter.inc) и сравнивает
+с пустым циклом, а также время рендеринга /metrics. Декоратор timed
+сравнивается с голой корутиной в том же event loop, чередуя раунды:
+печатается медиана разницы (не меньше нуля) и её стандартное отклонение.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_metrics.py --iterations 200000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry  # noqa: E402
+
+
+def per_op_ns(func, iterations: int) -> float:
+    start = time.perf_counter()
+    func(iterations)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def run(iterations: int, rounds: int):
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', 'bench', ('stage',))
+    counter = registry.counter('bench_total', 'bench', ('event_type',))
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def observe(n):
+        for _ in range(n):
+            histogram.observe(0.003, 'match')
+
+    def timer(n):
+        for _ in range(n):
+            with histogram.time('send'):
+                pass
+
+    def inc(n):
+        for _ in range(n):
+            counter.inc('business_message')
+
+    async def noop():
+        return None
+
+    timed_noop = histogram.timed('db')(noop)
+
+    async def await_ns(func, n) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            await func()
+        return (time.perf_counter() - start) / n * 1e9
+
+    async def timed_overhead(n, rounds):
+        """Разница с голой корутиной по раундам в одном event loop"""
+        await await_ns(noop, n)
+        await await_ns(timed_noop, n)
+        samples = []
+        for _ in range(rounds):
+            plain = await await_ns(noop, n)
+            samples.append(await await_ns(timed_noop, n) - plain)
+        return samples
+
+    baseline = per_op_ns(empty, iterations)
+    print(f"empty loop:                  {baseline:>8.1f} ns/op")
+    print(f"Histogram.observe:           {per_op_ns(observe, iterations) - baseline:>8.1f} ns/op")
+    print(f"with Histogram.time():       {per_op_ns(timer, iterations) - baseline:>8.1f} ns/op")
+    print(f"Counter.inc:                 {per_op_ns(inc, iterations) - baseline:>8.1f} ns/op")
+
+    # Раунды чередуются, чтобы прогрев и дрейф частоты попадали в обе
+    # половины; медиана с разбросом вместо одной (иногда отрицательной) разницы
+    samples = asyncio.run(timed_overhead(max(1, iterations // rounds), rounds))
+    spread = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    print(f"@Histogram.timed (coroutine): {max(0.0, statistics.median(samples)):>7.1f} ns/op "
+          f"(± {spread:.1f}, {rounds} раундов)")
+
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"render /metrics:             {(time.perf_counter() - start) * 1e3:>8.2f} ms ({len(body)} байт)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=10, help='раундов для декоратора timed')
+    args = parser.parse_args()
+    run(args.iterations, max(1, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
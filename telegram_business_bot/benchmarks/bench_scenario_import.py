@@ -0,0 +1,110 @@
+"""
+Бенчмарк загрузки сценариев: add_scenario на каждую строку против
+массового импорта (Database.import_scenarios) и потоковый экспорт
+
+add_scenario - как при вводе через мастер админки: отдельная фиксация и
+обновление снимка сценариев на каждую строку. Импорт - проверочный проход
+по JSONL (scenario_io.check_scenarios), затем разбор пачками в потоке,
+executemany в одной транзакции и одно перестроение снимка. Экспорт пишет JSONL в /dev/null, для него
+отдельно - пик памяти по tracemalloc.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_scenario_import.py --scenarios 100000 --per-row 2000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from scenario_io import check_scenarios, read_scenarios, write_scenarios  # noqa: E402
+
+
+def make_jsonl(count: int) -> str:
+    lines = []
+    for index in range(count):
+        lines.append(json.dumps({
+            'trigger_type': ('exact', 'contains', 'callback')[index % 3],
+            'trigger_value': f'товар {index}',
+            'response_text': f'Цена товара {index}: {100 + index % 900} ₽',
+            'keyboard_json': [{'text': 'Заказать', 'callback_data': f'order_{index}'}],
+            'cooldown_sec': index % 60,
+        }, ensure_ascii=False))
+    return '\n'.join(lines) + '\n'
+
+
+async def per_row(db_path: str, document: str) -> float:
+    database = Database(db_path)
+    await database.init_db()
+    started = time.perf_counter()
+    for row in read_scenarios(io.StringIO(document), 'jsonl'):
+        await database.add_scenario(
+            trigger_type=row[0], trigger_value=row[1], response_text=row[2], keyboard_json=row[3],
+            is_reminder=bool(row[4]), reminder_delay_min=row[5], cooldown_sec=row[6]
+        )
+    elapsed = time.perf_counter() - started
+    await database.close()
+    return elapsed
+
+
+async def bulk(db_path: str, document: str, batch_size: int) -> Database:
+    database = Database(db_path)
+    await database.init_db()
+    stream = io.StringIO(document)
+    started = time.perf_counter()
+    await asyncio.to_thread(check_scenarios, stream, 'jsonl')
+    checked = time.perf_counter()
+    stream.seek(0)
+    count = await database.import_scenarios(read_scenarios(stream, 'jsonl'), batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"import_scenarios  rows={count:<8} total={elapsed:8.2f}s  {elapsed / count * 1e6:8.1f}us/row  "
+          f"(проверка {checked - started:.2f}s, вставка {elapsed - (checked - started):.2f}s)")
+    return database
+
+
+async def export(database: Database) -> None:
+    with open(os.devnull, 'w', encoding='utf-8') as stream:
+        started = time.perf_counter()
+        count = await write_scenarios(database.iter_scenarios(), stream, 'jsonl')
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        await write_scenarios(database.iter_scenarios(), stream, 'jsonl')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"export jsonl      rows={count:<8} total={elapsed:8.2f}s  {elapsed / count * 1e6:8.1f}us/row  "
+          f"peak={peak / 1024:.0f}KiB")
+
+
+async def run(count: int, per_row_count: int, batch_size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        if per_row_count:
+            elapsed = await per_row(os.path.join(tmp, 'per_row.db'), make_jsonl(per_row_count))
+            print(f"add_scenario      rows={per_row_count:<8} total={elapsed:8.2f}s  "
+                  f"{elapsed / per_row_count * 1e6:8.1f}us/row")
+
+        database = await bulk(os.path.join(tmp, 'bulk.db'), make_jsonl(count), batch_size)
+        await export(database)
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, default=100_000, help='строк для массового импорта')
+    parser.add_argument('--per-row', type=int, default=2000, help='строк для add_scenario (0 - пропустить)')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.scenarios, args.per_row, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
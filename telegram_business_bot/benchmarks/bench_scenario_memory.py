@@ -0,0 +1,127 @@
+"""
+Бенчмарк памяти на сценарий: dict на строку против записи Scenario
+
+Заполняет временную БД --scenarios сценариями (треть - с кнопками) и
+читает их так же, как снимок сценариев, в три представления:
+
+- dict          - dict(row), как Database отдавал сценарии раньше
+- dict + entry  - dict и обёртка снимка с приоритетом и триггером в
+                  нижнем регистре: столько держал прежний ScenarioMatcher
+- Scenario      - Scenario.from_row: разобранные кнопки, флаги и
+                  приоритет уже внутри записи, обёртка не нужна
+
+Память - по tracemalloc, вместе со строками значений, в байтах на
+сценарий; время разбора - отдельным прогоном без tracemalloc. Последняя
+строка - весь снимок (ScenarioMatcher с индексами) из записей Scenario.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_scenario_memory.py --scenarios 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from matcher import ScenarioMatcher  # noqa: E402
+from scenario import Scenario, scenario_priority  # noqa: E402
+
+
+class LegacyEntry:
+    """Запись прежнего снимка поверх dict сценария"""
+
+    __slots__ = ('priority', 'trigger_type', 'trigger_value', 'scenario')
+
+    def __init__(self, scenario: dict):
+        self.priority = scenario_priority(scenario['created_at'], scenario['id'])
+        self.trigger_type = scenario['trigger_type']
+        self.trigger_value = scenario['trigger_value'].lower()
+        self.scenario = scenario
+
+
+def make_rows(count: int):
+    for index in range(count):
+        keyboard = None
+        if index % 3 == 0:
+            keyboard = json.dumps([
+                {'text': 'Записаться', 'callback_data': f'book_{index}'},
+                {'text': 'Цены', 'callback_data': 'prices'},
+            ], ensure_ascii=False)
+        yield (
+            ('exact', 'contains', 'callback')[index % 3],
+            f'Товар {index}' if index % 2 else f'товар {index}',
+            f'Здравствуйте! Товар {index} есть в наличии, цена {100 + index % 900} ₽. '
+            f'Доставка 1-2 дня, самовывоз бесплатно.',
+            keyboard, int(index % 10 == 0), 60 if index % 10 == 0 else 0, index % 60, 1, None, None
+        )
+
+
+BUILDERS = {
+    'dict': lambda rows: [dict(row) for row in rows],
+    'dict + entry': lambda rows: [LegacyEntry(dict(row)) for row in rows],
+    'Scenario': lambda rows: [Scenario.from_row(row) for row in rows],
+}
+
+
+async def fetch(database: Database) -> list:
+    async with database.pool.read() as conn:
+        async with conn.execute("SELECT * FROM scenarios ORDER BY created_at DESC, id ASC") as cursor:
+            return await cursor.fetchall()
+
+
+async def traced(database: Database, build) -> int:
+    """Память, которую держит результат build, вместе со строками из БД"""
+    gc.collect()
+    tracemalloc.start()
+    rows = await fetch(database)
+    result = build(rows)
+    del rows
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return memory
+
+
+async def run(count: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'bench.db'))
+        await database.init_db()
+        await database.import_scenarios(make_rows(count), batch_size=5000)
+        print(f"scenarios={count}")
+
+        for name, build in BUILDERS.items():
+            rows = await fetch(database)
+            started = time.perf_counter()
+            build(rows)
+            elapsed = time.perf_counter() - started
+            del rows
+
+            memory = await traced(database, build)
+            print(f"{name:<14} {memory / count:8.0f} B/scenario  total={memory / 2**20:7.1f}MiB  "
+                  f"build={elapsed / count * 1e6:6.2f}us/row")
+
+        memory = await traced(database, lambda rows: ScenarioMatcher(Scenario.from_row(row) for row in rows))
+        print(f"{'snapshot':<14} {memory / count:8.0f} B/scenario  total={memory / 2**20:7.1f}MiB  "
+              f"(ScenarioMatcher из Scenario)")
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.scenarios))
+
+
+if __name__ == '__main__':
+    main()
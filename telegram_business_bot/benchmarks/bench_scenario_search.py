@@ -0,0 +1,116 @@
+"""
+Бенчмарк поиска сценариев в админке: FTS5 против LIKE
+
+Заполняет временную БД --scenarios сценариями (словарь из --vocabulary
+слов) и измеряет Database.search_scenarios для запросов разной
+частотности: редкое слово, частое слово, два слова и префикс. Для
+сравнения - тот же поиск подстрокой через LIKE (полный просмотр таблицы),
+как без полнотекстового индекса. Отдельно - время вставки сценариев с
+поддержкой индекса триггерами.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_scenario_search.py --scenarios 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from keyboards import SCENARIOS_PAGE_SIZE  # noqa: E402
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    letters = 'абвгдежзиклмнопрстуфхцчшэюя'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+async def fill(database: Database, count: int, vocabulary: list, rng: random.Random) -> float:
+    """Вставить сценарии пачками, вернуть время в секундах"""
+    # Частотность слов по Ципфу: первые слова словаря встречаются часто
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rows = []
+    for index in range(count):
+        trigger = ' '.join(rng.choices(vocabulary, weights, k=rng.randint(1, 3)))
+        response = ' '.join(rng.choices(vocabulary, weights, k=rng.randint(10, 30)))
+        rows.append(('contains', trigger, response))
+
+    started = time.perf_counter()
+    for start in range(0, count, 10_000):
+        async with database.pool.write() as conn:
+            await conn.executemany(
+                "INSERT INTO scenarios (trigger_type, trigger_value, response_text) VALUES (?, ?, ?)",
+                rows[start:start + 10_000]
+            )
+    return time.perf_counter() - started
+
+
+async def measure(func, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = await func()
+        samples.append((time.perf_counter() - started) * 1e3)
+    samples.sort()
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'found': len(result[0]),
+    }
+
+
+async def run(count: int, vocabulary_size: int, iterations: int, seed: int):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    queries = {
+        'rare word': vocabulary[-1],
+        'frequent word': vocabulary[0],
+        'two words': f'{vocabulary[1]} {vocabulary[2]}',
+        'prefix': vocabulary[3][:3],
+        'page 3 of frequent': vocabulary[0],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'bench.db'))
+        await database.init_db()
+        if not database.fts_enabled:
+            raise SystemExit("SQLite собран без FTS5")
+        fill_s = await fill(database, count, vocabulary, rng)
+        print(f"scenarios={count} vocabulary={vocabulary_size} insert={fill_s:.2f}s "
+              f"({fill_s / count * 1e6:.1f}us/row with FTS triggers)")
+
+        for name, query in queries.items():
+            offset = 2 * SCENARIOS_PAGE_SIZE if name.startswith('page') else 0
+            for impl in ('fts5', 'like'):
+                database.fts_enabled = impl == 'fts5'
+                result = await measure(
+                    lambda: database.search_scenarios(query, SCENARIOS_PAGE_SIZE, offset),
+                    iterations if impl == 'fts5' else max(1, iterations // 10)
+                )
+                print(f"{impl:<5} {name:<20} mean={result['mean']:>8.2f}ms  "
+                      f"p50={result['p50']:>8.2f}ms  p99={result['p99']:>8.2f}ms  found={result['found']}")
+        database.fts_enabled = True
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, default=100_000)
+    parser.add_argument('--vocabulary', type=int, default=5000, help='размер словаря')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.scenarios, args.vocabulary, args.iterations, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Бенчмарк сценариев подключений: ленивые снимки в LRU против загрузки всех
+
+Заполняет временную БД сценариями --tenants подключений (по --per-tenant
+у каждого) и прогоняет --messages сообщений от подключений с частотой по
+Ципфу: немногие активные магазины пишут постоянно, большинство - редко.
+Database.find_matching_scenario загружает снимок подключения при первом
+сообщении и держит в TenantMatcherCache не больше --cache-size
+сценариев. Для сравнения - память снимков всех подключений сразу, как
+если бы процесс загружал все сценарии при старте.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_tenant_matchers.py --tenants 2000 --per-tenant 50 --cache-size 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from matcher import ScenarioMatcher  # noqa: E402
+from tenant_matchers import TenantMatcherCache  # noqa: E402
+
+
+def make_rows(tenants: int, per_tenant: int):
+    for tenant in range(tenants):
+        for index in range(per_tenant):
+            yield (
+                ('exact', 'contains')[index % 2], f'товар {index}', f'Магазин {tenant}: товар {index}',
+                None, 0, 0, 0, 1, f'bc{tenant}', None
+            )
+
+
+def percentile(samples: list, share: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+async def load_all(database: Database, tenants: int) -> tuple:
+    """Снимки всех подключений сразу: время и память"""
+    started = time.perf_counter()
+    for tenant in range(tenants):
+        ScenarioMatcher(await database.get_active_scenarios(f'bc{tenant}'))
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    matchers = {}
+    for tenant in range(tenants):
+        matchers[tenant] = ScenarioMatcher(await database.get_active_scenarios(f'bc{tenant}'))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+
+async def run(tenants: int, per_tenant: int, cache_size: int, messages: int, seed: int):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(tenants)]
+    traffic = rng.choices(range(tenants), weights, k=messages)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, 'bench.db'))
+        await database.init_db()
+        await database.import_scenarios(make_rows(tenants, per_tenant), batch_size=5000)
+        print(f"tenants={tenants} per_tenant={per_tenant} scenarios={tenants * per_tenant} "
+              f"cache_size={cache_size} messages={messages}")
+
+        elapsed, memory = await load_all(database, tenants)
+        print(f"load all      total={elapsed:8.2f}s  memory={memory / 2**20:8.1f}MiB")
+
+        database.tenant_matchers = TenantMatcherCache(cache_size)
+        samples = []
+        for tenant in traffic:
+            text = f'товар {rng.randrange(per_tenant)}'
+            started = time.perf_counter()
+            await database.find_matching_scenario(text, business_connection_id=f'bc{tenant}')
+            samples.append((time.perf_counter() - started) * 1e6)
+        stats = database.tenant_matchers.stats
+
+        # Память - отдельным прогоном: tracemalloc сильно замедляет загрузку
+        database.tenant_matchers = TenantMatcherCache(cache_size)
+        tracemalloc.start()
+        for tenant in traffic:
+            await database.find_matching_scenario('товар 0', business_connection_id=f'bc{tenant}')
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        samples.sort()
+        print(f"lazy LRU      total={sum(samples) / 1e6:8.2f}s  memory={memory / 2**20:8.1f}MiB  "
+              f"loaded={len(database.tenant_matchers)}  hit_rate={stats['hits'] / messages:.1%}  "
+              f"evictions={stats['evictions']}")
+        print(f"find_matching p50={percentile(samples, 0.5):8.1f}us  p99={percentile(samples, 0.99):8.1f}us  "
+              f"max={samples[-1]:8.1f}us")
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=2000)
+    parser.add_argument('--per-tenant', type=int, default=50, help='сценариев у подключения')
+    parser.add_argument('--cache-size', type=int, default=10_000, help='лимит LRU в сценариях')
+    parser.add_argument('--messages', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.tenants, args.per_tenant, args.cache_size, args.messages, args.seed))
+
+
+if __name__ == '__main__':
+    main()
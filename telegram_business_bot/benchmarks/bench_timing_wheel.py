@@ -0,0 +1,200 @@
+"""
+Бенчмарк колеса таймеров напоминаний против хранилища заданий APScheduler
+
+Для каждого размера N: поставить N напоминаний со случайным сроком в
+пределах --horizon часов, отменить --cancel-share из них и разобрать
+остальные, продвигая время по минутам. Для APScheduler - MemoryJobStore
+(как у прежнего планировщика напоминаний): add_job, remove_job и
+get_due_jobs + remove_job на каждом шаге. Память - прирост по tracemalloc
+после вставки (отдельный прогон).
+
+APScheduler не входит в зависимости бота и сравнивается, только если
+установлен; размеры больше --apscheduler-max для него пропускаются
+(вставка в отсортированный список - O(N)).
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/bench_timing_wheel.py --sizes 1000 100000 1000000
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from timing_wheel import TimingWheel  # noqa: E402
+
+try:
+    from apscheduler.job import Job
+    from apscheduler.jobstores.memory import MemoryJobStore
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.date import DateTrigger
+except ImportError:
+    Job = None
+
+TICK = 60.0
+
+# (ключ, срок) - ключ как у диспетчера: (business_connection_id, chat_id, scenario_id)
+Reminder = Tuple[Tuple[str, int, int], float]
+
+
+def make_reminders(count: int, horizon: float, now: float, seed: int) -> List[Reminder]:
+    rng = random.Random(seed)
+    return [
+        ((f'bc-{index % 100}', 10_000_000 + index, 1 + index % 50), now + rng.uniform(60, horizon))
+        for index in range(count)
+    ]
+
+
+def _send_reminder(business_connection_id, chat_id, scenario_id):
+    pass
+
+
+class WheelCase:
+    name = 'timing_wheel'
+
+    def __init__(self, now: float):
+        self.wheel = TimingWheel(TICK, now=now)
+
+    def insert(self, reminders: List[Reminder]):
+        add = self.wheel.add
+        for key, due_at in reminders:
+            add(key, due_at)
+
+    def cancel(self, keys: List[Tuple[str, int, int]]):
+        cancel = self.wheel.cancel
+        for key in keys:
+            cancel(key)
+
+    def expire(self, now: float) -> int:
+        return len(self.wheel.advance(now))
+
+
+class APSchedulerCase:
+    name = 'apscheduler'
+
+    def __init__(self, now: float):
+        self.scheduler = AsyncIOScheduler(timezone=datetime.timezone.utc)
+        self.store = MemoryJobStore()
+        self.store.start(self.scheduler, 'default')
+
+    def insert(self, reminders: List[Reminder]):
+        scheduler = self.scheduler
+        add_job = self.store.add_job
+        for key, due_at in reminders:
+            run_at = datetime.datetime.fromtimestamp(due_at, datetime.timezone.utc)
+            add_job(Job(
+                scheduler,
+                id=f'reminder_{key[2]}_{key[1]}',
+                func=_send_reminder,
+                args=key,
+                kwargs={},
+                trigger=DateTrigger(run_at),
+                executor='default',
+                name='reminder',
+                misfire_grace_time=None,
+                coalesce=True,
+                max_instances=1,
+                next_run_time=run_at
+            ))
+
+    def cancel(self, keys: List[Tuple[str, int, int]]):
+        remove_job = self.store.remove_job
+        for key in keys:
+            remove_job(f'reminder_{key[2]}_{key[1]}')
+
+    def expire(self, now: float) -> int:
+        due = self.store.get_due_jobs(datetime.datetime.fromtimestamp(now, datetime.timezone.utc))
+        for job in due:
+            self.store.remove_job(job.id)
+        return len(due)
+
+
+def measure(factory: Callable, reminders: List[Reminder], cancelled: List, now: float, horizon: float) -> Dict:
+    gc.collect()
+    case = factory(now)
+    started = time.perf_counter()
+    case.insert(reminders)
+    insert_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    case.cancel(cancelled)
+    cancel_s = time.perf_counter() - started
+
+    fired = 0
+    ticks = 0
+    clock = now
+    started = time.perf_counter()
+    while clock <= now + horizon + TICK:
+        clock += TICK
+        fired += case.expire(clock)
+        ticks += 1
+    expire_s = time.perf_counter() - started
+    del case
+
+    # Память - отдельной вставкой под tracemalloc (он замедляет выполнение)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    case = factory(now)
+    case.insert(reminders)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del case
+
+    count = len(reminders)
+    return {
+        'insert_us_per_op': round(insert_s / count * 1e6, 3),
+        'cancel_us_per_op': round(cancel_s / max(1, len(cancelled)) * 1e6, 3),
+        'expire_total_s': round(expire_s, 3),
+        'expire_us_per_tick': round(expire_s / ticks * 1e6, 1),
+        'fired': fired,
+        'memory_bytes_per_reminder': round(memory / count, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--horizon', type=float, default=24, help='сроки напоминаний в пределах стольких часов')
+    parser.add_argument('--cancel-share', type=float, default=0.1, help='доля отменяемых напоминаний')
+    parser.add_argument('--apscheduler-max', type=int, default=100_000, help='наибольший N для APScheduler')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    now = time.time()
+    horizon = args.horizon * 3600
+    for size in args.sizes:
+        reminders = make_reminders(size, horizon, now, args.seed)
+        rng = random.Random(args.seed)
+        cancelled = [key for key, _ in rng.sample(reminders, int(size * args.cancel_share))]
+
+        cases: List[Tuple[str, Optional[Callable]]] = [(WheelCase.name, WheelCase)]
+        if Job is None:
+            cases.append((APSchedulerCase.name, None))
+        elif size <= args.apscheduler_max:
+            cases.append((APSchedulerCase.name, APSchedulerCase))
+
+        for name, factory in cases:
+            if factory is None:
+                result = {'skipped': 'apscheduler не установлен'}
+            else:
+                result = measure(factory, reminders, cancelled, now, horizon)
+                expected = size - len(cancelled)
+                if result['fired'] != expected:
+                    raise SystemExit(f"{name}: сработало {result['fired']} вместо {expected}")
+            print(json.dumps({'impl': name, 'reminders': size, **result}, ensure_ascii=False), flush=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Сквозной нагрузочный тест: настоящий main.py против заглушки Bot API
+
+Поднимает заглушку (mock_bot_api.py), запускает бота отдельным процессом
+с TELEGRAM_API_SERVER на неё и новой БД во временном каталоге, подаёт
+business_message и callback_query от клиентов многих бизнес-подключений
+(через getUpdates или POST на webhook) и ждёт ответов sendMessage.
+
+В БД заранее создаются два сценария (contains и callback), и каждый
+апдейт попадает в один из них, так что на апдейт ожидается ровно один
+ответ. Задержка ответа - от подачи апдейта до прихода sendMessage в заглушку.
+
+Запуск (из каталога telegram_business_bot):
+    python benchmarks/load_test.py --updates 5000 --connections 50
+    python benchmarks/load_test.py --mode webhook --workers 4 --latency-ms 30
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Deque, Dict, List, Optional
+
+import aiohttp
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.environ.setdefault('BOT_TOKEN', '0:benchmark')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from db import Database  # noqa: E402
+from mock_bot_api import MockBotApi, serve  # noqa: E402
+from webhook_replay import percentile, synthesize_updates  # noqa: E402
+
+# Тексты, на которые отвечает contains-сценарий "расписание"
+MATCHING_TEXTS = [
+    'Какое у вас расписание?',
+    'Подскажите расписание на субботу',
+    'расписание',
+]
+
+# callback_data callback-сценария (клиентские кнопки начинаются с "scenario_")
+MATCHING_CALLBACK = 'scenario_load_test'
+
+WEBHOOK_SECRET = 'load-test'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    """RSS процесса и всех его потомков (Linux, /proc)"""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return total or None
+    return total
+
+
+class ReplyTracker:
+    """Сопоставляет ответы sendMessage с апдейтами по чату (FIFO)"""
+
+    def __init__(self):
+        self._pending: Dict[int, Deque[float]] = collections.defaultdict(collections.deque)
+        self.latencies: List[float] = []
+        self.unexpected = 0
+        self.first_sent: Optional[float] = None
+        self.last_reply: Optional[float] = None
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def sent(self, chat_id: int):
+        now = time.perf_counter()
+        if self.first_sent is None:
+            self.first_sent = now
+        self._pending[chat_id].append(now)
+        self.expected += 1
+
+    def replied(self, chat_id: int, received_at: float):
+        queue = self._pending.get(chat_id)
+        if not queue:
+            self.unexpected += 1
+            return
+        self.latencies.append(received_at - queue.popleft())
+        self.last_reply = received_at
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+async def seed_database(path: str):
+    """Создать БД с двумя сценариями, на которые отвечает бот"""
+    database = Database(path)
+    await database.init_db()
+    await database.add_scenario(
+        trigger_type='contains',
+        trigger_value='расписание',
+        response_text='📅 <b>Расписание:</b> Пн-Пт 9:00-18:00',
+        keyboard_json=json.dumps([{'text': 'Подробнее', 'callback_data': MATCHING_CALLBACK}])
+    )
+    await database.add_scenario(
+        trigger_type='callback',
+        trigger_value=MATCHING_CALLBACK,
+        response_text='📋 Подробное расписание'
+    )
+    await database.close()
+
+
+def update_chat_id(update: Dict) -> int:
+    if 'business_message' in update:
+        return update['business_message']['chat']['id']
+    return update['callback_query']['message']['chat']['id']
+
+
+async def wait_until_ready(api: MockBotApi, mode: str, webhook_port: int, process: subprocess.Popen, timeout: float):
+    """Дождаться, пока бот начнёт принимать апдейты"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Бот завершился с кодом {process.returncode}")
+        if mode == 'polling' and api.calls['getupdates']:
+            return
+        if mode == 'webhook':
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', webhook_port)
+                writer.close()
+                return
+            except OSError:
+                pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Бот не запустился")
+
+
+async def feed_updates(args, api: MockBotApi, tracker: ReplyTracker, updates: List[Dict], webhook_port: int):
+    """Подать апдейты с заданной скоростью (0 - без ограничения)"""
+    interval = 1 / args.rate if args.rate else 0
+    started = time.perf_counter()
+
+    if args.mode == 'polling':
+        for index, update in enumerate(updates):
+            if interval:
+                delay = started + index * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tracker.sent(update_chat_id(update))
+            api.push_update(update)
+        return
+
+    url = f'http://127.0.0.1:{webhook_port}/webhook'
+    headers = {'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET}
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def post(session: aiohttp.ClientSession, update: Dict):
+        try:
+            async with session.post(url, data=json.dumps(update), headers=headers) as response:
+                await response.read()
+        finally:
+            slots.release()
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        tasks = []
+        for index, update in enumerate(updates):
+            if interval:
+                delay = started + index * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await slots.acquire()
+            tracker.sent(update_chat_id(update))
+            tasks.append(asyncio.create_task(post(session, update)))
+        await asyncio.gather(*tasks)
+
+
+async def run(args) -> Dict:
+    warmup_tracker = ReplyTracker()
+    tracker = ReplyTracker()
+    # 429 включаются только на время замера
+    api = MockBotApi(
+        latency=args.latency_ms / 1000,
+        retry_after=args.retry_after,
+        on_send=warmup_tracker.replied
+    )
+    api_port = free_port()
+    webhook_port = free_port()
+    api_runner = await serve(api, '127.0.0.1', api_port)
+
+    workdir = tempfile.mkdtemp(prefix='bot-load-')
+    db_path = os.path.join(workdir, 'scenarios.db')
+    await seed_database(db_path)
+    env = dict(
+        os.environ,
+        BOT_TOKEN='123456:load-test',
+        ADMIN_IDS='1',
+        TELEGRAM_API_SERVER=f'http://127.0.0.1:{api_port}',
+        DB_PATH=db_path,
+        BOT_MODE=args.mode,
+        BOT_WORKERS=str(args.workers),
+        WEBHOOK_HOST='127.0.0.1',
+        WEBHOOK_PORT=str(webhook_port),
+        WEBHOOK_SECRET=WEBHOOK_SECRET,
+        WEBHOOK_URL='',
+        SEND_GLOBAL_RATE=str(args.send_rate),
+        SEND_PER_CHAT_INTERVAL=str(args.per_chat_interval),
+        LOG_LEVEL='WARNING',
+    )
+    log = open(os.path.join(workdir, 'bot.log'), 'w')
+    process = subprocess.Popen([sys.executable, 'main.py'], cwd=BOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    # Прогрев на отдельных чатах: ждём, пока ответят все воркеры
+    # (при BOT_WORKERS > 1 приём апдейтов начинается раньше, чем воркеры готовы)
+    warmup = list(synthesize_updates(
+        args.warmup,
+        connections=args.connections,
+        chats_per_connection=args.chats,
+        texts=MATCHING_TEXTS,
+        seed=2
+    ))
+    for update in warmup:
+        update['business_message']['chat']['id'] += 1_000_000_000
+    updates = list(synthesize_updates(
+        args.updates,
+        connections=args.connections,
+        chats_per_connection=args.chats,
+        callback_share=args.callback_share,
+        callback_data=MATCHING_CALLBACK,
+        texts=MATCHING_TEXTS,
+        first_update_id=len(warmup) + 1
+    ))
+
+    try:
+        await wait_until_ready(api, args.mode, webhook_port, process, args.startup_timeout)
+        if warmup:
+            await feed_updates(args, api, warmup_tracker, warmup, webhook_port)
+            await asyncio.wait_for(warmup_tracker.done.wait(), args.startup_timeout)
+        rss_before = rss_kb(process.pid)
+
+        api.on_send = tracker.replied
+        api.error_rate = args.error_rate
+        await feed_updates(args, api, tracker, updates, webhook_port)
+        try:
+            await asyncio.wait_for(tracker.done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        rss_after = rss_kb(process.pid)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.to_thread(process.wait, 30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        await api_runner.cleanup()
+
+    latencies = sorted(tracker.latencies)
+    elapsed = (tracker.last_reply - tracker.first_sent) if tracker.last_reply else 0.0
+    return {
+        'mode': args.mode,
+        'workers': args.workers,
+        'updates': len(updates),
+        'replies': len(latencies),
+        'unexpected_replies': tracker.unexpected,
+        'rate_limited': api.stats['rate_limited'],
+        'read_receipts': api.calls['readbusinessmessage'],
+        'callback_answers': api.calls['answercallbackquery'],
+        'elapsed_s': round(elapsed, 3),
+        'replies_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1e3, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 2),
+        'max_ms': round(latencies[-1] * 1e3, 2) if latencies else 0.0,
+        'rss_before_kb': rss_before,
+        'rss_after_kb': rss_after,
+        'bot_log': log.name,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--workers', type=int, default=1, help='BOT_WORKERS бота')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=20, help='бизнес-подключений')
+    parser.add_argument('--chats', type=int, default=50, help='клиентов на подключение')
+    parser.add_argument('--callback-share', type=float, default=0.2, help='доля callback_query')
+    parser.add_argument('--rate', type=float, default=0, help='апдейтов в секунду (0 - без ограничения)')
+    parser.add_argument('--concurrency', type=int, default=64, help='одновременных POST в режиме webhook')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='задержка sendMessage в заглушке')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--send-rate', type=float, default=100000, help='SEND_GLOBAL_RATE бота')
+    parser.add_argument('--per-chat-interval', type=float, default=0, help='SEND_PER_CHAT_INTERVAL бота')
+    parser.add_argument('--timeout', type=float, default=120, help='сколько ждать ответов')
+    parser.add_argument('--warmup', type=int, default=50, help='апдейтов для прогрева до замера')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result['replies'] == result['updates'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов
+
+Отвечает на методы, которые использует бот: getMe, getUpdates,
+sendMessage, readBusinessMessage, answerCallbackQuery, deleteWebhook,
+setWebhook (остальные просто возвращают true). Апдейты для getUpdates
+ставятся в очередь через MockBotApi.push_update. У sendMessage можно
+задать задержку ответа и долю ответов 429 (Too Many Requests).
+
+Бот подключается к заглушке через TELEGRAM_API_SERVER=http://host:port.
+
+Запуск отдельно (из каталога telegram_business_bot):
+    python benchmarks/mock_bot_api.py --port 8081 --latency-ms 30 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Mock', 'username': 'mock_bot'}
+
+# Максимум апдейтов в одном ответе getUpdates (как у Telegram)
+GET_UPDATES_LIMIT = 100
+
+
+class MockBotApi:
+    """
+    Заглушка Bot API
+
+    on_send(chat_id, received_at) вызывается на каждый успешный
+    sendMessage - через него генератор нагрузки считает задержку ответа.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+        on_send: Optional[Callable[[int, float], None]] = None,
+        seed: int = 1
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.on_send = on_send
+        self._rng = random.Random(seed)
+        self._updates: Deque[Dict[str, Any]] = collections.deque()
+        self._updates_ready: Optional[asyncio.Event] = None
+        self._message_id = 0
+
+        self.calls: Dict[str, int] = collections.Counter()
+        self.stats = {'sent': 0, 'rate_limited': 0}
+
+        self._handlers = {
+            'getme': self._get_me,
+            'getupdates': self._get_updates,
+            'sendmessage': self._send_message,
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        return app
+
+    def push_update(self, update: Dict[str, Any]):
+        """Поставить апдейт в очередь для getUpdates"""
+        self._updates.append(update)
+        if self._updates_ready is not None:
+            self._updates_ready.set()
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        self.calls[method] += 1
+
+        params: Dict[str, Any] = dict(await request.post())
+        if not params and request.can_read_body:
+            params = await request.json()
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            return self._ok(True)
+        return await handler(params)
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_me(self, params: Dict[str, Any]) -> web.Response:
+        return self._ok(BOT_USER)
+
+    async def _get_updates(self, params: Dict[str, Any]) -> web.Response:
+        if self._updates_ready is None:
+            self._updates_ready = asyncio.Event()
+
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or GET_UPDATES_LIMIT)
+        timeout = float(params.get('timeout') or 0)
+
+        # Апдейты с update_id < offset подтверждены ботом
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        batch: List[Dict[str, Any]] = []
+        for update in self._updates:
+            if len(batch) >= limit:
+                break
+            batch.append(update)
+        return self._ok(batch)
+
+    async def _send_message(self, params: Dict[str, Any]) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.stats['rate_limited'] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+
+        chat_id = int(params['chat_id'])
+        self.stats['sent'] += 1
+        if self.on_send is not None:
+            self.on_send(chat_id, time.perf_counter())
+
+        self._message_id += 1
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Client'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+        if params.get('business_connection_id'):
+            message['business_connection_id'] = params['business_connection_id']
+        return self._ok(message)
+
+
+async def serve(api: MockBotApi, host: str, port: int) -> web.AppRunner:
+    """Запустить заглушку, вернуть runner для остановки"""
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def run_forever(api: MockBotApi, host: str, port: int):
+    runner = await serve(api, host, port)
+    print(f"Заглушка Bot API: http://{host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(json.dumps({'calls': api.calls, **api.stats}, ensure_ascii=False))
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='задержка ответа sendMessage')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 429 на sendMessage')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    api = MockBotApi(latency=args.latency_ms / 1000, error_rate=args.error_rate, retry_after=args.retry_after)
+    try:
+        asyncio.run(run_forever(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
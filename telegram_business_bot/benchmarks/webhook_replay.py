@@ -0,0 +1,149 @@
+"""
+Нагрузочный прогон webhook: отправляет записанные апдейты POST-запросами
+
+Апдейты берутся из JSONL-файла (по одному объекту Update на строку) или
+генерируются (--synthesize N): business_message от разных клиентов разных
+бизнес-подключений. Бот в режиме webhook обрабатывает апдейт до ответа на
+запрос, поэтому время запроса - это время обработки.
+
+Пример (бот запущен с BOT_MODE=webhook, WEBHOOK_SECRET=secret):
+    python benchmarks/webhook_replay.py --url http://127.0.0.1:8080/webhook \\
+        --secret secret --synthesize 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import aiohttp
+
+SAMPLE_TEXTS = [
+    'Здравствуйте! Какое у вас расписание?',
+    'сколько стоит',
+    'привет',
+    'Добрый день, хочу записаться',
+    'спасибо',
+]
+
+
+def synthesize_updates(
+    count: int,
+    connections: int = 10,
+    chats_per_connection: int = 100,
+    callback_share: float = 0.0,
+    callback_data: str = 'schedule_full',
+    seed: int = 1,
+    first_update_id: int = 1,
+    texts: Sequence[str] = SAMPLE_TEXTS
+) -> Iterator[Dict]:
+    """Сгенерировать business_message (и при callback_share > 0 - callback_query)"""
+    rng = random.Random(seed)
+    for offset in range(count):
+        update_id = first_update_id + offset
+        connection = rng.randrange(connections)
+        chat_id = 10_000_000 + connection * chats_per_connection + rng.randrange(chats_per_connection)
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f'Client {chat_id}'}
+        chat = {'id': chat_id, 'type': 'private', 'first_name': user['first_name']}
+        message = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': chat,
+            'from': user,
+            'business_connection_id': f'bc-{connection}',
+            'text': rng.choice(texts),
+        }
+
+        if rng.random() < callback_share:
+            yield {
+                'update_id': update_id,
+                'callback_query': {
+                    'id': str(update_id),
+                    'from': user,
+                    'chat_instance': str(chat_id),
+                    'message': message,
+                    'data': callback_data,
+                },
+            }
+        else:
+            yield {'update_id': update_id, 'business_message': message}
+
+
+def load_updates(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values: List[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+async def replay(url: str, updates: List[Dict], concurrency: int, secret: Optional[str]) -> Dict:
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(json.dumps(update))
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        while not queue.empty():
+            body = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                async with session.post(url, data=body, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'updates': len(updates),
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'updates_per_s': len(updates) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1e3,
+        'p99_ms': percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET'))
+    parser.add_argument('--updates', help='JSONL с записанными апдейтами')
+    parser.add_argument('--synthesize', type=int, default=1000, help='сколько апдейтов сгенерировать')
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.updates:
+        updates = load_updates(args.updates)
+    else:
+        updates = list(synthesize_updates(args.synthesize, connections=args.connections))
+
+    result = asyncio.run(replay(args.url, updates, args.concurrency, args.secret))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -36,7 +36,6 @@ def check_dependencies():
     """Проверка установленных зависимостей"""
     dependencies = {
         'aiogram': 'aiogram',
-        'apscheduler': 'APScheduler',
         'aiosqlite': 'aiosqlite',
         'dotenv': 'python-dotenv'
     }
@@ -12,6 +12,10 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в .env файле!")
 
+# Адрес собственного Bot API сервера (пусто - api.telegram.org), например,
+# локального telegram-bot-api или заглушки из benchmarks/mock_bot_api.py
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER', '')
+
 # ID администраторов (через запятую в .env)
 ADMIN_IDS_STR = os.getenv('ADMIN_IDS', '')
 ADMIN_IDS = [int(id_.strip()) for id_ in ADMIN_IDS_STR.split(',') if id_.strip()]
@@ -19,8 +23,95 @@ ADMIN_IDS = [int(id_.strip()) for id_ in ADMIN_IDS_STR.split(',') if id_.strip()
 if not ADMIN_IDS:
     raise ValueError("ADMIN_IDS не найден в .env файле!")
 
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Webhook: aiohttp-сервер принимает апдейты на WEBHOOK_HOST:WEBHOOK_PORT + WEBHOOK_PATH.
+# Если задан WEBHOOK_URL (публичный адрес, без пути), бот сам вызовет setWebhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', '64'))  # апдейтов в обработке одновременно
+
+# Многопроцессный режим: при BOT_WORKERS > 1 главный процесс только принимает
+# апдейты (polling или webhook) и раздаёт их воркерам по бизнес-подключению и чату
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+WORKER_QUEUE_SIZE = int(os.getenv('WORKER_QUEUE_SIZE', '1000'))  # апдейтов в очереди одного воркера
+WORKER_MAX_CONCURRENCY = int(os.getenv('WORKER_MAX_CONCURRENCY', '64'))  # апдейтов в обработке в одном воркере
+
 # Путь к базе данных
-DB_PATH = 'scenarios.db'
+DB_PATH = os.getenv('DB_PATH', 'scenarios.db')
+
+# Пул соединений SQLite: одно соединение на запись + несколько на чтение
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+
+# PRAGMA для соединений SQLite
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '-16000'))        # < 0 - в КиБ
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+# Отложенная запись append-only строк (история напоминаний)
+DB_WRITE_BUFFER_SIZE = int(os.getenv('DB_WRITE_BUFFER_SIZE', '500'))        # строк до записи
+DB_WRITE_BUFFER_INTERVAL = float(os.getenv('DB_WRITE_BUFFER_INTERVAL', '1.0'))  # секунд до записи
+# Поиск сценариев в админке: по релевантности ранжируются только столько
+# самых новых совпадений (частое слово совпадает почти со всеми сценариями)
+SEARCH_RANK_CANDIDATES = int(os.getenv('SEARCH_RANK_CANDIDATES', '1000'))
+
+# Очередь исходящих сообщений
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))              # сообщений в секунду на бота
+SEND_PER_CHAT_INTERVAL = float(os.getenv('SEND_PER_CHAT_INTERVAL', '1.0'))  # секунд между сообщениями в чат
+SEND_QUEUE_SIZE = int(os.getenv('SEND_QUEUE_SIZE', '1000'))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '8'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+SEND_DRAIN_TIMEOUT = float(os.getenv('SEND_DRAIN_TIMEOUT', '10'))
+
+# Окно объединения отметок "прочитано" для одного чата (секунды)
+READ_RECEIPT_WINDOW = float(os.getenv('READ_RECEIPT_WINDOW', '2.0'))
+
+# Склейка серии сообщений клиента в один ответ (0 - выключено)
+DEBOUNCE_WINDOW = float(os.getenv('DEBOUNCE_WINDOW', '0'))            # секунды
+DEBOUNCE_MAX_MESSAGES = int(os.getenv('DEBOUNCE_MAX_MESSAGES', '10'))  # сообщений в буфере чата
+DEBOUNCE_MAX_CHATS = int(os.getenv('DEBOUNCE_MAX_CHATS', '10000'))     # чатов в буфере одновременно
+
+# Напоминания: очередь в таблице pending_reminders и один диспетчер на процесс
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '100'))        # напоминаний за одну выборку
+REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', '3'))       # попыток отправки
+REMINDER_RETRY_DELAY = float(os.getenv('REMINDER_RETRY_DELAY', '300'))     # секунды до повтора после ошибки или падения
+REMINDER_MAX_SLEEP = float(os.getenv('REMINDER_MAX_SLEEP', '60'))          # как часто проверять очередь без таймеров
+REMINDER_MAX_PER_CHAT = int(os.getenv('REMINDER_MAX_PER_CHAT', '3'))       # ожидающих напоминаний на один чат
+REMINDER_WHEEL_TICK = float(os.getenv('REMINDER_WHEEL_TICK', '60'))        # шаг колеса таймеров (точность срабатывания)
+REMINDER_SEND_CONCURRENCY = int(os.getenv('REMINDER_SEND_CONCURRENCY', '10'))  # одновременных отправок напоминаний
+REMINDER_JITTER = float(os.getenv('REMINDER_JITTER', '5'))                 # разброс отправок пачки, секунды
+
+# Повторный триггер того же сценария в том же чате:
+# replace - перенести напоминание на новый срок, extend - перенести, но не раньше
+# уже назначенного, keep-first - оставить первое
+REMINDER_POLICY = os.getenv('REMINDER_POLICY', 'replace').lower()
+if REMINDER_POLICY not in ('replace', 'extend', 'keep-first'):
+    raise ValueError("REMINDER_POLICY должен быть replace, extend или keep-first")
+
+# Отменять ожидающие напоминания чата, когда клиент пишет снова
+REMINDER_CANCEL_ON_REPLY = os.getenv('REMINDER_CANCEL_ON_REPLY', '1').lower() in ('1', 'true', 'yes')
+
+# Сценарии подключений (магазинов): у сценария с business_connection_id свой
+# матчер, он загружается при первом сообщении подключения и держится в LRU,
+# ограниченном суммарным числом сценариев
+TENANT_MATCHER_CACHE_SIZE = int(os.getenv('TENANT_MATCHER_CACHE_SIZE', '100000'))
+# Отвечать общими сценариями (без business_connection_id), если у подключения
+# не нашлось своего
+SCENARIO_GLOBAL_FALLBACK = os.getenv('SCENARIO_GLOBAL_FALLBACK', '1').lower() in ('1', 'true', 'yes')
+
+# Паузы между одинаковыми ответами одному клиенту
+COOLDOWN_MAX_ENTRIES = int(os.getenv('COOLDOWN_MAX_ENTRIES', '100000'))
+COOLDOWN_PERSIST = os.getenv('COOLDOWN_PERSIST', '0').lower() in ('1', 'true', 'yes')
+
+# HTTP-эндпоинт /metrics в формате Prometheus (0 - выключен).
+# При BOT_WORKERS > 1 здесь метрики главного процесса, а воркер i слушает METRICS_PORT + 1 + i
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
 
 # Настройки логирования
-LOG_LEVEL = 'INFO'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
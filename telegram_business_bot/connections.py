@@ -0,0 +1,47 @@
+"""
+In-memory реестр бизнес-подключений
+"""
+from typing import Dict, Iterable, Optional
+
+
+class ConnectionRegistry:
+    """
+    Состояние бизнес-подключений: можно ли отвечать от имени аккаунта
+
+    Загружается из таблицы business_connections при старте и обновляется
+    при каждом апдейте business_connection, так что проверка перед ответом -
+    поиск в словаре без запроса к БД. Подключение, о котором бот ещё не
+    получал апдейтов (например, созданное до его запуска), считается
+    рабочим: решение за Telegram.
+    """
+
+    def __init__(self):
+        # business_connection_id -> (can_reply, is_enabled)
+        self._connections: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def load(self, connections: Iterable[Dict]):
+        """Заменить содержимое строками таблицы business_connections"""
+        self._connections = {
+            row['business_connection_id']: (bool(row['can_reply']), bool(row['is_enabled']))
+            for row in connections
+        }
+
+    def update(self, business_connection_id: str, can_reply: bool, is_enabled: bool):
+        self._connections[business_connection_id] = (can_reply, is_enabled)
+
+    def forget(self, business_connection_id: str):
+        self._connections.pop(business_connection_id, None)
+
+    def get(self, business_connection_id: str) -> Optional[Dict]:
+        state = self._connections.get(business_connection_id)
+        if state is None:
+            return None
+        return {'can_reply': state[0], 'is_enabled': state[1]}
+
+    def can_reply(self, business_connection_id: str) -> bool:
+        """Можно ли отправлять сообщения от имени этого подключения"""
+        state = self._connections.get(business_connection_id)
+        return state is None or (state[0] and state[1])
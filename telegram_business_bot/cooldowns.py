@@ -0,0 +1,88 @@
+"""
+Паузы между одинаковыми ответами одному клиенту
+"""
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Tuple
+
+from config import COOLDOWN_MAX_ENTRIES
+
+# Сколько самых старых записей проверять на истечение при каждой вставке
+_SWEEP_BATCH = 4
+
+
+class CooldownStore:
+    """
+    In-memory TTL-хранилище пауз
+
+    Ключ - произвольный hashable (например, (business_connection_id,
+    chat_id, scenario_id)), значение - unix-время окончания паузы.
+    Проверка и вставка за O(1). Записи хранятся в порядке установки:
+    при каждой вставке несколько самых старых проверяются на истечение,
+    а при превышении max_entries самые старые вытесняются, так что
+    память ограничена.
+    """
+
+    def __init__(self, max_entries: int = COOLDOWN_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._expires: 'OrderedDict[Hashable, float]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def remaining(self, key: Hashable) -> float:
+        """Сколько секунд осталось до конца паузы (0 - паузы нет)"""
+        expires_at = self._expires.get(key)
+        if expires_at is None:
+            return 0.0
+        left = expires_at - time.time()
+        if left <= 0:
+            del self._expires[key]
+            return 0.0
+        return left
+
+    def acquire(self, key: Hashable, ttl: float) -> bool:
+        """
+        Начать паузу, если её нет
+
+        Returns:
+            True - паузы не было и она установлена, False - пауза ещё идёт
+        """
+        if self.remaining(key) > 0:
+            return False
+        self._set(key, time.time() + ttl)
+        return True
+
+    def release(self, key: Hashable):
+        """Снять паузу (например, если ответ не удалось отправить)"""
+        self._expires.pop(key, None)
+
+    def _set(self, key: Hashable, expires_at: float):
+        self._expires[key] = expires_at
+        self._expires.move_to_end(key)
+
+        now = time.time()
+        for _ in range(_SWEEP_BATCH):
+            oldest_key, oldest_expires = next(iter(self._expires.items()))
+            if oldest_expires > now or oldest_key == key:
+                break
+            del self._expires[oldest_key]
+
+        while len(self._expires) > self.max_entries:
+            self._expires.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, float]]:
+        """Действующие паузы (для сохранения в БД)"""
+        now = time.time()
+        return [(key, expires_at) for key, expires_at in self._expires.items() if expires_at > now]
+
+    def load(self, items: Iterable[Tuple[Hashable, float]]):
+        """Восстановить паузы (например, из БД после перезапуска)"""
+        now = time.time()
+        for key, expires_at in sorted(items, key=lambda item: item[1]):
+            if expires_at > now:
+                self._set(key, expires_at)
+
+
+# Паузы ответов по (business_connection_id, chat_id, scenario_id)
+reply_cooldowns = CooldownStore()
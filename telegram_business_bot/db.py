@@ -1,23 +1,374 @@
 """
 Работа с базой данных SQLite
 """
+import asyncio
 import aiosqlite
 import logging
-from typing import List, Dict, Optional
-from config import DB_PATH
+import re
+import time
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Iterable, List, Dict, Optional, Sequence, Tuple
+from config import (
+    DB_PATH,
+    DB_READ_POOL_SIZE,
+    DB_JOURNAL_MODE,
+    DB_SYNCHRONOUS,
+    DB_CACHE_SIZE,
+    DB_MMAP_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_WRITE_BUFFER_SIZE,
+    DB_WRITE_BUFFER_INTERVAL,
+    REMINDER_POLICY,
+    REMINDER_MAX_PER_CHAT,
+    SEARCH_RANK_CANDIDATES,
+    TENANT_MATCHER_CACHE_SIZE,
+    SCENARIO_GLOBAL_FALLBACK
+)
+from connections import ConnectionRegistry
+from matcher import AHO_CORASICK_MIN_PATTERNS, ScenarioMatcher
+from keyboards import scenario_keyboards
+from metrics import DB_SECONDS
+from scenario import Scenario
+from sharding import shard_index
+from tenant_matchers import TenantMatcherCache
 
 logger = logging.getLogger(__name__)
 
+# Что делать с уже ожидающим напоминанием того же сценария в том же чате
+_REMINDER_CONFLICT = {
+    'replace': "DO UPDATE SET due_at = excluded.due_at, attempts = 0",
+    'extend': "DO UPDATE SET due_at = MAX(due_at, excluded.due_at), attempts = 0",
+    'keep-first': "DO NOTHING",
+}
+
+# Полнотекстовый индекс сценариев (external content: текст хранится только
+# в scenarios, триггеры держат индекс в согласии с таблицей)
+_SCENARIOS_FTS = [
+    """
+    CREATE VIRTUAL TABLE scenarios_fts USING fts5(
+        trigger_value, response_text,
+        content = 'scenarios', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS scenarios_fts_insert AFTER INSERT ON scenarios BEGIN
+        INSERT INTO scenarios_fts (rowid, trigger_value, response_text)
+        VALUES (new.id, new.trigger_value, new.response_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS scenarios_fts_delete AFTER DELETE ON scenarios BEGIN
+        INSERT INTO scenarios_fts (scenarios_fts, rowid, trigger_value, response_text)
+        VALUES ('delete', old.id, old.trigger_value, old.response_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS scenarios_fts_update AFTER UPDATE OF trigger_value, response_text ON scenarios BEGIN
+        INSERT INTO scenarios_fts (scenarios_fts, rowid, trigger_value, response_text)
+        VALUES ('delete', old.id, old.trigger_value, old.response_text);
+        INSERT INTO scenarios_fts (rowid, trigger_value, response_text)
+        VALUES (new.id, new.trigger_value, new.response_text);
+    END
+    """,
+]
+
+# Совпадение в триггере весит больше, чем в тексте ответа
+_SEARCH_RANK = "bm25(scenarios_fts, 2.0, 1.0)"
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Запрос FTS5 из строки админа: все слова, каждое как префикс
+
+    Слова берутся в кавычки, так что синтаксис FTS5 (AND, NEAR, *, :)
+    во вводе не интерпретируется. None - в строке нет ни одного слова.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class ConnectionPool:
+    """
+    Долгоживущие соединения с SQLite
+    
+    Одно соединение на запись (запись сериализуется через lock) и небольшой
+    пул соединений на чтение. В режиме WAL читатели не блокируют писателя.
+    """
+    
+    def __init__(self, db_path: str, read_pool_size: int = DB_READ_POOL_SIZE):
+        self.db_path = db_path
+        self.read_pool_size = max(1, read_pool_size)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+    
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открыть соединение и применить PRAGMA"""
+        conn = await aiosqlite.connect(self.db_path)
+        self._connections.append(conn)
+        conn.row_factory = aiosqlite.Row
+        await self._pragma(conn, f"busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        await self._pragma(conn, f"synchronous = {DB_SYNCHRONOUS}")
+        await self._pragma(conn, f"cache_size = {DB_CACHE_SIZE}")
+        await self._pragma(conn, f"mmap_size = {DB_MMAP_SIZE}")
+        # Тот же номер воркера, что у Supervisor: выборка своего шарда без чужих строк
+        await conn.create_function('shard_index', 2, shard_index, deterministic=True)
+        return conn
+    
+    @staticmethod
+    async def _pragma(conn: aiosqlite.Connection, pragma: str):
+        """Выполнить PRAGMA и сразу закрыть курсор (иначе statement держит блокировку)"""
+        async with conn.execute(f"PRAGMA {pragma}") as cursor:
+            await cursor.fetchall()
+    
+    async def open(self):
+        """Открыть соединения (повторный вызов ничего не делает)"""
+        # Lock'и создаются лениво, чтобы не привязываться к event loop при импорте
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            
+            try:
+                writer = await self._connect()
+                # journal_mode хранится в самом файле БД, достаточно выставить один раз
+                await self._pragma(writer, f"journal_mode = {DB_JOURNAL_MODE}")
+                
+                readers = asyncio.Queue()
+                for _ in range(self.read_pool_size):
+                    readers.put_nowait(await self._connect())
+            except Exception:
+                # Не оставляем висящих потоков aiosqlite
+                for conn in self._connections:
+                    await conn.close()
+                self._connections = []
+                raise
+            
+            self._write_lock = asyncio.Lock()
+            self._readers = readers
+            self._writer = writer
+            logger.info(f"Пул соединений открыт: 1 запись + {self.read_pool_size} чтение")
+    
+    async def close(self):
+        """Закрыть все соединения пула"""
+        if self._writer is None:
+            return
+        
+        connections, self._connections = self._connections, []
+        self._writer = None
+        self._readers = None
+        for conn in connections:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия соединения: {e}")
+        logger.info("Пул соединений закрыт")
+    
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Взять соединение на чтение из пула"""
+        if self._writer is None:
+            await self.open()
+        
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Эксклюзивный доступ к соединению на запись
+        
+        Коммит выполняется при выходе из блока, при ошибке - откат.
+        """
+        if self._writer is None:
+            await self.open()
+        
+        async with self._write_lock:
+            writer = self._writer
+            try:
+                yield writer
+                await writer.commit()
+            except BaseException:
+                await writer.rollback()
+                raise
+
+
+class WriteBehindBuffer:
+    """
+    Отложенная запись append-only строк
+    
+    add() только кладёт строку в память; накопленные строки пишутся одним
+    executemany в одной транзакции, когда их становится max_rows или
+    через interval секунд после первой. Так на пачку строк приходится
+    одна фиксация вместо фиксации на строку. Строки, не записанные из-за
+    ошибки, остаются в буфере и пишутся повторно с растущей паузой (не
+    дольше _MAX_RETRY_DELAY секунд), в буфере - не больше _MAX_BACKLOG
+    пачек. При падении процесса теряется не больше
+    последних interval секунд записей, поэтому буфер - только для данных,
+    потеря которых не ломает логику (история, статистика).
+    """
+    
+    # Сколько пачек держать в буфере, пока запись не удаётся
+    _MAX_BACKLOG = 10
+    # Наибольшая пауза перед повтором неудавшейся записи, секунд
+    _MAX_RETRY_DELAY = 60.0
+    
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        sql: str,
+        max_rows: int = DB_WRITE_BUFFER_SIZE,
+        interval: float = DB_WRITE_BUFFER_INTERVAL
+    ):
+        self.pool = pool
+        self.sql = sql
+        self.max_rows = max(1, max_rows)
+        self.interval = interval
+        self._rows: List[Sequence[Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        # Первая строка пачки или заполненный буфер
+        self._signal: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # Неудачные записи подряд
+        self._failures = 0
+        
+        self.stats = {
+            'rows': 0,
+            'flushes': 0,
+            'errors': 0,
+            'dropped': 0,
+        }
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def add(self, row: Sequence[Any]):
+        """Поставить строку в очередь записи (вызывается из работающего event loop)"""
+        self._rows.append(row)
+        if self._task is None:
+            self._signal = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run(), name="db-write-behind")
+        if len(self._rows) == 1 or len(self._rows) >= self.max_rows:
+            self._signal.set()
+    
+    async def _run(self):
+        while True:
+            # Первая строка пачки запускает отсчёт interval
+            await self._signal.wait()
+            self._signal.clear()
+            if len(self._rows) < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._signal.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._signal.clear()
+            await self.flush()
+            if self._failures and self._rows:
+                # Строки вернулись в буфер - сами они запись не запустят
+                delay = min(self.interval * 2 ** (self._failures - 1), self._MAX_RETRY_DELAY)
+                logger.warning(f"Повтор отложенной записи через {delay:.1f} с ({len(self._rows)} строк)")
+                await asyncio.sleep(delay)
+                self._signal.set()
+    
+    async def flush(self):
+        """Записать накопленные строки"""
+        if not self._rows or self._flush_lock is None:
+            return
+        
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                async with self.pool.write() as db:
+                    await db.executemany(self.sql, rows)
+            except BaseException as e:
+                # Не записанное (в том числе при отмене) - обратно в начало буфера
+                self._rows = rows + self._rows
+                if not isinstance(e, Exception):
+                    raise
+                self.stats['errors'] += 1
+                self._failures += 1
+                overflow = len(self._rows) - self.max_rows * self._MAX_BACKLOG
+                if overflow > 0:
+                    del self._rows[:overflow]
+                    self.stats['dropped'] += overflow
+                logger.error(f"Ошибка отложенной записи ({len(rows)} строк): {e}")
+                return
+            self._failures = 0
+            self.stats['rows'] += len(rows)
+            self.stats['flushes'] += 1
+    
+    async def close(self):
+        """Остановить фоновую запись и записать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
 
 class Database:
     """Класс для работы с базой данных"""
     
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path)
+        # Снимок активных общих сценариев, подменяется новым после каждого изменения
+        self.matcher = ScenarioMatcher()
+        # Снимки сценариев подключений, загружаются при первом обращении
+        self.tenant_matchers = TenantMatcherCache(TENANT_MATCHER_CACHE_SIZE)
+        self._reload_lock: Optional[asyncio.Lock] = None
+        # Вызываются с id сценария, изменённого через этот экземпляр
+        self._change_listeners: List[Callable[[Optional[int]], None]] = []
+        # Состояние бизнес-подключений для проверки перед ответом
+        self.connections = ConnectionRegistry()
+        # Вызываются с id подключения, изменённого через этот экземпляр
+        self._connection_listeners: List[Callable[[str], None]] = []
+        # Есть ли полнотекстовый индекс scenarios_fts (выясняется в init_db)
+        self.fts_enabled = False
+        # Отложенная запись истории напоминаний
+        self.reminder_history = WriteBehindBuffer(self.pool, """
+            INSERT INTO reminder_history (scenario_id, chat_id, business_connection_id)
+            VALUES (?, ?, ?)
+        """)
+    
+    @property
+    def write_buffer_depth(self) -> Dict[str, int]:
+        """Строки, ожидающие отложенной записи, по таблицам"""
+        return {'reminder_history': len(self.reminder_history)}
+    
+    async def flush_writes(self):
+        """Записать всё, что накопили буферы отложенной записи"""
+        await self.reminder_history.close()
+    
+    async def close(self):
+        """Закрыть соединения с базой данных"""
+        await self.flush_writes()
+        await self.pool.close()
     
     async def init_db(self):
         """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.pool.open()
+        
+        async with self.pool.write() as db:
             # Таблица сценариев
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS scenarios (
@@ -29,10 +380,32 @@ class Database:
                     is_reminder INTEGER DEFAULT 0,
                     reminder_delay_min INTEGER DEFAULT 0,
                     active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    cooldown_sec INTEGER DEFAULT 0,
+                    business_connection_id TEXT
                 )
             """)
             
+            # Миграция баз, созданных до появления паузы между ответами
+            await self._ensure_column(db, 'scenarios', 'cooldown_sec', 'INTEGER DEFAULT 0')
+            # Сценарии подключений: NULL - общий сценарий
+            await self._ensure_column(db, 'scenarios', 'business_connection_id', 'TEXT')
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scenarios_tenant
+                ON scenarios (business_connection_id, active)
+            """)
+            # Выборка активных по типу триггера и постраничный список в
+            # админке (ключ страницы - created_at и id, id есть в индексе как rowid)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scenarios_active_type
+                ON scenarios (active, trigger_type)
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scenarios_created_at
+                ON scenarios (created_at)
+            """)
+            self.fts_enabled = await self._ensure_scenarios_fts(db)
+            
             # Таблица для хранения business_connection_id
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS business_connections (
@@ -40,9 +413,11 @@ class Database:
                     business_connection_id TEXT UNIQUE NOT NULL,
                     user_id INTEGER,
                     can_reply INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    is_enabled INTEGER DEFAULT 1
                 )
             """)
+            await self._ensure_column(db, 'business_connections', 'is_enabled', 'INTEGER DEFAULT 1')
             
             # Таблица для истории отправленных напоминаний
             await db.execute("""
@@ -55,10 +430,204 @@ class Database:
                     FOREIGN KEY (scenario_id) REFERENCES scenarios(id)
                 )
             """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_reminder_history_chat
+                ON reminder_history (chat_id, sent_at)
+            """)
+            
+            # Очередь напоминаний: строка живёт до отправки, переживает перезапуск
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS pending_reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scenario_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    business_connection_id TEXT NOT NULL,
+                    due_at REAL NOT NULL,
+                    attempts INTEGER DEFAULT 0
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_pending_reminders_due_at
+                ON pending_reminders (due_at)
+            """)
+            # Одно напоминание на сценарий в чате; индекс же ищет напоминания чата
+            async with db.execute("""
+                SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_pending_reminders_key'
+            """) as cursor:
+                has_key = await cursor.fetchone() is not None
+            if not has_key:
+                await db.execute("""
+                    DELETE FROM pending_reminders WHERE id NOT IN (
+                        SELECT MIN(id) FROM pending_reminders
+                        GROUP BY business_connection_id, chat_id, scenario_id
+                    )
+                """)
+                await db.execute("""
+                    CREATE UNIQUE INDEX idx_pending_reminders_key
+                    ON pending_reminders (business_connection_id, chat_id, scenario_id)
+                """)
+            
+            # Таблица для сохранения пауз между ответами при перезапуске
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS reply_cooldowns (
+                    business_connection_id TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    scenario_id INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (business_connection_id, chat_id, scenario_id)
+                )
+            """)
+            
+        logger.info("База данных инициализирована")
+        await self.reload_scenarios()
+        self.connections.load(await self.get_business_connections())
+    
+    @staticmethod
+    async def _ensure_scenarios_fts(db: aiosqlite.Connection) -> bool:
+        """Создать полнотекстовый индекс сценариев, False - FTS5 недоступен"""
+        async with db.execute("""
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scenarios_fts'
+        """) as cursor:
+            if await cursor.fetchone() is not None:
+                return True
+        try:
+            for statement in _SCENARIOS_FTS:
+                await db.execute(statement)
+        except aiosqlite.OperationalError as e:
+            # SQLite собран без FTS5 - поиск работает через LIKE
+            logger.warning(f"Полнотекстовый поиск недоступен: {e}")
+            return False
+        # Индексируем сценарии, добавленные до появления индекса
+        await db.execute("INSERT INTO scenarios_fts (scenarios_fts) VALUES ('rebuild')")
+        logger.info("Создан полнотекстовый индекс сценариев")
+        return True
+    
+    @staticmethod
+    async def _ensure_column(db: aiosqlite.Connection, table: str, column: str, definition: str):
+        """Добавить колонку в существующую таблицу, если её нет"""
+        async with db.execute(f"PRAGMA table_info({table})") as cursor:
+            columns = {row['name'] for row in await cursor.fetchall()}
+        if column not in columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Добавлена колонка {table}.{column}")
+    
+    def _get_reload_lock(self) -> asyncio.Lock:
+        # Обновления снимка сериализуются, чтобы более старая выборка
+        # не перезаписала более свежую
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        return self._reload_lock
+    
+    @DB_SECONDS.timed('reload_scenarios')
+    async def reload_scenarios(self):
+        """
+        Полностью перестроить in-memory снимок общих сценариев
+        
+        Снимки подключений сбрасываются и загрузятся заново при следующем
+        обращении.
+        """
+        async with self._get_reload_lock():
+            rows = await self._fetch_active_scenarios()
+            # Разбор строк, компиляция автомата и сборка клавиатур на больших
+            # наборах занимают заметное время
+            self.matcher = await asyncio.to_thread(self._compile_global, rows)
+            self.tenant_matchers.clear()
+        
+        logger.debug(f"Снимок сценариев перестроен: {len(rows)} активных общих")
+    
+    @staticmethod
+    def _compile_global(rows: List[aiosqlite.Row]) -> ScenarioMatcher:
+        scenarios = [Scenario.from_row(row) for row in rows]
+        scenario_keyboards.reset(scenarios)
+        return ScenarioMatcher(scenarios)
+    
+    @staticmethod
+    def _compile_tenant(rows: List[aiosqlite.Row]) -> ScenarioMatcher:
+        scenarios = [Scenario.from_row(row) for row in rows]
+        for scenario in scenarios:
+            scenario_keyboards.update(scenario)
+        return ScenarioMatcher(scenarios)
+    
+    @staticmethod
+    def _drop_keyboards(evicted: List[ScenarioMatcher]):
+        """Убрать из кэша клавиатуры сценариев вытесненных снимков подключений"""
+        for matcher in evicted:
+            for scenario in matcher.scenarios():
+                scenario_keyboards.invalidate(scenario.id)
+    
+    async def get_tenant_matcher(self, business_connection_id: str) -> ScenarioMatcher:
+        """Снимок сценариев подключения; при первом обращении - загрузить из БД"""
+        matcher = self.tenant_matchers.get(business_connection_id)
+        if matcher is not None:
+            return matcher
+        
+        # Загрузка под той же блокировкой, что и обновления снимков: правка,
+        # сделанная во время выборки, не потеряется
+        async with self._get_reload_lock():
+            # Пока ждали, снимок мог загрузить параллельный запрос
+            matcher = self.tenant_matchers.peek(business_connection_id)
+            if matcher is not None:
+                return matcher
+            
+            rows = await self._fetch_active_scenarios(business_connection_id)
+            if len(rows) < AHO_CORASICK_MIN_PATTERNS:
+                matcher = self._compile_tenant(rows)
+            else:
+                matcher = await asyncio.to_thread(self._compile_tenant, rows)
+            self._drop_keyboards(self.tenant_matchers.put(business_connection_id, matcher))
+        
+        logger.debug(f"Загружены сценарии подключения {business_connection_id}: {len(rows)}")
+        return matcher
+    
+    def add_change_listener(self, listener: Callable[[Optional[int]], None]):
+        """
+        Подписаться на изменения сценариев
+
+        listener(scenario_id) вызывается после добавления, правки, удаления
+        или переключения сценария, когда снимок этого процесса уже обновлён;
+        listener(None) - после массового импорта, снимок перестроен целиком.
+        Через него другие процессы узнают, что их снимок устарел.
+        """
+        self._change_listeners.append(listener)
+    
+    async def refresh_scenario(self, scenario_id: int):
+        """Обновить в снимках один сценарий после его изменения в БД"""
+        async with self._get_reload_lock():
+            scenario = await self.get_scenario_by_id(scenario_id)
+            tenant = scenario.business_connection_id if scenario else None
+            
+            # Убираем сценарий из снимков, где его больше нет (удалён или
+            # перенесён к другому подключению)
+            if scenario is None or tenant is not None:
+                self.matcher = self.matcher.without_scenario(scenario_id)
+            for business_connection_id, matcher in self.tenant_matchers.items():
+                if business_connection_id != tenant and matcher.get(scenario_id) is not None:
+                    self._drop_keyboards(self.tenant_matchers.replace(
+                        business_connection_id, matcher.without_scenario(scenario_id)
+                    ))
             
-            await db.commit()
-            logger.info("База данных инициализирована")
+            if tenant is None:
+                target = self.matcher
+            else:
+                # Снимок не загруженного подключения обновлять не нужно
+                target = self.tenant_matchers.peek(tenant)
+            if scenario is None or target is None:
+                scenario_keyboards.invalidate(scenario_id)
+                return
+            
+            target = await asyncio.to_thread(target.with_scenario, scenario)
+            if tenant is None:
+                self.matcher = target
+            else:
+                self._drop_keyboards(self.tenant_matchers.replace(tenant, target))
+            scenario_keyboards.update(scenario)
+    
+    async def _scenario_changed(self, scenario_id: int):
+        await self.refresh_scenario(scenario_id)
+        for listener in self._change_listeners:
+            listener(scenario_id)
     
+    @DB_SECONDS.timed('add_scenario')
     async def add_scenario(
         self,
         trigger_type: str,
@@ -66,43 +635,230 @@ class Database:
         response_text: str,
         keyboard_json: Optional[str] = None,
         is_reminder: bool = False,
-        reminder_delay_min: int = 0
+        reminder_delay_min: int = 0,
+        cooldown_sec: int = 0,
+        business_connection_id: Optional[str] = None
     ) -> int:
-        """Добавить новый сценарий"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Добавить новый сценарий (business_connection_id=None - общий)"""
+        async with self.pool.write() as db:
             cursor = await db.execute("""
                 INSERT INTO scenarios 
-                (trigger_type, trigger_value, response_text, keyboard_json, is_reminder, reminder_delay_min)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (trigger_type, trigger_value, response_text, keyboard_json, is_reminder, reminder_delay_min,
+                 cooldown_sec, business_connection_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (trigger_type, trigger_value, response_text, keyboard_json, 
-                  1 if is_reminder else 0, reminder_delay_min))
-            await db.commit()
-            logger.info(f"Добавлен сценарий ID={cursor.lastrowid}, trigger={trigger_value}")
-            return cursor.lastrowid
+                  1 if is_reminder else 0, reminder_delay_min, cooldown_sec, business_connection_id))
+        
+        logger.info(f"Добавлен сценарий ID={cursor.lastrowid}, trigger={trigger_value}")
+        await self._scenario_changed(cursor.lastrowid)
+        return cursor.lastrowid
     
-    async def get_all_scenarios(self, active_only: bool = False) -> List[Dict]:
+    @DB_SECONDS.timed('import_scenarios')
+    async def import_scenarios(self, rows: Iterable[Sequence], batch_size: int = 500) -> int:
+        """
+        Добавить сценарии одной транзакцией
+        
+        Args:
+            rows: Значения в порядке scenario_io.SCENARIO_FIELDS (created_at
+                None - текущее время); итератор
+                читается в потоке пачками по batch_size (разбор файла не
+                занимает event loop, в памяти - одна пачка)
+            batch_size: Строк на один executemany
+        
+        Returns:
+            Количество добавленных сценариев
+        
+        Ошибка на любой строке (в том числе исключение из rows) откатывает
+        весь импорт. Снимок сценариев перестраивается один раз в конце.
+        """
+        rows = iter(rows)
+        count = 0
+        async with self.pool.write() as db:
+            while True:
+                batch = await asyncio.to_thread(lambda: list(islice(rows, batch_size)))
+                if not batch:
+                    break
+                await db.executemany("""
+                    INSERT INTO scenarios
+                    (trigger_type, trigger_value, response_text, keyboard_json, is_reminder, reminder_delay_min,
+                     cooldown_sec, active, business_connection_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                """, batch)
+                count += len(batch)
+        
+        logger.info(f"Импортировано сценариев: {count}")
+        if count:
+            await self.reload_scenarios()
+            for listener in self._change_listeners:
+                listener(None)
+        return count
+    
+    async def iter_scenarios(self, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Все сценарии по возрастанию id, без загрузки таблицы в память"""
+        async with self.pool.read() as db:
+            async with db.execute("SELECT * FROM scenarios ORDER BY id") as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield dict(row)
+    
+    @DB_SECONDS.timed('get_all_scenarios')
+    async def get_all_scenarios(self, active_only: bool = False) -> List[Scenario]:
         """Получить все сценарии"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             query = "SELECT * FROM scenarios"
             if active_only:
                 query += " WHERE active = 1"
-            query += " ORDER BY created_at DESC"
+            # При равном created_at - по возрастанию id (см. scenario_priority);
+            # без явного id порядок зависел бы от выбранного индекса
+            query += " ORDER BY created_at DESC, id ASC"
             
             async with db.execute(query) as cursor:
                 rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                return [Scenario.from_row(row) for row in rows]
+    
+    async def get_active_scenarios(self, business_connection_id: Optional[str] = None) -> List[Scenario]:
+        """Активные сценарии подключения (None - общие) в порядке get_all_scenarios"""
+        return [Scenario.from_row(row) for row in await self._fetch_active_scenarios(business_connection_id)]
+    
+    @DB_SECONDS.timed('get_active_scenarios')
+    async def _fetch_active_scenarios(self, business_connection_id: Optional[str] = None) -> List[aiosqlite.Row]:
+        """Строки get_active_scenarios без разбора в Scenario"""
+        async with self.pool.read() as db:
+            if business_connection_id is None:
+                condition, params = "business_connection_id IS NULL", ()
+            else:
+                condition, params = "business_connection_id = ?", (business_connection_id,)
+            async with db.execute(f"""
+                SELECT * FROM scenarios WHERE {condition} AND active = 1
+                ORDER BY created_at DESC, id ASC
+            """, params) as cursor:
+                return await cursor.fetchall()
+    
+    @DB_SECONDS.timed('get_scenarios_page')
+    async def get_scenarios_page(
+        self,
+        limit: int,
+        after: Optional[Tuple[str, int]] = None,
+        before: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[Scenario], bool, bool]:
+        """
+        Страница сценариев в порядке списка (created_at DESC, id DESC)
+
+        Постраничная выборка по ключу, а не OFFSET: страница читается по
+        индексу idx_scenarios_created_at за O(limit) при любом числе сценариев.
+
+        Args:
+            limit: Размер страницы
+            after: (created_at, id) последнего сценария предыдущей страницы
+            before: (created_at, id) первого сценария следующей страницы
+
+        Returns:
+            (сценарии, есть ли страница до, есть ли страница после)
+        """
+        async with self.pool.read() as db:
+            if before is not None:
+                # Назад - читаем в обратном порядке и разворачиваем
+                async with db.execute("""
+                    SELECT * FROM scenarios WHERE (created_at, id) > (?, ?)
+                    ORDER BY created_at ASC, id ASC LIMIT ?
+                """, (*before, limit + 1)) as cursor:
+                    rows = [Scenario.from_row(row) for row in await cursor.fetchall()]
+                has_prev = len(rows) > limit
+                return rows[:limit][::-1], has_prev, True
+
+            if after is not None:
+                query = """
+                    SELECT * FROM scenarios WHERE (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC LIMIT ?
+                """
+                params = (*after, limit + 1)
+            else:
+                query = "SELECT * FROM scenarios ORDER BY created_at DESC, id DESC LIMIT ?"
+                params = (limit + 1,)
+            async with db.execute(query, params) as cursor:
+                rows = [Scenario.from_row(row) for row in await cursor.fetchall()]
+            return rows[:limit], after is not None, len(rows) > limit
+    
+    @DB_SECONDS.timed('count_scenarios')
+    async def count_scenarios(self, active_only: bool = False) -> int:
+        """Количество сценариев"""
+        async with self.pool.read() as db:
+            query = "SELECT COUNT(*) FROM scenarios"
+            if active_only:
+                query += " WHERE active = 1"
+            async with db.execute(query) as cursor:
+                return (await cursor.fetchone())[0]
+    
+    @DB_SECONDS.timed('search_scenarios')
+    async def search_scenarios(
+        self,
+        text: str,
+        limit: int,
+        offset: int = 0,
+        rank_candidates: int = SEARCH_RANK_CANDIDATES
+    ) -> Tuple[List[Scenario], bool]:
+        """
+        Поиск сценариев по триггеру и тексту ответа
+        
+        Результаты упорядочены по релевантности (bm25 индекса scenarios_fts)
+        среди rank_candidates самых новых совпадений - дальше них страницы
+        не идут. Без FTS5 - подстрока через LIKE, новые выше.
+        
+        Args:
+            text: Строка поиска (все слова, каждое как начало слова)
+            limit: Размер страницы
+            offset: Сколько результатов пропустить
+            rank_candidates: Сколько самых новых совпадений ранжировать
+        
+        Returns:
+            (сценарии страницы, есть ли следующая страница)
+        """
+        async with self.pool.read() as db:
+            if self.fts_enabled:
+                query = fts_query(text)
+                if query is None:
+                    return [], False
+                # bm25 считается только для rank_candidates самых новых
+                # совпадений (FTS5 отдаёт их по rowid без сортировки), строки
+                # сценариев читаются только для страницы
+                sql = f"""
+                    SELECT scenarios.* FROM (
+                        SELECT rowid, {_SEARCH_RANK} AS score FROM scenarios_fts
+                        WHERE scenarios_fts MATCH ?
+                        ORDER BY rowid DESC LIMIT ?
+                    ) AS hits
+                    JOIN scenarios ON scenarios.id = hits.rowid
+                    ORDER BY hits.score, hits.rowid DESC
+                    LIMIT ? OFFSET ?
+                """
+                params = (query, rank_candidates, limit + 1, offset)
+            else:
+                pattern = '%' + text.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                sql = """
+                    SELECT * FROM scenarios
+                    WHERE trigger_value LIKE ? ESCAPE '\\' OR response_text LIKE ? ESCAPE '\\'
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ? OFFSET ?
+                """
+                params = (pattern, pattern, limit + 1, offset)
+            async with db.execute(sql, params) as cursor:
+                rows = [Scenario.from_row(row) for row in await cursor.fetchall()]
+        return rows[:limit], len(rows) > limit
     
-    async def get_scenario_by_id(self, scenario_id: int) -> Optional[Dict]:
+    @DB_SECONDS.timed('get_scenario_by_id')
+    async def get_scenario_by_id(self, scenario_id: int) -> Optional[Scenario]:
         """Получить сценарий по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM scenarios WHERE id = ?", (scenario_id,)
             ) as cursor:
                 row = await cursor.fetchone()
-                return dict(row) if row else None
+                return Scenario.from_row(row) if row else None
     
+    @DB_SECONDS.timed('update_scenario')
     async def update_scenario(
         self,
         scenario_id: int,
@@ -111,7 +867,8 @@ class Database:
         response_text: Optional[str] = None,
         keyboard_json: Optional[str] = None,
         is_reminder: Optional[bool] = None,
-        reminder_delay_min: Optional[int] = None
+        reminder_delay_min: Optional[int] = None,
+        cooldown_sec: Optional[int] = None
     ) -> bool:
         """Обновить сценарий"""
         # Формируем запрос динамически
@@ -136,6 +893,9 @@ class Database:
         if reminder_delay_min is not None:
             updates.append("reminder_delay_min = ?")
             values.append(reminder_delay_min)
+        if cooldown_sec is not None:
+            updates.append("cooldown_sec = ?")
+            values.append(cooldown_sec)
         
         if not updates:
             return False
@@ -143,92 +903,124 @@ class Database:
         values.append(scenario_id)
         query = f"UPDATE scenarios SET {', '.join(updates)} WHERE id = ?"
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(query, values)
-            await db.commit()
-            logger.info(f"Сценарий ID={scenario_id} обновлён")
-            return True
+        
+        logger.info(f"Сценарий ID={scenario_id} обновлён")
+        await self._scenario_changed(scenario_id)
+        return True
     
+    @DB_SECONDS.timed('delete_scenario')
     async def delete_scenario(self, scenario_id: int) -> bool:
         """Удалить сценарий"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute("DELETE FROM scenarios WHERE id = ?", (scenario_id,))
-            await db.commit()
-            logger.info(f"Сценарий ID={scenario_id} удалён")
-            return True
+        
+        logger.info(f"Сценарий ID={scenario_id} удалён")
+        await self._scenario_changed(scenario_id)
+        return True
     
+    @DB_SECONDS.timed('toggle_scenario_active')
     async def toggle_scenario_active(self, scenario_id: int) -> bool:
         """Переключить активность сценария"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute("""
                 UPDATE scenarios 
                 SET active = CASE WHEN active = 1 THEN 0 ELSE 1 END 
                 WHERE id = ?
             """, (scenario_id,))
-            await db.commit()
-            logger.info(f"Переключена активность сценария ID={scenario_id}")
-            return True
+        
+        logger.info(f"Переключена активность сценария ID={scenario_id}")
+        await self._scenario_changed(scenario_id)
+        return True
     
+    @DB_SECONDS.timed('find_matching_scenario')
     async def find_matching_scenario(
         self,
         message_text: str,
-        callback_data: Optional[str] = None
-    ) -> Optional[Dict]:
+        callback_data: Optional[str] = None,
+        business_connection_id: Optional[str] = None
+    ) -> Optional[Scenario]:
         """
         Найти подходящий сценарий по тексту сообщения или callback
         
         Args:
             message_text: Текст сообщения от клиента
             callback_data: Callback data от нажатия кнопки
+            business_connection_id: Подключение - сначала ищем среди его сценариев
         
         Returns:
             Первый подходящий активный сценарий или None
-        """
-        scenarios = await self.get_all_scenarios(active_only=True)
-        
-        for scenario in scenarios:
-            trigger_type = scenario['trigger_type']
-            trigger_value = scenario['trigger_value'].lower()
-            
-            # Обработка callback триггеров
-            if trigger_type == 'callback' and callback_data:
-                if callback_data == trigger_value:
-                    return scenario
-            
-            # Обработка текстовых триггеров
-            elif message_text and trigger_type in ['exact', 'contains']:
-                message_lower = message_text.lower().strip()
-                
-                if trigger_type == 'exact':
-                    if message_lower == trigger_value:
-                        return scenario
-                
-                elif trigger_type == 'contains':
-                    if trigger_value in message_lower:
-                        return scenario
         
-        return None
+        Сценарии подключения важнее общих; общие используются, только если
+        своего не нашлось и включён SCENARIO_GLOBAL_FALLBACK.
+        """
+        # Поиск идёт по in-memory снимкам, к SQLite - только при первом
+        # сообщении подключения
+        if business_connection_id is not None:
+            tenant = await self.get_tenant_matcher(business_connection_id)
+            scenario = tenant.match(message_text, callback_data)
+            if scenario is not None or not SCENARIO_GLOBAL_FALLBACK:
+                return scenario
+        return self.matcher.match(message_text, callback_data)
+    
+    async def get_active_scenario(
+        self,
+        scenario_id: int,
+        business_connection_id: Optional[str] = None
+    ) -> Optional[Scenario]:
+        """Активный сценарий из снимков: общий или сценарий подключения"""
+        scenario = self.matcher.get(scenario_id)
+        if scenario is None and business_connection_id is not None:
+            scenario = (await self.get_tenant_matcher(business_connection_id)).get(scenario_id)
+        return scenario
     
+    @DB_SECONDS.timed('save_business_connection')
     async def save_business_connection(
         self,
         business_connection_id: str,
         user_id: Optional[int] = None,
-        can_reply: bool = True
+        can_reply: bool = True,
+        is_enabled: bool = True
     ):
-        """Сохранить business connection"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Сохранить business connection и обновить реестр подключений"""
+        async with self.pool.write() as db:
             await db.execute("""
                 INSERT OR REPLACE INTO business_connections 
-                (business_connection_id, user_id, can_reply)
-                VALUES (?, ?, ?)
-            """, (business_connection_id, user_id, 1 if can_reply else 0))
-            await db.commit()
-            logger.info(f"Business connection сохранён: {business_connection_id}")
+                (business_connection_id, user_id, can_reply, is_enabled)
+                VALUES (?, ?, ?, ?)
+            """, (business_connection_id, user_id, 1 if can_reply else 0, 1 if is_enabled else 0))
+        
+        self.connections.update(business_connection_id, can_reply, is_enabled)
+        for listener in self._connection_listeners:
+            listener(business_connection_id)
+        logger.info(f"Business connection сохранён: {business_connection_id}")
+    
+    def add_connection_listener(self, listener: Callable[[str], None]):
+        """Подписаться на изменения бизнес-подключений (как add_change_listener)"""
+        self._connection_listeners.append(listener)
+    
+    async def refresh_business_connection(self, business_connection_id: str):
+        """Обновить подключение в реестре после его изменения в БД другим процессом"""
+        connection = await self.get_business_connection(business_connection_id)
+        if connection is None:
+            self.connections.forget(business_connection_id)
+        else:
+            self.connections.update(
+                business_connection_id, bool(connection['can_reply']), bool(connection['is_enabled'])
+            )
     
+    @DB_SECONDS.timed('get_business_connections')
+    async def get_business_connections(self) -> List[Dict]:
+        """Все business connections"""
+        async with self.pool.read() as db:
+            async with db.execute("SELECT * FROM business_connections") as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+    
+    @DB_SECONDS.timed('get_business_connection')
     async def get_business_connection(self, business_connection_id: str) -> Optional[Dict]:
         """Получить данные business connection"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM business_connections WHERE business_connection_id = ?",
                 (business_connection_id,)
@@ -242,13 +1034,195 @@ class Database:
         chat_id: int,
         business_connection_id: str
     ):
-        """Добавить запись об отправленном напоминании"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO reminder_history (scenario_id, chat_id, business_connection_id)
-                VALUES (?, ?, ?)
-            """, (scenario_id, chat_id, business_connection_id))
-            await db.commit()
+        """Добавить запись об отправленном напоминании (пишется отложенно, пачкой)"""
+        self.reminder_history.add((scenario_id, chat_id, business_connection_id))
+    
+    @DB_SECONDS.timed('add_pending_reminder')
+    async def add_pending_reminder(
+        self,
+        scenario_id: int,
+        chat_id: int,
+        business_connection_id: str,
+        due_at: float,
+        policy: str = REMINDER_POLICY,
+        max_per_chat: int = REMINDER_MAX_PER_CHAT
+    ) -> Optional[float]:
+        """
+        Поставить напоминание в очередь (due_at - unix-время отправки)
+        
+        На сценарий в чате хранится одно напоминание; повторный триггер
+        обрабатывается по policy (replace, extend, keep-first). Если у чата
+        уже max_per_chat напоминаний других сценариев, новое не ставится.
+        
+        Returns:
+            Время отправки поставленного или перенесённого напоминания,
+            None - ничего не изменилось
+        """
+        async with self.pool.write() as db:
+            async with db.execute("""
+                SELECT COUNT(*) FROM pending_reminders
+                WHERE business_connection_id = ? AND chat_id = ? AND scenario_id != ?
+            """, (business_connection_id, chat_id, scenario_id)) as cursor:
+                others = (await cursor.fetchone())[0]
+            if others >= max_per_chat:
+                return None
+            
+            # attempts = 0 отличает перенесённую строку от той, что сейчас
+            # отправляется, - complete_reminders её не удалит
+            cursor = await db.execute(f"""
+                INSERT INTO pending_reminders (scenario_id, chat_id, business_connection_id, due_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (business_connection_id, chat_id, scenario_id) {_REMINDER_CONFLICT[policy]}
+            """, (scenario_id, chat_id, business_connection_id, due_at))
+            if cursor.rowcount == 0:
+                return None
+            
+            async with db.execute("""
+                SELECT due_at FROM pending_reminders
+                WHERE business_connection_id = ? AND chat_id = ? AND scenario_id = ?
+            """, (business_connection_id, chat_id, scenario_id)) as cursor:
+                return (await cursor.fetchone())[0]
+    
+    @DB_SECONDS.timed('cancel_pending_reminders')
+    async def cancel_pending_reminders(
+        self,
+        business_connection_id: str,
+        chat_id: int,
+        keep_scenario_id: Optional[int] = None
+    ) -> int:
+        """Отменить ожидающие напоминания чата (кроме keep_scenario_id), вернуть их количество"""
+        query = "DELETE FROM pending_reminders WHERE business_connection_id = ? AND chat_id = ?"
+        params: Tuple = (business_connection_id, chat_id)
+        if keep_scenario_id is not None:
+            query += " AND scenario_id != ?"
+            params += (keep_scenario_id,)
+        async with self.pool.write() as db:
+            cursor = await db.execute(query, params)
+            return cursor.rowcount
+    
+    @DB_SECONDS.timed('cancel_connection_reminders')
+    async def cancel_connection_reminders(self, business_connection_id: str) -> int:
+        """Отменить все ожидающие напоминания подключения, вернуть их количество"""
+        async with self.pool.write() as db:
+            cursor = await db.execute("""
+                DELETE FROM pending_reminders WHERE business_connection_id = ?
+            """, (business_connection_id,))
+            return cursor.rowcount
+    
+    @DB_SECONDS.timed('get_pending_reminders')
+    async def get_pending_reminders(
+        self,
+        shard: Optional[Tuple[int, int]] = None
+    ) -> List[Tuple[str, int, int, float]]:
+        """
+        Ожидающие напоминания: (business_connection_id, chat_id, scenario_id, due_at)
+
+        shard - (номер воркера, число воркеров): только напоминания чатов,
+        которые Supervisor отдаёт этому воркеру (sharding.shard_index).
+        """
+        query = "SELECT business_connection_id, chat_id, scenario_id, due_at FROM pending_reminders"
+        params: Tuple = ()
+        if shard is not None:
+            index, workers = shard
+            query += " WHERE shard_index(business_connection_id || ':' || chat_id, ?) = ?"
+            params = (workers, index)
+        async with self.pool.read() as db:
+            async with db.execute(query, params) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+    
+    @DB_SECONDS.timed('claim_due_reminders')
+    async def claim_due_reminders(
+        self,
+        now: float,
+        limit: int,
+        lease_sec: float,
+        shard: Optional[Tuple[int, int]] = None
+    ) -> List[Dict]:
+        """
+        Забрать напоминания, время которых наступило
+        
+        Строки не удаляются, а откладываются на lease_sec с увеличением
+        счётчика попыток: если отправка не удалась или процесс упал,
+        напоминание вернётся в очередь. Выборка и отметка идут в одной
+        транзакции BEGIN IMMEDIATE, поэтому несколько процессов не заберут
+        одну строку дважды. Напоминание - только ссылка на сценарий и чат,
+        текст и клавиатура берутся из снимка сценариев при отправке.
+        
+        shard - (номер воркера, число воркеров): только напоминания чатов
+        этого воркера (как в get_pending_reminders), чтобы они уходили через
+        его очередь отправки и оставались в его таймерах.
+        """
+        query = """
+            SELECT id, scenario_id, chat_id, business_connection_id, attempts
+            FROM pending_reminders
+            WHERE due_at <= ?
+        """
+        params: Tuple = (now,)
+        if shard is not None:
+            index, workers = shard
+            query += " AND shard_index(business_connection_id || ':' || chat_id, ?) = ?"
+            params += (workers, index)
+        query += " ORDER BY due_at LIMIT ?"
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            async with db.execute(query, (*params, limit)) as cursor:
+                reminders = [dict(row) for row in await cursor.fetchall()]
+            
+            await db.executemany("""
+                UPDATE pending_reminders SET due_at = ?, attempts = attempts + 1 WHERE id = ?
+            """, [(now + lease_sec, reminder['id']) for reminder in reminders])
+        
+        for reminder in reminders:
+            reminder['attempts'] += 1
+        return reminders
+    
+    @DB_SECONDS.timed('complete_reminders')
+    async def complete_reminders(self, delivered: List[Dict], discarded: List[Dict] = ()):
+        """
+        Убрать напоминания пачки из очереди одной транзакцией
+        
+        delivered - отправленные (попадают в reminder_history через буфер
+        отложенной записи), discarded - отброшенные без отправки. Строка,
+        которую за время отправки перенёс повторный триггер, остаётся в очереди.
+        """
+        finished = [*delivered, *discarded]
+        if not finished:
+            return
+        async with self.pool.write() as db:
+            await db.executemany("""
+                DELETE FROM pending_reminders WHERE id = ? AND attempts = ?
+            """, [(reminder['id'], reminder['attempts']) for reminder in finished])
+        for reminder in delivered:
+            await self.add_reminder_history(
+                reminder['scenario_id'], reminder['chat_id'], reminder['business_connection_id']
+            )
+    
+    @DB_SECONDS.timed('save_reply_cooldowns')
+    async def save_reply_cooldowns(self, items: List[Tuple[Tuple[str, int, int], float]]):
+        """
+        Сохранить действующие паузы между ответами
+
+        Истёкшие записи удаляются, остальные заменяются по ключу: при
+        нескольких воркерах каждый сохраняет свою часть, не стирая чужую.
+        """
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM reply_cooldowns WHERE expires_at <= ?", (time.time(),))
+            await db.executemany("""
+                INSERT OR REPLACE INTO reply_cooldowns (business_connection_id, chat_id, scenario_id, expires_at)
+                VALUES (?, ?, ?, ?)
+            """, [(*key, expires_at) for key, expires_at in items])
+        logger.info(f"Сохранено пауз между ответами: {len(items)}")
+    
+    @DB_SECONDS.timed('load_reply_cooldowns')
+    async def load_reply_cooldowns(self) -> List[Tuple[Tuple[str, int, int], float]]:
+        """Загрузить паузы, которые ещё не истекли"""
+        async with self.pool.read() as db:
+            async with db.execute("""
+                SELECT business_connection_id, chat_id, scenario_id, expires_at
+                FROM reply_cooldowns WHERE expires_at > ?
+            """, (time.time(),)) as cursor:
+                rows = await cursor.fetchall()
+        return [((row[0], row[1], row[2]), row[3]) for row in rows]
 
 
 # Глобальный экземпляр базы данных
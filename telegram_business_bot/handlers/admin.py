@@ -2,23 +2,41 @@
 Админ-панель для управления сценариями
 """
 import logging
+import os
+import tempfile
+from html import escape
+from typing import Optional, Tuple
+
 from aiogram import Router, F, Bot
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 
 from config import ADMIN_IDS
 from db import db
-from states import AddScenarioStates, EditScenarioStates, DeleteScenarioStates
+from scenario_io import FORMATS, SCENARIO_FIELDS, detect_format, import_stream, open_text, write_scenarios
+from states import (
+    AddScenarioStates,
+    EditScenarioStates,
+    DeleteScenarioStates,
+    SearchScenarioStates,
+    ImportScenarioStates
+)
 from keyboards import (
     get_admin_menu_keyboard,
     get_trigger_type_keyboard,
     get_yes_no_keyboard,
     get_back_keyboard,
     get_scenarios_list_keyboard,
+    get_search_results_keyboard,
+    parse_scenarios_page_callback,
+    SCENARIOS_PAGE_SIZE,
     get_scenario_actions_keyboard,
     get_edit_field_keyboard,
-    keyboard_to_json
+    keyboard_to_json,
+    parse_keyboard_json,
+    validate_button,
+    validate_callback_data
 )
 
 logger = logging.getLogger(__name__)
@@ -70,6 +88,95 @@ async def admin_exit(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+# ============================================================================
+# ИМПОРТ И ЭКСПОРТ СЦЕНАРИЕВ
+# ============================================================================
+# Команды регистрируются раньше обработчиков ввода в состояниях FSM, иначе
+# /import или /export во время ввода ушли бы туда как текст
+
+# Больше Bot API не отдаёт боту через getFile
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    """Команда /import - загрузить сценарии из файла"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    await state.clear()
+    await state.set_state(ImportScenarioStates.waiting_for_file)
+    await message.answer(
+        "📥 <b>Импорт сценариев</b>\n\n"
+        "Отправьте файл <code>.jsonl</code> или <code>.csv</code> с полями: "
+        f"<code>{', '.join(SCENARIO_FIELDS)}</code>.\n"
+        "Обязательны trigger_type, trigger_value и response_text. "
+        "Файл загружается целиком или не загружается вовсе.",
+        reply_markup=get_back_keyboard(),
+        parse_mode='HTML'
+    )
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Команда /export [jsonl|csv] - выгрузить все сценарии в файл"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+    
+    fmt = (command.args or 'jsonl').strip().lower()
+    if fmt not in FORMATS:
+        await message.answer(f"❌ Формат: {' или '.join(FORMATS)}")
+        return
+    
+    # Сценарии пишутся в файл по мере чтения, таблица в память не грузится
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"scenarios.{fmt}")
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            count = await write_scenarios(db.iter_scenarios(), stream, fmt)
+        await message.answer_document(
+            FSInputFile(path),
+            caption=f"📤 Сценариев: {count}"
+        )
+
+
+@router.message(ImportScenarioStates.waiting_for_file, F.document)
+async def process_import_file(message: Message, state: FSMContext, bot: Bot):
+    """Обработка файла импорта"""
+    document = message.document
+    try:
+        fmt = detect_format(document.file_name)
+    except ValueError as e:
+        await message.answer(f"❌ {escape(str(e), quote=False)}")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await message.answer("❌ Файл больше 20 МБ - загрузите его через scenario_io.py")
+        return
+    
+    data = await bot.download(document)
+    try:
+        count = await import_stream(db, open_text(data), fmt)
+    except UnicodeDecodeError:
+        await message.answer("❌ Импорт отменён: файл должен быть в кодировке UTF-8")
+        return
+    except ValueError as e:
+        await message.answer(f"❌ Импорт отменён, ничего не сохранено:\n{escape(str(e), quote=False)}")
+        return
+    
+    await state.clear()
+    await message.answer(
+        f"✅ Импортировано сценариев: {count}",
+        reply_markup=get_back_keyboard()
+    )
+
+
+@router.message(ImportScenarioStates.waiting_for_file)
+async def import_expects_file(message: Message):
+    """В состоянии импорта пришёл не файл"""
+    await message.answer("❌ Отправьте файл .jsonl или .csv (как документ)")
+
+
 # ============================================================================
 # ДОБАВЛЕНИЕ СЦЕНАРИЯ
 # ============================================================================
@@ -127,6 +234,15 @@ async def process_trigger_value(message: Message, state: FSMContext):
         await message.answer("❌ Триггер не может быть пустым. Попробуйте снова:")
         return
     
+    # Callback-триггер сработает, только если его можно положить в кнопку
+    data = await state.get_data()
+    if data.get('trigger_type') == 'callback':
+        try:
+            validate_callback_data(trigger_value)
+        except ValueError as e:
+            await message.answer(f"❌ Ошибка: {e}\n\nВведите другой триггер:")
+            return
+    
     # Сохраняем триггер
     await state.update_data(trigger_value=trigger_value)
     
@@ -207,6 +323,12 @@ async def process_button_callback(message: Message, state: FSMContext):
     button_text = data['current_button_text']
     buttons = data.get('buttons', [])
     
+    try:
+        validate_button(button_text, callback_data)
+    except ValueError as e:
+        await message.answer(f"❌ Ошибка: {e}\n\nВведите другой callback_data:")
+        return
+    
     # Добавляем кнопку
     buttons.append({
         'text': button_text,
@@ -354,6 +476,18 @@ async def confirm_and_save_scenario(message: Message, state: FSMContext):
 # СПИСОК СЦЕНАРИЕВ
 # ============================================================================
 
+async def scenarios_page_keyboard(
+    after: Optional[Tuple[str, int]] = None,
+    before: Optional[Tuple[str, int]] = None
+) -> InlineKeyboardMarkup:
+    """Клавиатура страницы списка сценариев по ключу соседней страницы"""
+    scenarios, has_prev, has_next = await db.get_scenarios_page(SCENARIOS_PAGE_SIZE, after=after, before=before)
+    if not scenarios and (after is not None or before is not None):
+        # Сценарии страницы удалены, пока список был открыт - в начало
+        scenarios, has_prev, has_next = await db.get_scenarios_page(SCENARIOS_PAGE_SIZE)
+    return get_scenarios_list_keyboard(scenarios, has_prev=has_prev, has_next=has_next)
+
+
 @router.callback_query(F.data == "admin_list_scenarios")
 async def list_scenarios(callback: CallbackQuery, state: FSMContext):
     """Показать список сценариев"""
@@ -362,9 +496,9 @@ async def list_scenarios(callback: CallbackQuery, state: FSMContext):
         return
     
     await state.clear()
-    scenarios = await db.get_all_scenarios()
+    total = await db.count_scenarios()
     
-    if not scenarios:
+    if not total:
         await callback.message.edit_text(
             "📋 <b>Список сценариев</b>\n\n"
             "Сценариев пока нет. Добавьте первый!",
@@ -376,8 +510,8 @@ async def list_scenarios(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.edit_text(
         f"📋 <b>Список сценариев</b>\n\n"
-        f"Всего: {len(scenarios)}",
-        reply_markup=get_scenarios_list_keyboard(scenarios, page=0),
+        f"Всего: {total}",
+        reply_markup=await scenarios_page_keyboard(),
         parse_mode='HTML'
     )
     await callback.answer()
@@ -386,12 +520,17 @@ async def list_scenarios(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("scenarios_page_"))
 async def scenarios_pagination(callback: CallbackQuery):
     """Пагинация списка сценариев"""
-    page = int(callback.data.split("_")[-1])
-    scenarios = await db.get_all_scenarios()
-    
-    await callback.message.edit_reply_markup(
-        reply_markup=get_scenarios_list_keyboard(scenarios, page=page)
-    )
+    try:
+        direction, cursor = parse_scenarios_page_callback(callback.data)
+    except ValueError:
+        # Кнопка старого формата (scenarios_page_<номер>) - первая страница
+        direction, cursor = "next", None
+    if direction == "prev":
+        markup = await scenarios_page_keyboard(before=cursor)
+    else:
+        markup = await scenarios_page_keyboard(after=cursor)
+    
+    await callback.message.edit_reply_markup(reply_markup=markup)
     await callback.answer()
 
 
@@ -412,28 +551,29 @@ async def view_scenario(callback: CallbackQuery):
         'callback': 'Callback'
     }
     
-    status = "✅ Активен" if scenario['active'] else "❌ Неактивен"
+    status = "✅ Активен" if scenario.active else "❌ Неактивен"
     
     info = (
-        f"📝 <b>Сценарий #{scenario['id']}</b>\n\n"
+        f"📝 <b>Сценарий #{scenario.id}</b>\n\n"
         f"Статус: {status}\n"
-        f"Тип: {type_names.get(scenario['trigger_type'])}\n"
-        f"Триггер: <code>{scenario['trigger_value']}</code>\n\n"
-        f"<b>Ответ:</b>\n{scenario['response_text']}\n"
+        f"Тип: {type_names.get(scenario.trigger_type)}\n"
+        f"Триггер: <code>{scenario.trigger_value}</code>\n\n"
+        f"<b>Ответ:</b>\n{scenario.response_text}\n"
     )
     
-    if scenario['keyboard_json']:
-        import json
-        try:
-            buttons = json.loads(scenario['keyboard_json'])
-            info += f"\n<b>Кнопки:</b>\n"
-            for btn in buttons:
-                info += f"• {btn['text']} → {btn['callback_data']}\n"
-        except:
-            pass
+    if scenario.buttons:
+        info += f"\n<b>Кнопки:</b>\n"
+        for text, callback_data in scenario.buttons:
+            info += f"• {text} → {callback_data}\n"
     
-    if scenario['is_reminder']:
-        info += f"\n⏰ <b>Напоминание через:</b> {scenario['reminder_delay_min']} мин"
+    if scenario.is_reminder:
+        info += f"\n⏰ <b>Напоминание через:</b> {scenario.reminder_delay_min} мин"
+    
+    if scenario.cooldown_sec:
+        info += f"\n⏳ <b>Пауза между ответами:</b> {scenario.cooldown_sec} с"
+    
+    if scenario.business_connection_id:
+        info += f"\n🏪 <b>Только для подключения:</b> <code>{scenario.business_connection_id}</code>"
     
     await callback.message.edit_text(
         info,
@@ -454,6 +594,69 @@ async def toggle_scenario(callback: CallbackQuery):
     await callback.answer("✅ Статус изменён")
 
 
+# ============================================================================
+# ПОИСК СЦЕНАРИЕВ
+# ============================================================================
+
+@router.callback_query(F.data == "admin_search_scenarios")
+async def start_search_scenarios(callback: CallbackQuery, state: FSMContext):
+    """Начало поиска - запрос строки поиска"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    
+    await state.clear()
+    await state.set_state(SearchScenarioStates.entering_query)
+    await callback.message.edit_text(
+        "🔍 <b>Поиск сценариев</b>\n\n"
+        "Введите слова из триггера или текста ответа:",
+        reply_markup=get_back_keyboard(),
+        parse_mode='HTML'
+    )
+    await callback.answer()
+
+
+async def render_search_results(query: str, offset: int):
+    """Текст и клавиатура страницы результатов поиска"""
+    scenarios, has_next = await db.search_scenarios(query, SCENARIOS_PAGE_SIZE, offset)
+    if not scenarios:
+        return f"🔍 По запросу <code>{escape(query, quote=False)}</code> ничего не найдено", get_back_keyboard()
+    
+    shown = f"{offset + 1}-{offset + len(scenarios)}"
+    text = (
+        f"🔍 <b>Поиск:</b> <code>{escape(query, quote=False)}</code>\n\n"
+        f"Результаты {shown}. Для нового поиска отправьте другой запрос."
+    )
+    return text, get_search_results_keyboard(scenarios, offset, has_next, SCENARIOS_PAGE_SIZE)
+
+
+@router.message(SearchScenarioStates.entering_query)
+async def process_search_query(message: Message, state: FSMContext):
+    """Обработка строки поиска"""
+    query = (message.text or '').strip()
+    if not query:
+        await message.answer("❌ Строка поиска не может быть пустой. Попробуйте снова:")
+        return
+    
+    await state.update_data(search_query=query)
+    text, markup = await render_search_results(query, 0)
+    await message.answer(text, reply_markup=markup, parse_mode='HTML')
+
+
+@router.callback_query(F.data.startswith("scenarios_search_"))
+async def search_pagination(callback: CallbackQuery, state: FSMContext):
+    """Пагинация результатов поиска"""
+    query = (await state.get_data()).get('search_query')
+    if not query:
+        await callback.answer("❌ Поиск устарел, начните заново", show_alert=True)
+        return
+    
+    offset = int(callback.data.split("_")[-1])
+    text, markup = await render_search_results(query, offset)
+    await callback.message.edit_text(text, reply_markup=markup, parse_mode='HTML')
+    await callback.answer()
+
+
 # ============================================================================
 # РЕДАКТИРОВАНИЕ СЦЕНАРИЯ
 # ============================================================================
@@ -465,9 +668,7 @@ async def start_edit_scenario(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Нет доступа", show_alert=True)
         return
     
-    scenarios = await db.get_all_scenarios()
-    
-    if not scenarios:
+    if not await db.count_scenarios():
         await callback.message.edit_text(
             "❌ Нет сценариев для редактирования",
             reply_markup=get_back_keyboard(),
@@ -480,7 +681,7 @@ async def start_edit_scenario(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         "✏️ <b>Редактирование сценария</b>\n\n"
         "Выберите сценарий:",
-        reply_markup=get_scenarios_list_keyboard(scenarios, page=0),
+        reply_markup=await scenarios_page_keyboard(),
         parse_mode='HTML'
     )
     await callback.answer()
@@ -491,15 +692,15 @@ async def edit_scenario_choose_field(callback: CallbackQuery, state: FSMContext)
     """Выбор поля для редактирования"""
     scenario_id = int(callback.data.split("_")[-1])
     
-    # Сохраняем ID в состояние
-    await state.update_data(editing_scenario_id=scenario_id)
-    await state.set_state(EditScenarioStates.choosing_field)
-    
     scenario = await db.get_scenario_by_id(scenario_id)
     
+    # Сохраняем ID в состояние (тип триггера - для проверки нового значения)
+    await state.update_data(editing_scenario_id=scenario_id, editing_trigger_type=scenario.trigger_type)
+    await state.set_state(EditScenarioStates.choosing_field)
+    
     await callback.message.edit_text(
         f"✏️ <b>Редактирование сценария #{scenario_id}</b>\n\n"
-        f"Триггер: <code>{scenario['trigger_value']}</code>\n\n"
+        f"Триггер: <code>{scenario.trigger_value}</code>\n\n"
         f"Что хотите изменить?",
         reply_markup=get_edit_field_keyboard(),
         parse_mode='HTML'
@@ -519,7 +720,8 @@ async def edit_field_prompt(callback: CallbackQuery, state: FSMContext):
         'trigger': "Введите новый триггер:",
         'response': "Введите новый текст ответа:",
         'keyboard': "Введите кнопки в формате JSON или отправьте 'none' для удаления:\n[{\"text\":\"Кнопка\",\"callback_data\":\"callback\"}]",
-        'reminder': "Введите новую задержку в минутах (или 0 для отключения напоминания):"
+        'reminder': "Введите новую задержку в минутах (или 0 для отключения напоминания):",
+        'cooldown': "Введите паузу в секундах, раньше которой сценарий не ответит тому же клиенту повторно (0 - без паузы):"
     }
     
     prompt = prompts.get(field, "Введите новое значение:")
@@ -541,6 +743,8 @@ async def save_edited_value(message: Message, state: FSMContext):
     
     try:
         if field == 'trigger':
+            if data.get('editing_trigger_type') == 'callback':
+                validate_callback_data(new_value)
             await db.update_scenario(scenario_id, trigger_value=new_value)
         elif field == 'response':
             await db.update_scenario(scenario_id, response_text=new_value)
@@ -548,9 +752,8 @@ async def save_edited_value(message: Message, state: FSMContext):
             if new_value.lower() == 'none':
                 await db.update_scenario(scenario_id, keyboard_json=None)
             else:
-                import json
-                # Проверяем валидность JSON
-                json.loads(new_value)
+                # Проверяем клавиатуру до сохранения, а не при отправке
+                parse_keyboard_json(new_value)
                 await db.update_scenario(scenario_id, keyboard_json=new_value)
         elif field == 'reminder':
             delay = int(new_value)
@@ -559,6 +762,11 @@ async def save_edited_value(message: Message, state: FSMContext):
                 is_reminder=(delay > 0),
                 reminder_delay_min=delay
             )
+        elif field == 'cooldown':
+            cooldown = int(new_value)
+            if cooldown < 0:
+                raise ValueError("пауза не может быть отрицательной")
+            await db.update_scenario(scenario_id, cooldown_sec=cooldown)
         
         await message.answer(
             "✅ Сценарий обновлён!",
@@ -584,9 +792,7 @@ async def start_delete_scenario(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Нет доступа", show_alert=True)
         return
     
-    scenarios = await db.get_all_scenarios()
-    
-    if not scenarios:
+    if not await db.count_scenarios():
         await callback.message.edit_text(
             "❌ Нет сценариев для удаления",
             reply_markup=get_back_keyboard(),
@@ -599,7 +805,7 @@ async def start_delete_scenario(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         "🗑 <b>Удаление сценария</b>\n\n"
         "Выберите сценарий для удаления:",
-        reply_markup=get_scenarios_list_keyboard(scenarios, page=0),
+        reply_markup=await scenarios_page_keyboard(),
         parse_mode='HTML'
     )
     await callback.answer()
@@ -621,7 +827,7 @@ async def confirm_delete_scenario(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         f"🗑 <b>Удаление сценария</b>\n\n"
         f"ID: {scenario_id}\n"
-        f"Триггер: <code>{scenario['trigger_value']}</code>\n\n"
+        f"Триггер: <code>{scenario.trigger_value}</code>\n\n"
         f"⚠️ Вы уверены? Это действие нельзя отменить!",
         reply_markup=get_yes_no_keyboard(
             f"confirm_delete_{scenario_id}",
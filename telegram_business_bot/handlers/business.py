@@ -1,78 +1,229 @@
 """
 Обработчики для Telegram Business сообщений
 """
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from aiogram import Router, Bot, F
 from aiogram.types import BusinessMessagesDeleted, Message, CallbackQuery, BusinessConnection
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from config import DEBOUNCE_WINDOW, DEBOUNCE_MAX_MESSAGES, DEBOUNCE_MAX_CHATS, REMINDER_CANCEL_ON_REPLY
+from cooldowns import reply_cooldowns
 from db import db
-from keyboards import create_inline_keyboard_from_json
+from keyboards import scenario_keyboards
+from metrics import STAGE_SECONDS
+from reminders import reminders
+from scenario import Scenario
+from sender import sender, read_receipts
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-# Глобальный scheduler (будет инициализирован в main.py)
-scheduler: AsyncIOScheduler = None
 
-
-def set_scheduler(sched: AsyncIOScheduler):
-    """Установить scheduler для напоминаний"""
-    global scheduler
-    scheduler = sched
+@router.business_connection()
+async def on_business_connection(event: BusinessConnection):
+    """
+    Обработка подключения/отключения бизнес-аккаунта
+    """
+    # С Bot API 9.0 права приходят в rights, can_reply оставлен для совместимости
+    rights = getattr(event, 'rights', None)
+    can_reply = bool(rights.can_reply) if rights is not None else bool(event.can_reply)
+    logger.info(
+        f"Business connection: {event.id}, user_id={event.user.id}, "
+        f"can_reply={can_reply}, is_enabled={event.is_enabled}"
+    )
+    
+    # Сохраняем информацию о подключении (и обновляем реестр подключений)
+    await db.save_business_connection(
+        business_connection_id=event.id,
+        user_id=event.user.id,
+        can_reply=can_reply,
+        is_enabled=event.is_enabled
+    )
+    
+    # Отвечать от имени аккаунта больше нельзя - напоминания не нужны
+    if not db.connections.can_reply(event.id):
+        await reminders.cancel_for_connection(event.id)
 
 
-async def send_reminder(
+async def reply_to_message(
     bot: Bot,
-    chat_id: int,
-    text: str,
     business_connection_id: str,
-    scenario_id: int,
-    keyboard_json: str = None
+    chat_id: int,
+    message_id: int,
+    message_text: str
 ):
     """
-    Отправка напоминания клиенту
+    Подобрать сценарий для текста клиента и ответить
     
     Args:
         bot: Экземпляр бота
-        chat_id: ID чата клиента
-        text: Текст напоминания
         business_connection_id: ID бизнес-подключения
-        scenario_id: ID сценария
-        keyboard_json: JSON клавиатуры (опционально)
+        chat_id: ID чата клиента
+        message_id: ID сообщения клиента (последнего в серии)
+        message_text: Текст сообщения (или склеенная серия сообщений)
     """
+    # Ищем подходящий сценарий
+    with STAGE_SECONDS.time('match'):
+        scenario = await db.find_matching_scenario(
+            message_text=message_text, business_connection_id=business_connection_id
+        )
+    
+    # Клиент снова написал - прежние напоминания больше не нужны. Напоминание
+    # сценария, который он сейчас повторил, остаётся: его перенесёт
+    # reminders.schedule по REMINDER_POLICY
+    if REMINDER_CANCEL_ON_REPLY:
+        await reminders.cancel_for_chat(
+            business_connection_id, chat_id, keep_scenario_id=scenario.id if scenario else None
+        )
+    
+    if not scenario:
+        logger.info("Подходящий сценарий не найден, пропускаем")
+        return
+    
+    # Не повторяем тот же ответ тому же клиенту раньше паузы сценария
+    cooldown_key = (business_connection_id, chat_id, scenario.id)
+    if scenario.cooldown_sec > 0 and not reply_cooldowns.acquire(cooldown_key, scenario.cooldown_sec):
+        logger.info(f"Сценарий ID={scenario.id} на паузе для {chat_id}, пропускаем")
+        return
+    
+    logger.info(f"Найден сценарий ID={scenario.id}, отправляем ответ")
+    
     try:
-        keyboard = create_inline_keyboard_from_json(keyboard_json) if keyboard_json else None
+        # Готовая клавиатура из кэша (если есть)
+        with STAGE_SECONDS.time('keyboard'):
+            keyboard = scenario_keyboards.get(scenario)
         
-        await bot.send_message(
-            chat_id=chat_id,
-            text=text,
-            business_connection_id=business_connection_id,
-            reply_markup=keyboard
-        )
+        # Отправляем ответ от имени бизнес-аккаунта
+        with STAGE_SECONDS.time('send'):
+            sent_message = await sender.send_message(
+                chat_id=chat_id,
+                text=scenario.response_text,
+                business_connection_id=business_connection_id,
+                reply_markup=keyboard,
+                parse_mode='HTML'  # Поддержка HTML форматирования
+            )
         
-        # Сохраняем в историю
-        await db.add_reminder_history(scenario_id, chat_id, business_connection_id)
+        logger.info(f"Ответ отправлен успешно: message_id={sent_message.message_id}")
         
-        logger.info(f"Напоминание отправлено: chat_id={chat_id}, scenario_id={scenario_id}")
+        # Отмечаем чат прочитанным в фоне, серия сообщений - одним вызовом
+        read_receipts.schedule(business_connection_id, chat_id, message_id)
+    
     except Exception as e:
-        logger.error(f"Ошибка отправки напоминания: {e}")
+        # Ответ не ушёл - пауза не должна блокировать следующую попытку
+        reply_cooldowns.release(cooldown_key)
+        logger.error(f"Ошибка отправки ответа: {e}", exc_info=True)
+        return
+    
+    # Если это сценарий с напоминанием - планируем отправку
+    await schedule_reminder(scenario, chat_id, business_connection_id)
 
 
-@router.business_connection()
-async def on_business_connection(event: BusinessConnection):
+async def schedule_reminder(scenario: Scenario, chat_id: int, business_connection_id: str):
+    """Запланировать напоминание после отправленного ответа (ошибка не отменяет ответ)"""
+    try:
+        await reminders.schedule(scenario, chat_id, business_connection_id)
+    except Exception as e:
+        logger.error(f"Не удалось запланировать напоминание сценария ID={scenario.id}: {e}", exc_info=True)
+
+
+class _ChatBuffer:
+    """Накопленные сообщения одного чата"""
+    
+    __slots__ = ('parts', 'last_message_id', 'task')
+    
+    def __init__(self):
+        self.parts: List[str] = []
+        self.last_message_id = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class MessageDebouncer:
     """
-    Обработка подключения/отключения бизнес-аккаунта
+    Склейка серии быстрых сообщений клиента в один запрос
+    
+    Первое сообщение чата открывает окно в window секунд; всё, что
+    пришло за это время, склеивается через пробел и матчится один раз.
+    Буфер чата удаляется сразу после обработки, поэтому молчащие чаты
+    память не занимают. Размер буфера ограничен max_parts сообщениями,
+    число одновременно буферизуемых чатов - max_chats (сверх лимита
+    сообщения обрабатываются сразу).
     """
-    logger.info(f"Business connection: {event.id}, user_id={event.user.id}, can_reply={event.can_reply}")
     
-    # Сохраняем информацию о подключении
-    await db.save_business_connection(
-        business_connection_id=event.id,
-        user_id=event.user.id,
-        can_reply=event.can_reply
-    )
+    def __init__(
+        self,
+        window: float = DEBOUNCE_WINDOW,
+        max_parts: int = DEBOUNCE_MAX_MESSAGES,
+        max_chats: int = DEBOUNCE_MAX_CHATS
+    ):
+        self.window = window
+        self.max_parts = max(1, max_parts)
+        self.max_chats = max_chats
+        self._buffers: Dict[Tuple[str, int], _ChatBuffer] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+    
+    def __len__(self) -> int:
+        return len(self._buffers)
+    
+    def add(self, bot: Bot, business_connection_id: str, chat_id: int, message_id: int, message_text: str) -> bool:
+        """
+        Добавить сообщение в буфер чата
+        
+        Returns:
+            False, если буферизация недоступна и сообщение нужно обработать сразу
+        """
+        key = (business_connection_id, chat_id)
+        buffer = self._buffers.get(key)
+        
+        if buffer is None:
+            if len(self._buffers) >= self.max_chats:
+                return False
+            buffer = self._buffers[key] = _ChatBuffer()
+            buffer.task = asyncio.create_task(self._flush_later(bot, key))
+        
+        buffer.parts.append(message_text)
+        buffer.last_message_id = max(buffer.last_message_id, message_id)
+        
+        if len(buffer.parts) >= self.max_parts:
+            # Буфер заполнен - не ждём конца окна
+            buffer.task.cancel()
+            buffer.task = asyncio.create_task(self._flush(bot, key))
+        
+        return True
+    
+    async def _flush_later(self, bot: Bot, key: Tuple[str, int]):
+        await asyncio.sleep(self.window)
+        await self._flush(bot, key)
+    
+    async def _flush(self, bot: Bot, key: Tuple[str, int]):
+        buffer = self._buffers.pop(key, None)
+        if buffer is None or not buffer.parts:
+            return
+        
+        business_connection_id, chat_id = key
+        if len(buffer.parts) > 1:
+            logger.info(f"Склеено {len(buffer.parts)} сообщений от {chat_id}")
+        # Задача фоновая - исключение иначе никто не увидит
+        try:
+            await reply_to_message(
+                bot, business_connection_id, chat_id, buffer.last_message_id, ' '.join(buffer.parts)
+            )
+        except Exception as e:
+            logger.error(f"Ошибка обработки серии сообщений от {chat_id}: {e}", exc_info=True)
+    
+    async def flush_all(self, bot: Bot):
+        """Обработать все накопленные буферы (при остановке бота)"""
+        keys = list(self._buffers)
+        for key in keys:
+            self._buffers[key].task.cancel()
+        await asyncio.gather(*(self._flush(bot, key) for key in keys), return_exceptions=True)
+
+
+# Склейка серий сообщений (включается DEBOUNCE_WINDOW > 0)
+debouncer = MessageDebouncer()
 
 
 @router.business_message(F.text)
@@ -95,66 +246,16 @@ async def handle_business_message(message: Message, bot: Bot):
     
     logger.info(f"Бизнес-сообщение от {chat_id}: {message_text}")
     
-    # Ищем подходящий сценарий
-    scenario = await db.find_matching_scenario(message_text=message_text)
-    
-    if not scenario:
-        logger.info("Подходящий сценарий не найден, пропускаем")
+    # Подключение отключено или без права отвечать - ответ всё равно не уйдёт
+    if not db.connections.can_reply(business_connection_id):
+        logger.info(f"Подключение {business_connection_id} не может отвечать, пропускаем")
         return
     
-    logger.info(f"Найден сценарий ID={scenario['id']}, отправляем ответ")
-    
-    try:
-        # Создаём клавиатуру если есть
-        keyboard = create_inline_keyboard_from_json(scenario['keyboard_json']) if scenario['keyboard_json'] else None
-        
-        # Отправляем ответ от имени бизнес-аккаунта
-        sent_message = await bot.send_message(
-            chat_id=chat_id,
-            text=scenario['response_text'],
-            business_connection_id=business_connection_id,
-            reply_markup=keyboard,
-            parse_mode='HTML'  # Поддержка HTML форматирования
-        )
-        
-        logger.info(f"Ответ отправлен успешно: message_id={sent_message.message_id}")
-        
-        # Отмечаем сообщение как прочитанное (если возможно)
-        try:
-            await bot.read_business_message(
-                business_connection_id=business_connection_id,
-                chat_id=chat_id
-            )
-        except Exception as e:
-            logger.debug(f"Не удалось отметить как прочитанное: {e}")
-        
-        # Если это сценарий с напоминанием - планируем отправку
-        if scenario['is_reminder'] and scenario['reminder_delay_min'] > 0:
-            delay_minutes = scenario['reminder_delay_min']
-            run_time = datetime.now() + timedelta(minutes=delay_minutes)
-            
-            if scheduler:
-                scheduler.add_job(
-                    send_reminder,
-                    'date',
-                    run_date=run_time,
-                    args=[
-                        bot,
-                        chat_id,
-                        scenario['response_text'],
-                        business_connection_id,
-                        scenario['id'],
-                        scenario['keyboard_json']
-                    ],
-                    id=f"reminder_{scenario['id']}_{chat_id}_{datetime.now().timestamp()}",
-                    replace_existing=False
-                )
-                logger.info(f"Запланировано напоминание через {delay_minutes} мин")
-            else:
-                logger.warning("Scheduler не инициализирован, напоминание не запланировано")
+    # В режиме debounce ответ придёт один на всю серию сообщений
+    if debouncer.enabled and debouncer.add(bot, business_connection_id, chat_id, message.message_id, message_text):
+        return
     
-    except Exception as e:
-        logger.error(f"Ошибка отправки ответа: {e}", exc_info=True)
+    await reply_to_message(bot, business_connection_id, chat_id, message.message_id, message_text)
 
 
 @router.callback_query(F.data.startswith("scenario_"))
@@ -177,55 +278,45 @@ async def handle_scenario_callback(callback: CallbackQuery, bot: Bot):
     
     logger.info(f"Callback от клиента {chat_id}: {callback_data}")
     
+    if not db.connections.can_reply(business_connection_id):
+        await callback.answer()
+        return
+    
     # Ищем сценарий по callback
-    scenario = await db.find_matching_scenario(message_text=None, callback_data=callback_data)
+    with STAGE_SECONDS.time('match'):
+        scenario = await db.find_matching_scenario(
+            message_text=None, callback_data=callback_data, business_connection_id=business_connection_id
+        )
     
     if not scenario:
         await callback.answer("Сценарий не найден")
         return
     
     try:
-        # Создаём клавиатуру если есть
-        keyboard = create_inline_keyboard_from_json(scenario['keyboard_json']) if scenario['keyboard_json'] else None
+        # Готовая клавиатура из кэша (если есть)
+        with STAGE_SECONDS.time('keyboard'):
+            keyboard = scenario_keyboards.get(scenario)
         
         # Отправляем новое сообщение (или можно отредактировать текущее)
-        await bot.send_message(
-            chat_id=chat_id,
-            text=scenario['response_text'],
-            business_connection_id=business_connection_id,
-            reply_markup=keyboard,
-            parse_mode='HTML'
-        )
+        with STAGE_SECONDS.time('send'):
+            await sender.send_message(
+                chat_id=chat_id,
+                text=scenario.response_text,
+                business_connection_id=business_connection_id,
+                reply_markup=keyboard,
+                parse_mode='HTML'
+            )
         
         await callback.answer("✅")
         logger.info(f"Ответ на callback отправлен")
-        
-        # Если это напоминание - планируем
-        if scenario['is_reminder'] and scenario['reminder_delay_min'] > 0:
-            delay_minutes = scenario['reminder_delay_min']
-            run_time = datetime.now() + timedelta(minutes=delay_minutes)
-            
-            if scheduler:
-                scheduler.add_job(
-                    send_reminder,
-                    'date',
-                    run_date=run_time,
-                    args=[
-                        bot,
-                        chat_id,
-                        scenario['response_text'],
-                        business_connection_id,
-                        scenario['id'],
-                        scenario['keyboard_json']
-                    ],
-                    id=f"reminder_{scenario['id']}_{chat_id}_{datetime.now().timestamp()}",
-                    replace_existing=False
-                )
-                logger.info(f"Запланировано напоминание через {delay_minutes} мин")
     
     except Exception as e:
         logger.error(f"Ошибка обработки callback: {e}", exc_info=True)
         await callback.answer("Ошибка обработки")
+        return
+    
+    # Если это напоминание - планируем
+    await schedule_reminder(scenario, chat_id, business_connection_id)
 
 
 @router.edited_business_message()
@@ -3,14 +3,25 @@
 """
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
 import json
 
+if TYPE_CHECKING:
+    from scenario import Button, Scenario
+
+# Ограничение Telegram на длину callback_data
+CALLBACK_DATA_MAX_BYTES = 64
+
+# Сценариев на странице списка в админке
+SCENARIOS_PAGE_SIZE = 5
+
 
 def get_admin_menu_keyboard() -> InlineKeyboardMarkup:
     """Главное меню админ-панели"""
     builder = InlineKeyboardBuilder()
     builder.row(InlineKeyboardButton(text="➕ Добавить сценарий", callback_data="admin_add_scenario"))
     builder.row(InlineKeyboardButton(text="📋 Список сценариев", callback_data="admin_list_scenarios"))
+    builder.row(InlineKeyboardButton(text="🔍 Поиск сценариев", callback_data="admin_search_scenarios"))
     builder.row(InlineKeyboardButton(text="✏️ Редактировать сценарий", callback_data="admin_edit_scenario"))
     builder.row(InlineKeyboardButton(text="🗑 Удалить сценарий", callback_data="admin_delete_scenario"))
     builder.row(InlineKeyboardButton(text="⚙️ Настройки напоминаний", callback_data="admin_reminder_settings"))
@@ -45,42 +56,84 @@ def get_back_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_scenarios_list_keyboard(scenarios: list, page: int = 0, page_size: int = 5) -> InlineKeyboardMarkup:
+def get_scenario_button(scenario: 'Scenario') -> InlineKeyboardButton:
+    """Кнопка сценария в списке: статус, тип и начало триггера"""
+    is_active = "✅" if scenario.active else "❌"
+    return InlineKeyboardButton(
+        text=f"{is_active} {scenario.trigger_type}: {scenario.trigger_value[:20]}...",
+        callback_data=f"scenario_view_{scenario.id}"
+    )
+
+
+def get_scenarios_list_keyboard(scenarios: list, has_prev: bool = False, has_next: bool = False) -> InlineKeyboardMarkup:
     """
-    Клавиатура списка сценариев с пагинацией
+    Клавиатура страницы списка сценариев
     
     Args:
-        scenarios: Список сценариев из БД
-        page: Номер страницы (начиная с 0)
-        page_size: Количество элементов на странице
+        scenarios: Сценарии страницы (Database.get_scenarios_page)
+        has_prev: Есть ли предыдущая страница
+        has_next: Есть ли следующая страница
+    
+    Кнопки навигации несут ключ крайнего сценария страницы
+    (scenarios_page_{prev|next}_{created_at}_{id}), по нему
+    выбирается соседняя страница.
     """
     builder = InlineKeyboardBuilder()
     
-    # Определяем диапазон сценариев для текущей страницы
-    start_idx = page * page_size
-    end_idx = start_idx + page_size
-    page_scenarios = scenarios[start_idx:end_idx]
-    
     # Добавляем кнопки для каждого сценария
-    for scenario in page_scenarios:
-        trigger_type = scenario['trigger_type']
-        trigger_value = scenario['trigger_value']
-        is_active = "✅" if scenario['active'] else "❌"
-        
-        # Формируем текст кнопки
-        button_text = f"{is_active} {trigger_type}: {trigger_value[:20]}..."
-        builder.row(InlineKeyboardButton(
-            text=button_text,
-            callback_data=f"scenario_view_{scenario['id']}"
-        ))
+    for scenario in scenarios:
+        builder.row(get_scenario_button(scenario))
     
     # Навигация
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"scenarios_page_{page-1}"))
-    if end_idx < len(scenarios):
-        nav_buttons.append(InlineKeyboardButton(text="➡️ Вперёд", callback_data=f"scenarios_page_{page+1}"))
+    if scenarios and has_prev:
+        first = scenarios[0]
+        nav_buttons.append(InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=f"scenarios_page_prev_{first.created_at}_{first.id}"
+        ))
+    if scenarios and has_next:
+        last = scenarios[-1]
+        nav_buttons.append(InlineKeyboardButton(
+            text="➡️ Вперёд",
+            callback_data=f"scenarios_page_next_{last.created_at}_{last.id}"
+        ))
+    
+    if nav_buttons:
+        builder.row(*nav_buttons)
+    
+    builder.row(InlineKeyboardButton(text="🔙 В меню", callback_data="admin_back"))
+    return builder.as_markup()
+
+
+def get_search_results_keyboard(scenarios: list, offset: int, has_next: bool, page_size: int) -> InlineKeyboardMarkup:
+    """
+    Клавиатура страницы результатов поиска
+    
+    Args:
+        scenarios: Найденные сценарии страницы
+        offset: Номер первого результата страницы (с 0)
+        has_next: Есть ли следующая страница
+        page_size: Размер страницы
+    
+    Строка поиска хранится в данных FSM, кнопки навигации несут только
+    смещение (scenarios_search_{offset}).
+    """
+    builder = InlineKeyboardBuilder()
+    for scenario in scenarios:
+        builder.row(get_scenario_button(scenario))
     
+    nav_buttons = []
+    if offset > 0:
+        nav_buttons.append(InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=f"scenarios_search_{max(0, offset - page_size)}"
+        ))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(
+            text="➡️ Вперёд",
+            callback_data=f"scenarios_search_{offset + page_size}"
+        ))
     if nav_buttons:
         builder.row(*nav_buttons)
     
@@ -88,6 +141,13 @@ def get_scenarios_list_keyboard(scenarios: list, page: int = 0, page_size: int =
     return builder.as_markup()
 
 
+def parse_scenarios_page_callback(data: str) -> Tuple[str, Tuple[str, int]]:
+    """Разобрать callback_data навигации: (prev|next, (created_at, id))"""
+    direction, cursor = data[len("scenarios_page_"):].split("_", 1)
+    created_at, scenario_id = cursor.rsplit("_", 1)
+    return direction, (created_at, int(scenario_id))
+
+
 def get_scenario_actions_keyboard(scenario_id: int) -> InlineKeyboardMarkup:
     """Клавиатура действий со сценарием"""
     builder = InlineKeyboardBuilder()
@@ -105,34 +165,152 @@ def get_edit_field_keyboard() -> InlineKeyboardMarkup:
     builder.row(InlineKeyboardButton(text="💬 Текст ответа", callback_data="edit_field_response"))
     builder.row(InlineKeyboardButton(text="⌨️ Кнопки", callback_data="edit_field_keyboard"))
     builder.row(InlineKeyboardButton(text="⏰ Напоминание", callback_data="edit_field_reminder"))
+    builder.row(InlineKeyboardButton(text="⏳ Пауза между ответами", callback_data="edit_field_cooldown"))
     builder.row(InlineKeyboardButton(text="🔙 Назад", callback_data="admin_list_scenarios"))
     return builder.as_markup()
 
 
-def create_inline_keyboard_from_json(keyboard_json: str) -> InlineKeyboardMarkup:
+def validate_button(text: str, callback_data: str):
+    """
+    Проверить кнопку перед сохранением
+    
+    Raises:
+        ValueError: Кнопку нельзя отправить в Telegram
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("текст кнопки не может быть пустым")
+    if not isinstance(callback_data, str) or not callback_data:
+        raise ValueError(f"у кнопки «{text}» пустой callback_data")
+    validate_callback_data(callback_data)
+
+
+def validate_callback_data(callback_data: str):
+    """
+    Проверить, что callback_data поместится в кнопку Telegram
+    
+    Raises:
+        ValueError: callback_data длиннее CALLBACK_DATA_MAX_BYTES
+    """
+    if len(callback_data.encode('utf-8')) > CALLBACK_DATA_MAX_BYTES:
+        raise ValueError(
+            f"callback_data «{callback_data}» длиннее {CALLBACK_DATA_MAX_BYTES} байт"
+        )
+
+
+def validate_keyboard_json(keyboard_json: str) -> list:
     """
-    Создаёт InlineKeyboard из JSON
+    Проверить JSON клавиатуры, не собирая саму клавиатуру
     
     Args:
         keyboard_json: JSON строка с данными кнопок
         Формат: [{"text": "Кнопка 1", "callback_data": "callback1"}, ...]
-    """
-    if not keyboard_json:
-        return None
     
+    Returns:
+        Список описаний кнопок
+    
+    Raises:
+        ValueError: Некорректный JSON или описание кнопок
+    """
     try:
         buttons_data = json.loads(keyboard_json)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"некорректный JSON: {e.msg}") from e
+    
+    if not isinstance(buttons_data, list) or not buttons_data:
+        raise ValueError("ожидается непустой список кнопок")
+    
+    for button_data in buttons_data:
+        if not isinstance(button_data, dict):
+            raise ValueError("каждая кнопка должна быть объектом с text и callback_data")
+        validate_button(button_data.get('text'), button_data.get('callback_data'))
+    
+    return buttons_data
+
+
+def parse_keyboard_json(keyboard_json: str) -> InlineKeyboardMarkup:
+    """
+    Строгий разбор JSON клавиатуры
+    
+    Args:
+        keyboard_json: JSON строка с данными кнопок
+        Формат: [{"text": "Кнопка 1", "callback_data": "callback1"}, ...]
+    
+    Raises:
+        ValueError: Некорректный JSON или описание кнопок
+    """
+    builder = InlineKeyboardBuilder()
+    for button_data in validate_keyboard_json(keyboard_json):
+        builder.row(InlineKeyboardButton(
+            text=button_data['text'],
+            callback_data=button_data['callback_data']
+        ))
+    
+    return builder.as_markup()
+
+
+class ScenarioKeyboardCache:
+    """
+    Готовые InlineKeyboardMarkup для сценариев
+    
+    Клавиатура собирается один раз из Scenario.buttons (при загрузке или
+    правке сценария) и переиспользуется для всех ответов и напоминаний.
+    Закэшированные объекты общие - их нельзя изменять.
+    """
+    
+    def __init__(self):
+        # scenario_id -> (кнопки, клавиатура)
+        self._markups: Dict[int, Tuple[Tuple['Button', ...], InlineKeyboardMarkup]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._markups)
+    
+    @staticmethod
+    def _build(buttons: Tuple['Button', ...]) -> InlineKeyboardMarkup:
         builder = InlineKeyboardBuilder()
+        for text, callback_data in buttons:
+            builder.row(InlineKeyboardButton(text=text, callback_data=callback_data))
+        return builder.as_markup()
+    
+    def update(self, scenario: 'Scenario'):
+        """Пересобрать клавиатуру сценария после загрузки или правки"""
+        if scenario.buttons:
+            self._markups[scenario.id] = (scenario.buttons, self._build(scenario.buttons))
+        else:
+            self._markups.pop(scenario.id, None)
+    
+    def reset(self, scenarios: Iterable['Scenario']):
+        """
+        Заполнить кэш заново
+        
+        Новый кэш собирается отдельно и подменяет старый целиком, поэтому
+        reset можно вызывать из потока, пока event loop читает кэш.
+        """
+        self._markups = {
+            scenario.id: (scenario.buttons, self._build(scenario.buttons))
+            for scenario in scenarios if scenario.buttons
+        }
+    
+    def invalidate(self, scenario_id: int):
+        """Убрать клавиатуру сценария из кэша"""
+        self._markups.pop(scenario_id, None)
+    
+    def get(self, scenario: 'Scenario') -> Optional[InlineKeyboardMarkup]:
+        """Клавиатура для сценария (None - без кнопок)"""
+        if not scenario.buttons:
+            return None
         
-        for button_data in buttons_data:
-            builder.row(InlineKeyboardButton(
-                text=button_data['text'],
-                callback_data=button_data['callback_data']
-            ))
+        cached = self._markups.get(scenario.id)
+        if cached is not None and cached[0] == scenario.buttons:
+            return cached[1]
         
-        return builder.as_markup()
-    except (json.JSONDecodeError, KeyError):
-        return None
+        # Кнопки отличаются от закэшированных (например, запись прочитана
+        # из БД после правки, которую снимок ещё не получил) - собираем без
+        # записи в кэш
+        return self._build(scenario.buttons)
+
+
+# Глобальный кэш клавиатур сценариев
+scenario_keyboards = ScenarioKeyboardCache()
 
 
 def keyboard_to_json(buttons: list) -> str:
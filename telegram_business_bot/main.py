@@ -3,14 +3,34 @@
 """
 import asyncio
 import logging
+import signal
+from typing import Optional, Tuple
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from aiohttp import web
 
-from config import BOT_TOKEN, LOG_LEVEL
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    BOT_WORKERS,
+    LOG_LEVEL,
+    COOLDOWN_PERSIST,
+    METRICS_HOST,
+    METRICS_PORT,
+    SEND_GLOBAL_RATE,
+    TELEGRAM_API_SERVER
+)
+from cooldowns import reply_cooldowns
 from db import db
 from handlers import admin, business
+from metrics import MetricsMiddleware, registry, start_metrics_server
+from reminders import reminders
+from sender import sender, read_receipts
+from supervisor import Supervisor, consume_updates
+from webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,16 +39,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Типы апдейтов, которые обрабатывает бот
+ALLOWED_UPDATES = [
+    "message",
+    "callback_query",
+    "business_connection",
+    "business_message",
+    "edited_business_message",
+    "deleted_business_messages"
+]
 
-async def on_startup():
-    """Действия при запуске бота"""
+
+async def open_database(bot: Bot, shard: Optional[Tuple[int, int]] = None):
+    """
+    Открыть БД, восстановить сохранённое состояние и запустить разбор очереди напоминаний
+
+    shard - (номер воркера, число воркеров) в многопроцессном режиме
+    """
     logger.info("Инициализация базы данных...")
     await db.init_db()
     logger.info("База данных готова")
     
-    # Добавляем дефолтный сценарий если БД пустая
-    scenarios = await db.get_all_scenarios()
-    if not scenarios:
+    if COOLDOWN_PERSIST:
+        reply_cooldowns.load(await db.load_reply_cooldowns())
+        logger.info(f"Восстановлено пауз между ответами: {len(reply_cooldowns)}")
+    
+    # Напоминания, не отправленные до остановки, уйдут после запуска
+    reminders.start(bot, shard=shard)
+
+
+async def on_startup(bot: Bot):
+    """Действия при запуске бота"""
+    await open_database(bot)
+    await seed_default_scenarios()
+
+
+async def seed_default_scenarios():
+    """Добавить примеры сценариев, если БД пустая"""
+    if not await db.count_scenarios():
         logger.info("Добавление примера сценария...")
         await db.add_scenario(
             trigger_type='contains',
@@ -66,57 +114,183 @@ async def on_startup():
         logger.info("Примеры сценариев добавлены")
 
 
-async def on_shutdown():
+async def on_shutdown(bot: Bot):
     """Действия при остановке бота"""
+    # Отвечаем на склеиваемые серии и отправляем накопленные сообщения,
+    # потом закрываем БД
+    await business.debouncer.flush_all(bot)
+    await reminders.close()
+    await sender.close()
+    await read_receipts.close()
+    if COOLDOWN_PERSIST:
+        await db.save_reply_cooldowns(reply_cooldowns.items())
+    # История напоминаний пишется отложенно - дописываем остаток
+    await db.flush_writes()
+    await db.close()
     logger.info("Бот остановлен")
 
 
-async def main():
-    """Главная функция"""
-    # Создаём бота
-    bot = Bot(
+def register_runtime_metrics():
+    """Метрики состояния, которые вычисляются при опросе /metrics"""
+    registry.counter_func('bot_reminders_total', 'События диспетчера напоминаний', lambda: reminders.stats, 'event')
+    registry.gauge_func('bot_reminder_timers', 'Таймеры напоминаний в колесе', lambda: reminders.timers)
+    registry.gauge_func('bot_send_queue_depth', 'Сообщения в очереди отправки', lambda: sender.queue_depth)
+    registry.counter_func('bot_send_events_total', 'События очереди отправки', lambda: sender.stats, 'event')
+    registry.gauge_func('bot_read_receipts_pending', 'Отложенные отметки о прочтении', lambda: read_receipts.pending)
+    registry.counter_func('bot_read_receipts_total', 'Отметки о прочтении', lambda: read_receipts.stats, 'event')
+    registry.gauge_func('bot_debounce_buffers', 'Чаты с накапливаемыми сообщениями', lambda: len(business.debouncer))
+    registry.gauge_func('bot_active_scenarios', 'Активные общие сценарии в in-memory снимке', lambda: len(db.matcher))
+    registry.gauge_func('bot_tenant_matchers', 'Загруженные снимки сценариев подключений', lambda: len(db.tenant_matchers))
+    registry.gauge_func('bot_tenant_scenarios', 'Сценарии в снимках подключений', lambda: db.tenant_matchers.scenarios)
+    registry.counter_func(
+        'bot_tenant_matcher_cache_total', 'Обращения к снимкам подключений', lambda: db.tenant_matchers.stats, 'event'
+    )
+    registry.gauge_func('bot_business_connections', 'Известные бизнес-подключения', lambda: len(db.connections))
+    registry.gauge_func('bot_reply_cooldowns', 'Действующие паузы между ответами', lambda: len(reply_cooldowns))
+    registry.gauge_func('bot_db_write_buffer_depth', 'Строки в буфере отложенной записи', lambda: db.write_buffer_depth, 'table')
+    registry.counter_func('bot_db_write_buffer_total', 'События отложенной записи', lambda: db.reminder_history.stats, 'event')
+
+
+def create_bot() -> Bot:
+    session = None
+    if TELEGRAM_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    return Bot(
         token=BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    
-    # Создаём диспетчер
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с роутерами и middleware"""
     dp = Dispatcher()
     
     # Регистрируем роутеры
     dp.include_router(admin.router)
     dp.include_router(business.router)
     
-    # Инициализируем scheduler для напоминаний
-    scheduler = AsyncIOScheduler()
-    scheduler.start()
-    logger.info("Scheduler запущен")
+    # Время и количество обработанных апдейтов
+    dp.update.outer_middleware(MetricsMiddleware())
+    return dp
+
+
+async def start_services(
+    bot: Bot,
+    global_rate: Optional[float] = None,
+    metrics_port: int = METRICS_PORT
+) -> Optional[web.AppRunner]:
+    """Запустить очередь отправки и эндпоинт /metrics"""
+    # Очередь исходящих сообщений
+    sender.start(bot, global_rate=global_rate)
+    read_receipts.start(bot)
+    
+    # Эндпоинт /metrics
+    metrics_runner = None
+    if metrics_port:
+        register_runtime_metrics()
+        metrics_runner = await start_metrics_server(METRICS_HOST, metrics_port)
     
-    # Передаём scheduler в business обработчик
-    business.set_scheduler(scheduler)
+    return metrics_runner
+
+
+async def stop_services(bot: Bot, metrics_runner: Optional[web.AppRunner]):
+    if metrics_runner:
+        await metrics_runner.cleanup()
+    await bot.session.close()
+
+
+async def worker_main(index: int, workers: int, inbox, events):
+    """Воркер многопроцессного режима: обрабатывает апдейты своих чатов"""
+    bot = create_bot()
+    dp = create_dispatcher()
+    
+    # Лимит Telegram на токен делится между воркерами
+    metrics_runner = await start_services(
+        bot,
+        global_rate=SEND_GLOBAL_RATE / workers,
+        metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0
+    )
+    
+    try:
+        await open_database(bot, shard=(index, workers))
+        # Остальные воркеры должны обновить снимок сценариев после правки в админке
+        # и реестр подключений после апдейта business_connection
+        db.add_change_listener(lambda scenario_id: events.put(('scenario', index, scenario_id)))
+        db.add_connection_listener(lambda connection_id: events.put(('connection', index, connection_id)))
+        logger.info(f"Воркер {index} готов")
+        
+        await consume_updates(dp, bot, inbox)
+        await on_shutdown(bot)
+    finally:
+        await stop_services(bot, metrics_runner)
+
+
+def run_worker(index: int, workers: int, inbox, events):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов; воркер останавливается по
+    # команде главного процесса, дообработав свою очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(worker_main(index, workers, inbox, events))
+
+
+async def run_supervisor():
+    """Многопроцессный режим: приём апдейтов здесь, обработка в воркерах"""
+    # Схема БД и примеры сценариев создаются один раз, до запуска воркеров
+    await db.init_db()
+    await seed_default_scenarios()
+    await db.close()
+    
+    bot = create_bot()
+    supervisor = Supervisor(BOT_WORKERS, target=run_worker)
+    supervisor.start()
+    logger.info(f"Бот запущен (режим {BOT_MODE}, воркеров: {BOT_WORKERS})")
+    
+    metrics_runner = None
+    if METRICS_PORT:
+        registry.gauge_func('bot_worker_queue_depth', 'Апдейты в очереди воркера', supervisor.queue_depths, 'worker')
+        registry.counter_func('bot_supervisor_events_total', 'События главного процесса', lambda: supervisor.stats, 'event')
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    
+    try:
+        if BOT_MODE == 'webhook':
+            await supervisor.run_webhook(bot, ALLOWED_UPDATES)
+        else:
+            await supervisor.run_polling(bot, ALLOWED_UPDATES)
+    finally:
+        await supervisor.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+
+
+async def main():
+    """Главная функция"""
+    if BOT_WORKERS > 1:
+        await run_supervisor()
+        return
+    
+    bot = create_bot()
+    dp = create_dispatcher()
+    metrics_runner = await start_services(bot)
     
     # Регистрируем startup хук
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
-    # Запускаем polling
-    logger.info("Бот запущен")
+    # Запускаем приём апдейтов
+    logger.info(f"Бот запущен (режим {BOT_MODE})")
     logger.info("Для доступа к админ-панели отправьте /admin")
     
     try:
-        await dp.start_polling(
-            bot,
-            allowed_updates=[
-                "message",
-                "callback_query",
-                "business_connection",
-                "business_message",
-                "edited_business_message",
-                "deleted_business_messages"
-            ]
-        )
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot, ALLOWED_UPDATES)
+        else:
+            # getUpdates не работает, пока зарегистрирован webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
     finally:
-        scheduler.shutdown()
-        await bot.session.close()
+        await stop_services(bot, metrics_runner)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,280 @@
+"""
+Скомпилированный in-memory матчер сценариев
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scenario import Scenario
+
+# Ниже этого числа contains-триггеров линейный перебор со встроенным
+# `in` быстрее автомата, обход которого идёт в Python посимвольно
+AHO_CORASICK_MIN_PATTERNS = 128
+
+_NO_MATCH = float('inf')
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо-Корасик для поиска множества подстрок за один проход
+
+    Каждому шаблону соответствует ранг (чем меньше, тем выше приоритет).
+    Поиск возвращает минимальный ранг среди всех шаблонов, входящих в текст.
+    """
+
+    __slots__ = ('_goto', '_fail', '_best')
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        goto: List[Dict[str, int]] = [{}]
+        best: List[float] = [_NO_MATCH]
+
+        # Бор по всем шаблонам
+        for pattern, rank in patterns:
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    best.append(_NO_MATCH)
+                node = next_node
+            if rank < best[node]:
+                best[node] = rank
+
+        # Суффиксные ссылки (BFS); лучший ранг наследуется по ссылке,
+        # поэтому при поиске не нужно обходить цепочку выходов
+        fail = [0] * len(goto)
+        queue = deque()
+        for node in goto[0].values():
+            queue.append(node)
+            if best[0] < best[node]:
+                best[node] = best[0]
+
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail_target = goto[state].get(char, 0)
+                fail[child] = fail_target if fail_target != child else 0
+                if best[fail[child]] < best[child]:
+                    best[child] = best[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def first_match(self, text: str) -> Optional[int]:
+        """Минимальный ранг шаблона, входящего в text, или None"""
+        goto = self._goto
+        fail = self._fail
+        best_by_node = self._best
+
+        node = 0
+        best = best_by_node[0]
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best_by_node[node] < best:
+                best = best_by_node[node]
+
+        return None if best == _NO_MATCH else int(best)
+
+
+def _by_priority(scenario: Scenario) -> Tuple[float, int]:
+    return scenario.priority
+
+
+def _bucket_with(bucket: Tuple[Scenario, ...], scenario: Scenario) -> Tuple[Scenario, ...]:
+    """Новая корзина индекса с добавленным сценарием (упорядочена по приоритету)"""
+    return tuple(sorted(bucket + (scenario,), key=_by_priority))
+
+
+def _bucket_without(bucket: Tuple[Scenario, ...], scenario_id: int) -> Tuple[Scenario, ...]:
+    """Новая корзина индекса без сценария"""
+    return tuple(item for item in bucket if item.id != scenario_id)
+
+
+class ScenarioMatcher:
+    """
+    Неизменяемый снимок активных сценариев для поиска по триггерам
+
+    - exact: словарь по нормализованному тексту триггера
+    - callback: словарь по callback_data
+    - contains: один автомат Ахо-Корасик по всем триггерам
+
+    Из всех совпадений выигрывает сценарий с наименьшим Scenario.priority,
+    что совпадает с прежним правилом "первый в порядке created_at DESC".
+    Индексы хранят сами записи Scenario, триггеры в них уже нормализованы.
+
+    Снимок не изменяется после создания. Правка одного сценария порождает
+    новый снимок (with_scenario/without_scenario), который разделяет с
+    предыдущим нетронутые корзины индексов; автомат перестраивается только
+    при изменении contains-триггеров. Новый снимок атомарно подменяет старый
+    (copy-on-write).
+    """
+
+    __slots__ = ('_by_id', '_exact', '_callback', '_contains', '_automaton')
+
+    def __init__(self, scenarios: Iterable[Scenario] = ()):
+        self._by_id: Dict[int, Scenario] = {}
+        exact: Dict[str, List[Scenario]] = {}
+        callback: Dict[str, List[Scenario]] = {}
+        contains: List[Scenario] = []
+
+        for scenario in scenarios:
+            self._by_id[scenario.id] = scenario
+            if scenario.trigger_type == 'exact':
+                exact.setdefault(scenario.trigger, []).append(scenario)
+            elif scenario.trigger_type == 'callback':
+                callback.setdefault(scenario.trigger, []).append(scenario)
+            elif scenario.trigger_type == 'contains':
+                contains.append(scenario)
+
+        self._exact = {key: tuple(sorted(bucket, key=_by_priority)) for key, bucket in exact.items()}
+        self._callback = {key: tuple(sorted(bucket, key=_by_priority)) for key, bucket in callback.items()}
+        self._set_contains(tuple(sorted(contains, key=_by_priority)))
+
+    def _set_contains(self, contains: Tuple[Scenario, ...]):
+        """Установить contains-сценарии (по приоритету) и скомпилировать автомат"""
+        self._contains = contains
+        self._automaton = (
+            AhoCorasick((scenario.trigger, rank) for rank, scenario in enumerate(contains))
+            if len(contains) >= AHO_CORASICK_MIN_PATTERNS else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, scenario_id: int) -> Optional[Scenario]:
+        """Активный сценарий по ID"""
+        return self._by_id.get(scenario_id)
+
+    def scenarios(self) -> Iterator[Scenario]:
+        """Все сценарии снимка"""
+        return iter(self._by_id.values())
+
+    def _copy(self) -> 'ScenarioMatcher':
+        """Поверхностная копия: корзины индексов и автомат разделяются"""
+        clone = ScenarioMatcher.__new__(ScenarioMatcher)
+        clone._by_id = dict(self._by_id)
+        clone._exact = dict(self._exact)
+        clone._callback = dict(self._callback)
+        clone._contains = self._contains
+        clone._automaton = self._automaton
+        return clone
+
+    def _index_for(self, trigger_type: str) -> Optional[Dict[str, Tuple[Scenario, ...]]]:
+        """Хеш-индекс для типа триггера (у contains его нет)"""
+        if trigger_type == 'exact':
+            return self._exact
+        if trigger_type == 'callback':
+            return self._callback
+        return None
+
+    def _remove(self, scenario: Scenario):
+        """Удалить сценарий из индексов (только на свежей копии)"""
+        del self._by_id[scenario.id]
+
+        index = self._index_for(scenario.trigger_type)
+        if index is not None:
+            bucket = _bucket_without(index[scenario.trigger], scenario.id)
+            if bucket:
+                index[scenario.trigger] = bucket
+            else:
+                del index[scenario.trigger]
+        elif scenario.trigger_type == 'contains':
+            self._set_contains(_bucket_without(self._contains, scenario.id))
+
+    def _add(self, scenario: Scenario):
+        """Добавить сценарий в индексы (только на свежей копии)"""
+        self._by_id[scenario.id] = scenario
+
+        index = self._index_for(scenario.trigger_type)
+        if index is not None:
+            index[scenario.trigger] = _bucket_with(index.get(scenario.trigger, ()), scenario)
+        elif scenario.trigger_type == 'contains':
+            self._set_contains(_bucket_with(self._contains, scenario))
+
+    def with_scenario(self, scenario: Scenario) -> 'ScenarioMatcher':
+        """
+        Новый снимок с добавленным или обновлённым сценарием
+
+        Неактивный сценарий из снимка убирается.
+        """
+        if not scenario.active:
+            return self.without_scenario(scenario.id)
+
+        clone = self._copy()
+        old = clone._by_id.get(scenario.id)
+
+        if old is not None and old.trigger_type == 'contains' and scenario.trigger_type == 'contains':
+            # Автомат перестраивается один раз, а не на удаление и на вставку
+            clone._by_id[scenario.id] = scenario
+            contains = _bucket_without(clone._contains, scenario.id)
+            clone._set_contains(_bucket_with(contains, scenario))
+            return clone
+
+        if old is not None:
+            clone._remove(old)
+        clone._add(scenario)
+        return clone
+
+    def without_scenario(self, scenario_id: int) -> 'ScenarioMatcher':
+        """Новый снимок без сценария"""
+        scenario = self._by_id.get(scenario_id)
+        if scenario is None:
+            return self
+
+        clone = self._copy()
+        clone._remove(scenario)
+        return clone
+
+    def _first_contains(self, message_lower: str) -> Optional[Scenario]:
+        """Самый приоритетный contains-сценарий, триггер которого входит в сообщение"""
+        if self._automaton is not None:
+            rank = self._automaton.first_match(message_lower)
+            return self._contains[rank] if rank is not None else None
+
+        for scenario in self._contains:
+            if scenario.trigger in message_lower:
+                return scenario
+        return None
+
+    def match(
+        self,
+        message_text: Optional[str],
+        callback_data: Optional[str] = None
+    ) -> Optional[Scenario]:
+        """
+        Найти самый приоритетный подходящий сценарий
+
+        Args:
+            message_text: Текст сообщения от клиента
+            callback_data: Callback data от нажатия кнопки
+
+        Returns:
+            Сценарий или None
+        """
+        best = None
+
+        if callback_data:
+            bucket = self._callback.get(callback_data)
+            if bucket:
+                best = bucket[0]
+
+        if message_text:
+            message_lower = message_text.lower().strip()
+
+            bucket = self._exact.get(message_lower)
+            if bucket and (best is None or bucket[0].priority < best.priority):
+                best = bucket[0]
+
+            scenario = self._first_contains(message_lower)
+            if scenario is not None and (best is None or scenario.priority < best.priority):
+                best = scenario
+
+        return best
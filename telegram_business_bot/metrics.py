@@ -0,0 +1,246 @@
+"""
+Метрики в формате Prometheus и HTTP-эндпоинт /metrics
+"""
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счётчик"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class _Timer:
+    """Контекстный менеджер замера времени для Histogram.time()"""
+
+    __slots__ = ('_histogram', '_labelvalues', '_start')
+
+    def __init__(self, histogram: 'Histogram', labelvalues: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labelvalues = labelvalues
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labelvalues)
+        return False
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами
+
+    observe() - поиск корзины бинарным поиском и пара сложений, без
+    блокировок (всё выполняется в одном event loop).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labelvalues: str) -> _Timer:
+        """with histogram.time('label'): ..."""
+        return _Timer(self, labelvalues)
+
+    def timed(self, *labelvalues: str):
+        """Декоратор для корутин: время выполнения попадает в гистограмму"""
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labelvalues)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Метрика, значение которой вычисляется при каждом опросе /metrics
+
+    func возвращает число или словарь {значение метки: число}.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], Union[float, Dict[str, float]]],
+        metric_type: str = 'gauge',
+        labelname: Optional[str] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.metric_type = metric_type
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.debug(f"Метрика {self.name} недоступна: {e}")
+            return []
+        if isinstance(value, dict):
+            for label, item in value.items():
+                lines.append(f"{self.name}{_format_labels((self.labelname,), (label,))} {item}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик, отдаваемых на /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge_func(self, name: str, documentation: str, func, labelname: Optional[str] = None):
+        """Gauge, вычисляемый при опросе"""
+        return self._register(CallbackMetric(name, documentation, func, 'gauge', labelname))
+
+    def counter_func(self, name: str, documentation: str, func, labelname: Optional[str] = None):
+        """Counter, значение которого берётся из чужих счётчиков при опросе"""
+        return self._register(CallbackMetric(name, documentation, func, 'counter', labelname))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Глобальный реестр метрик
+registry = MetricsRegistry()
+
+UPDATES_TOTAL = registry.counter(
+    'bot_updates_total', 'Обработанные апдейты по типу', ('event_type',)
+)
+UPDATE_ERRORS_TOTAL = registry.counter(
+    'bot_update_errors_total', 'Апдейты, обработка которых завершилась исключением', ('event_type',)
+)
+UPDATE_SECONDS = registry.histogram(
+    'bot_update_seconds', 'Полное время обработки апдейта', ('event_type',)
+)
+STAGE_SECONDS = registry.histogram(
+    'bot_stage_seconds', 'Время этапов ответа клиенту: match, keyboard, send', ('stage',)
+)
+DB_SECONDS = registry.histogram(
+    'bot_db_seconds', 'Время вызовов методов Database', ('method',)
+)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: количество, ошибки и время обработки"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS_TOTAL.inc(event_type)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - start, event_type)
+            UPDATES_TOTAL.inc(event_type)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запустить HTTP-сервер с /metrics, вернуть runner для остановки"""
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
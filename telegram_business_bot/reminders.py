@@ -0,0 +1,317 @@
+"""
+Отложенные напоминания: очередь в БД и один диспетчер на процесс
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+
+from config import (
+    REMINDER_BATCH_SIZE,
+    REMINDER_MAX_ATTEMPTS,
+    REMINDER_RETRY_DELAY,
+    REMINDER_MAX_SLEEP,
+    REMINDER_POLICY,
+    REMINDER_MAX_PER_CHAT,
+    REMINDER_WHEEL_TICK,
+    REMINDER_SEND_CONCURRENCY,
+    REMINDER_JITTER,
+    SEND_DRAIN_TIMEOUT
+)
+from db import db
+from keyboards import scenario_keyboards
+from scenario import Scenario
+from sender import sender
+from timing_wheel import TimingWheel
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderDispatcher:
+    """
+    Диспетчер напоминаний
+
+    Напоминание - строка таблицы pending_reminders (сценарий, чат,
+    подключение, время отправки), и после перезапуска очередь продолжает
+    разбираться. В памяти сроки напоминаний держит колесо таймеров
+    (timing_wheel.py) с шагом wheel_tick: диспетчер спит до ближайшего
+    шага с напоминаниями, забирает наступившие из БД пачками по batch_size
+    и отправляет через общую очередь отправки: не больше send_concurrency
+    одновременно и вразброс в пределах jitter секунд, чтобы массовое
+    напоминание не вытесняло ответы клиентам. Строки отправленной пачки
+    удаляются и пишутся в reminder_history одной транзакцией. Не реже
+    чем раз в max_sleep секунд очередь проверяется и без таймеров - так
+    подхватываются напоминания других процессов и повторы.
+
+    На сценарий в чате ожидает не больше одного напоминания: повторный
+    триггер обрабатывается по policy (см. REMINDER_POLICY), а всего у чата
+    не больше max_per_chat напоминаний. Новое сообщение клиента отменяет
+    напоминания чата (cancel_for_chat), кроме напоминания повторённого
+    сценария - в БД идём, только если у чата есть таймеры.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        max_attempts: int = REMINDER_MAX_ATTEMPTS,
+        retry_delay: float = REMINDER_RETRY_DELAY,
+        max_sleep: float = REMINDER_MAX_SLEEP,
+        policy: str = REMINDER_POLICY,
+        max_per_chat: int = REMINDER_MAX_PER_CHAT,
+        wheel_tick: float = REMINDER_WHEEL_TICK,
+        send_concurrency: int = REMINDER_SEND_CONCURRENCY,
+        jitter: float = REMINDER_JITTER
+    ):
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.max_sleep = max_sleep
+        self.policy = policy
+        self.max_per_chat = max(1, max_per_chat)
+        self.wheel_tick = wheel_tick
+        self.send_concurrency = max(1, send_concurrency)
+        # Разброс меньше аренды строки, иначе её заберут повторно
+        self.jitter = max(0.0, min(jitter, retry_delay / 2))
+        self._rng = random.Random()
+
+        self.bot: Optional[Bot] = None
+        # (номер воркера, число воркеров) в многопроцессном режиме
+        self.shard: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Время, до которого диспетчер собирается спать
+        self._sleep_until = 0.0
+        self._stopping = False
+        # Таймеры по ключу (business_connection_id, chat_id, scenario_id)
+        self._wheel = TimingWheel(wheel_tick, now=time.time())
+        # (business_connection_id, chat_id) -> сценарии с таймерами
+        self._chat_scenarios: Dict[Tuple[str, int], Set[int]] = {}
+        self._next_poll = 0.0
+
+        self.stats = {
+            'scheduled': 0,
+            'skipped': 0,
+            'cancelled': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0,
+        }
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def timers(self) -> int:
+        return len(self._wheel)
+
+    def start(self, bot: Bot, shard: Optional[Tuple[int, int]] = None):
+        """
+        Запустить диспетчер (вызывается из работающего event loop)
+
+        shard - (номер воркера, число воркеров): в таймеры загружаются и
+        из очереди забираются только напоминания чатов этого воркера.
+        """
+        if self._task is not None:
+            return
+
+        self.bot = bot
+        self.shard = shard
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="reminder-dispatcher")
+        logger.info("Диспетчер напоминаний запущен")
+
+    async def close(self, timeout: float = SEND_DRAIN_TIMEOUT):
+        """Дать отправиться текущей пачке и остановиться"""
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            # Недоотправленные напоминания вернутся в очередь через retry_delay
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info(f"Диспетчер напоминаний остановлен: {self.stats}")
+
+    async def schedule(self, scenario: Scenario, chat_id: int, business_connection_id: str):
+        """Поставить напоминание, если сценарий этого требует"""
+        if not (scenario.is_reminder and scenario.reminder_delay_min > 0):
+            return
+
+        delay_minutes = scenario.reminder_delay_min
+        due_at = time.time() + delay_minutes * 60
+        due_at = await db.add_pending_reminder(
+            scenario.id, chat_id, business_connection_id, due_at,
+            policy=self.policy, max_per_chat=self.max_per_chat
+        )
+        if due_at is None:
+            self.stats['skipped'] += 1
+            return
+        self._add_timer(business_connection_id, chat_id, scenario.id, due_at)
+        self.stats['scheduled'] += 1
+        logger.info(f"Запланировано напоминание через {delay_minutes} мин")
+
+    def _add_timer(self, business_connection_id: str, chat_id: int, scenario_id: int, due_at: float):
+        self._wheel.add((business_connection_id, chat_id, scenario_id), due_at)
+        self._chat_scenarios.setdefault((business_connection_id, chat_id), set()).add(scenario_id)
+
+        # Будим диспетчер, только если он собирается спать дольше
+        if self._wakeup is not None and due_at < self._sleep_until:
+            self._wakeup.set()
+
+    def _forget_timer(self, key: Tuple[str, int, int]):
+        chat_key = key[:2]
+        scenarios = self._chat_scenarios.get(chat_key)
+        if scenarios is not None:
+            scenarios.discard(key[2])
+            if not scenarios:
+                del self._chat_scenarios[chat_key]
+
+    async def cancel_for_chat(self, business_connection_id: str, chat_id: int, keep_scenario_id: Optional[int] = None):
+        """
+        Отменить напоминания чата (клиент снова написал)
+
+        keep_scenario_id - сценарий, который клиент сейчас повторил: его
+        напоминание остаётся, и повторный триггер обработает REMINDER_POLICY.
+        """
+        chat_key = (business_connection_id, chat_id)
+        scenarios = self._chat_scenarios.get(chat_key)
+        if not scenarios or scenarios == {keep_scenario_id}:
+            return
+        for scenario_id in scenarios:
+            if scenario_id != keep_scenario_id:
+                self._wheel.cancel((business_connection_id, chat_id, scenario_id))
+        if keep_scenario_id in scenarios:
+            self._chat_scenarios[chat_key] = {keep_scenario_id}
+        else:
+            del self._chat_scenarios[chat_key]
+        cancelled = await db.cancel_pending_reminders(business_connection_id, chat_id, keep_scenario_id)
+        if cancelled:
+            self.stats['cancelled'] += cancelled
+            logger.info(f"Отменено напоминаний: {cancelled} (клиент написал снова)")
+
+    async def cancel_for_connection(self, business_connection_id: str):
+        """Отменить все напоминания подключения (оно отключено или не может отвечать)"""
+        chats = [key for key in self._chat_scenarios if key[0] == business_connection_id]
+        for chat_key in chats:
+            for scenario_id in self._chat_scenarios.pop(chat_key):
+                self._wheel.cancel((*chat_key, scenario_id))
+        cancelled = await db.cancel_connection_reminders(business_connection_id)
+        if cancelled:
+            self.stats['cancelled'] += cancelled
+            logger.info(f"Отменено напоминаний подключения {business_connection_id}: {cancelled}")
+
+    async def _run(self):
+        try:
+            # Напоминания, оставшиеся с прошлого запуска (чаты других
+            # воркеров достаются им)
+            for business_connection_id, chat_id, scenario_id, due_at in await db.get_pending_reminders(self.shard):
+                self._add_timer(business_connection_id, chat_id, scenario_id, due_at)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить напоминания: {e}")
+
+        while not self._stopping:
+            # Пока идёт выборка, любое новое напоминание должно разбудить
+            # диспетчер сразу после неё
+            self._wakeup.clear()
+            self._sleep_until = float('inf')
+
+            now = time.time()
+            expired = self._wheel.advance(now)
+            for key in expired:
+                self._forget_timer(key)
+
+            if expired or now >= self._next_poll:
+                self._next_poll = now + self.max_sleep
+                try:
+                    while not self._stopping:
+                        reminders = await db.claim_due_reminders(
+                            time.time(), self.batch_size, self.retry_delay, self.shard
+                        )
+                        await self._deliver_batch(reminders)
+                        # Полная пачка - наступивших может быть больше
+                        if len(reminders) < self.batch_size:
+                            break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка диспетчера напоминаний: {e}", exc_info=True)
+
+            next_expiry = self._wheel.next_expiry()
+            wake_at = self._next_poll if next_expiry is None else min(next_expiry, self._next_poll)
+            delay = max(0.0, wake_at - time.time())
+            self._sleep_until = wake_at
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_batch(self, reminders: List[Dict]):
+        """Отправить пачку и одной транзакцией убрать завершённые из очереди"""
+        if not reminders:
+            return
+        slots = asyncio.Semaphore(self.send_concurrency)
+        spread = self.jitter if len(reminders) > 1 else 0.0
+        outcomes = await asyncio.gather(*(self._deliver(reminder, slots, spread) for reminder in reminders))
+
+        delivered = [reminder for reminder, outcome in zip(reminders, outcomes) if outcome == 'sent']
+        discarded = [reminder for reminder, outcome in zip(reminders, outcomes) if outcome in ('failed', 'dropped')]
+        await db.complete_reminders(delivered, discarded)
+
+    async def _deliver(self, reminder: Dict, slots: asyncio.Semaphore, spread: float) -> str:
+        """Отправить одно напоминание, вернуть исход: sent, failed, retried или dropped"""
+        # Текущая версия сценария из снимка: правки админа попадают и в
+        # уже поставленные напоминания
+        scenario = await db.get_active_scenario(reminder['scenario_id'], reminder['business_connection_id'])
+        if scenario is None or not scenario.is_reminder:
+            # Сценарий удалён, выключен или больше не напоминание
+            self.stats['dropped'] += 1
+            return 'dropped'
+        if not db.connections.can_reply(reminder['business_connection_id']):
+            # Подключение отключено или потеряло право отвечать
+            self.stats['dropped'] += 1
+            return 'dropped'
+
+        if spread and not self._stopping:
+            await asyncio.sleep(self._rng.uniform(0, spread))
+
+        try:
+            keyboard = scenario_keyboards.get(scenario)
+            async with slots:
+                await sender.send_message(
+                    chat_id=reminder['chat_id'],
+                    text=scenario.response_text,
+                    business_connection_id=reminder['business_connection_id'],
+                    reply_markup=keyboard
+                )
+        except Exception as e:
+            if reminder['attempts'] >= self.max_attempts:
+                self.stats['failed'] += 1
+                logger.error(f"Напоминание не отправлено после {reminder['attempts']} попыток: {e}")
+                return 'failed'
+            else:
+                # Строка уже отложена на retry_delay при выборке
+                self._add_timer(
+                    reminder['business_connection_id'], reminder['chat_id'], reminder['scenario_id'],
+                    time.time() + self.retry_delay
+                )
+                self.stats['retried'] += 1
+                logger.warning(f"Ошибка отправки напоминания, повтор через {self.retry_delay} с: {e}")
+                return 'retried'
+
+        self.stats['sent'] += 1
+        logger.info(f"Напоминание отправлено: chat_id={reminder['chat_id']}, scenario_id={reminder['scenario_id']}")
+        return 'sent'
+
+
+# Глобальный диспетчер напоминаний
+reminders = ReminderDispatcher()
@@ -0,0 +1,112 @@
+"""
+Запись сценария в памяти
+"""
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Mapping, Optional, Tuple
+
+from keyboards import validate_keyboard_json
+
+logger = logging.getLogger(__name__)
+
+# Кнопка ответа: (текст, callback_data)
+Button = Tuple[str, str]
+
+
+def scenario_priority(created_at: Optional[str], scenario_id: int) -> Tuple[float, int]:
+    """
+    Ключ приоритета сценария: меньше - важнее
+
+    Повторяет порядок выборки `ORDER BY created_at DESC, id ASC`
+    (Database.get_all_scenarios).
+    """
+    try:
+        timestamp = datetime.fromisoformat(str(created_at)).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        timestamp = 0.0
+    return -timestamp, scenario_id
+
+
+def parse_buttons(scenario_id: int, keyboard_json: Optional[str]) -> Tuple[Button, ...]:
+    """Кнопки из колонки keyboard_json; некорректная клавиатура - без кнопок"""
+    if not keyboard_json:
+        return ()
+    try:
+        buttons = validate_keyboard_json(keyboard_json)
+    except ValueError as e:
+        logger.warning(f"Некорректная клавиатура сценария ID={scenario_id}: {e}")
+        return ()
+    return tuple((button['text'], button['callback_data']) for button in buttons)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    Сценарий, готовый к поиску и ответу
+
+    Строка таблицы scenarios, разобранная один раз при чтении из БД:
+    trigger - нормализованный триггер (как его сравнивает матчер), buttons -
+    кнопки из keyboard_json, флаги - bool, priority - scenario_priority.
+    Одни и те же записи разделяют снимки сценариев, обработчики и
+    напоминания, поэтому запись неизменяема: правка сценария даёт новую.
+    """
+
+    # Без __dict__ у каждой записи: сценарии целиком лежат в памяти
+    # (benchmarks/bench_scenario_memory.py)
+    __slots__ = (
+        'id',
+        'trigger_type',
+        'trigger_value',
+        'trigger',
+        'response_text',
+        'buttons',
+        'is_reminder',
+        'reminder_delay_min',
+        'cooldown_sec',
+        'active',
+        'created_at',
+        'business_connection_id',
+        'priority',
+    )
+
+    id: int
+    trigger_type: str
+    trigger_value: str
+    trigger: str
+    response_text: str
+    buttons: Tuple[Button, ...]
+    is_reminder: bool
+    reminder_delay_min: int
+    cooldown_sec: int
+    active: bool
+    created_at: Optional[str]
+    business_connection_id: Optional[str]
+    priority: Tuple[float, int]
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> 'Scenario':
+        """Запись из строки scenarios (sqlite3.Row или словарь)"""
+        scenario_id = row['id']
+        trigger_value = row['trigger_value']
+        trigger = trigger_value.lower()
+        if trigger == trigger_value:
+            # Не храним вторую копию триггера, уже записанного в нижнем регистре
+            trigger = trigger_value
+        return cls(
+            id=scenario_id,
+            # Типов три, а строк из БД - по одной на сценарий
+            trigger_type=sys.intern(row['trigger_type']),
+            trigger_value=trigger_value,
+            trigger=trigger,
+            response_text=row['response_text'],
+            buttons=parse_buttons(scenario_id, row['keyboard_json']),
+            is_reminder=bool(row['is_reminder']),
+            reminder_delay_min=row['reminder_delay_min'],
+            cooldown_sec=row['cooldown_sec'],
+            active=bool(row['active']),
+            created_at=row['created_at'],
+            business_connection_id=row['business_connection_id'],
+            priority=scenario_priority(row['created_at'], scenario_id),
+        )
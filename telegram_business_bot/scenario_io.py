@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Импорт и экспорт сценариев в JSONL и CSV
+
+Формат - по одному сценарию на строку с полями SCENARIO_FIELDS (в CSV -
+строка заголовка с их именами). Обязательны trigger_type, trigger_value
+и response_text, остальные можно опустить. keyboard_json - JSON списка
+кнопок (в JSONL можно и сам список). Пустой business_connection_id -
+общий сценарий, иначе сценарий только этого подключения. created_at -
+время создания (UTC, как в БД): от него зависит приоритет пересекающихся
+триггеров, без него сценарий получает текущее время. Экспорт пишет все
+поля, включая created_at, так что после загрузки обратно сценарии
+сохраняют и приоритет.
+
+Запуск из командной строки (из каталога telegram_business_bot):
+    python scenario_io.py export scenarios.jsonl
+    python scenario_io.py import scenarios.csv
+
+Импорт из командной строки не обновляет снимок сценариев запущенного
+бота - после него бота нужно перезапустить.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterator, Optional, TextIO, Tuple
+
+from db import Database
+from keyboards import validate_callback_data, validate_keyboard_json
+
+# Колонки scenarios, которые переносятся при импорте и экспорте
+SCENARIO_FIELDS = (
+    'trigger_type',
+    'trigger_value',
+    'response_text',
+    'keyboard_json',
+    'is_reminder',
+    'reminder_delay_min',
+    'cooldown_sec',
+    'active',
+    'business_connection_id',
+    'created_at',
+)
+TRIGGER_TYPES = ('exact', 'contains', 'callback')
+FORMATS = ('jsonl', 'csv')
+
+_TRUE = {'1', 'true', 'yes', 'да'}
+_FALSE = {'0', 'false', 'no', 'нет', ''}
+
+
+def detect_format(file_name: str) -> str:
+    """
+    Формат по расширению файла
+
+    Raises:
+        ValueError: Неизвестное расширение
+    """
+    extension = os.path.splitext(file_name or '')[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    raise ValueError(f"ожидается файл .jsonl или .csv, получен «{file_name}»")
+
+
+def _parse_flag(value, field: str) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int) and value in (0, 1):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return 1
+    if text in _FALSE:
+        return 0
+    raise ValueError(f"{field}: ожидается 0 или 1, получено «{value}»")
+
+
+def _parse_count(value, field: str) -> int:
+    if value is None or value == '':
+        return 0
+    if isinstance(value, bool):
+        raise ValueError(f"{field}: ожидается целое число, получено «{value}»")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: ожидается целое число, получено «{value}»") from None
+    if number < 0:
+        raise ValueError(f"{field}: не может быть отрицательным")
+    return number
+
+
+def _parse_created_at(value) -> Optional[str]:
+    """Время создания в формате CURRENT_TIMESTAMP SQLite (строки сравниваются как текст)"""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"created_at: ожидается дата и время, получено «{value}»")
+    try:
+        created_at = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"created_at: ожидается дата и время, получено «{value}»") from None
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def validate_scenario(data: Dict) -> Tuple:
+    """
+    Проверить сценарий из файла и привести к строке для вставки
+
+    Returns:
+        Значения в порядке SCENARIO_FIELDS
+
+    Raises:
+        ValueError: Сценарий нельзя сохранить
+    """
+    if not isinstance(data, dict):
+        raise ValueError("ожидается объект с полями сценария")
+    unknown = set(data) - set(SCENARIO_FIELDS)
+    if unknown:
+        raise ValueError(f"неизвестные поля: {', '.join(sorted(unknown))}")
+
+    trigger_type = str(data.get('trigger_type') or '').strip()
+    if trigger_type not in TRIGGER_TYPES:
+        raise ValueError(f"trigger_type: ожидается одно из {', '.join(TRIGGER_TYPES)}")
+
+    values = {}
+    for field in ('trigger_value', 'response_text'):
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field}: не может быть пустым")
+        values[field] = value.strip()
+    if trigger_type == 'callback':
+        # Кнопка с длинным callback_data не отправится, и триггер не сработает
+        try:
+            validate_callback_data(values['trigger_value'])
+        except ValueError as e:
+            raise ValueError(f"trigger_value: {e}") from None
+
+    keyboard_json = data.get('keyboard_json')
+    if isinstance(keyboard_json, list):
+        keyboard_json = json.dumps(keyboard_json, ensure_ascii=False)
+    if keyboard_json in (None, ''):
+        keyboard_json = None
+    elif isinstance(keyboard_json, str):
+        # Та же проверка, что при вводе кнопок в админке
+        validate_keyboard_json(keyboard_json)
+    else:
+        raise ValueError("keyboard_json: ожидается JSON списка кнопок")
+
+    reminder_delay_min = _parse_count(data.get('reminder_delay_min'), 'reminder_delay_min')
+    is_reminder = data.get('is_reminder')
+    is_reminder = int(reminder_delay_min > 0) if is_reminder in (None, '') else _parse_flag(is_reminder, 'is_reminder')
+    active = data.get('active')
+    active = 1 if active in (None, '') else _parse_flag(active, 'active')
+    business_connection_id = data.get('business_connection_id')
+    if business_connection_id is not None and not isinstance(business_connection_id, str):
+        raise ValueError("business_connection_id: ожидается строка")
+    business_connection_id = (business_connection_id or '').strip() or None
+
+    return (
+        trigger_type,
+        values['trigger_value'],
+        values['response_text'],
+        keyboard_json,
+        is_reminder,
+        reminder_delay_min,
+        _parse_count(data.get('cooldown_sec'), 'cooldown_sec'),
+        active,
+        business_connection_id,
+        _parse_created_at(data.get('created_at')),
+    )
+
+
+def _iter_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """(номер строки, сырой объект) по одному, без чтения файла целиком"""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"строка {line_no}: некорректный JSON: {e.msg}") from e
+    elif fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None:
+            return
+        for record in reader:
+            if None in record:
+                raise ValueError(f"строка {reader.line_num}: лишние значения без заголовка")
+            yield reader.line_num, record
+    else:
+        raise ValueError(f"неизвестный формат «{fmt}»")
+
+
+def read_scenarios(stream: TextIO, fmt: str) -> Iterator[Tuple]:
+    """
+    Сценарии из файла, проверенные и готовые к Database.import_scenarios
+
+    Разбирает поток по мере чтения, не загружая файл целиком.
+
+    Raises:
+        ValueError: Ошибка формата или проверки (с номером строки)
+    """
+    for line_no, record in _iter_records(stream, fmt):
+        try:
+            yield validate_scenario(record)
+        except ValueError as e:
+            raise ValueError(f"строка {line_no}: {e}") from None
+
+
+def check_scenarios(stream: TextIO, fmt: str) -> int:
+    """
+    Проверить весь файл, не сохраняя строки (read_scenarios)
+
+    Returns:
+        Количество сценариев в файле
+
+    Raises:
+        ValueError: Ошибка формата или проверки (с номером строки)
+        UnicodeDecodeError: Файл не в UTF-8
+    """
+    return sum(1 for _ in read_scenarios(stream, fmt))
+
+
+async def import_stream(database: Database, stream: TextIO, fmt: str) -> int:
+    """
+    Импортировать сценарии из файла в два прохода
+
+    Сначала файл целиком проверяется в потоке (check_scenarios), так что
+    ошибка в любой строке отменяет импорт до обращения к БД и не держит
+    соединение записи. Затем поток перематывается и читается ещё раз:
+    Database.import_scenarios разбирает его пачками в потоке и вставляет
+    одной транзакцией. Память ограничена пачкой, а не размером файла.
+
+    Args:
+        stream: Текстовый поток с перемоткой (файл или open_text)
+
+    Returns:
+        Количество добавленных сценариев
+
+    Raises:
+        ValueError: Ошибка формата или проверки (с номером строки)
+        UnicodeDecodeError: Файл не в UTF-8
+    """
+    if not await asyncio.to_thread(check_scenarios, stream, fmt):
+        return 0
+    stream.seek(0)
+    return await database.import_scenarios(read_scenarios(stream, fmt))
+
+
+async def write_scenarios(rows: AsyncIterator[Dict], stream: TextIO, fmt: str) -> int:
+    """
+    Записать сценарии в поток по мере чтения из БД
+
+    Args:
+        rows: Строки scenarios (Database.iter_scenarios)
+        stream: Текстовый поток для записи
+        fmt: jsonl или csv
+
+    Returns:
+        Количество записанных сценариев
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"неизвестный формат «{fmt}»")
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=SCENARIO_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+    count = 0
+    async for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            record = {field: row[field] for field in SCENARIO_FIELDS}
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def open_text(data: io.BufferedIOBase) -> TextIO:
+    """Текстовый поток поверх байтов файла (UTF-8, BOM допускается)"""
+    return io.TextIOWrapper(data, encoding='utf-8-sig', newline='')
+
+
+async def _run_cli(command: str, path: str, fmt: Optional[str]) -> int:
+    try:
+        fmt = fmt or detect_format(path)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    database = Database()
+    await database.init_db()
+    try:
+        if command == 'export':
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                count = await write_scenarios(database.iter_scenarios(), stream, fmt)
+            print(f"✅ Экспортировано сценариев: {count} → {path}")
+        else:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                count = await import_stream(database, stream, fmt)
+            print(f"✅ Импортировано сценариев: {count}")
+            print("   Перезапустите бота, чтобы он подхватил новые сценарии")
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        await database.close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('path', help='файл .jsonl или .csv')
+    parser.add_argument('--format', choices=FORMATS, help='формат, если не подходит расширение файла')
+    args = parser.parse_args()
+    return asyncio.run(_run_cli(args.command, args.path, args.format))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
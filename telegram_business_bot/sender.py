@@ -0,0 +1,440 @@
+"""
+Очередь исходящих сообщений с ограничением скорости
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import Message
+
+from config import (
+    SEND_GLOBAL_RATE,
+    SEND_PER_CHAT_INTERVAL,
+    SEND_QUEUE_SIZE,
+    SEND_WORKERS,
+    SEND_MAX_RETRIES,
+    SEND_DRAIN_TIMEOUT,
+    READ_RECEIPT_WINDOW
+)
+
+logger = logging.getLogger(__name__)
+
+# Сколько записей держать в таблице per-chat лимитов до очистки устаревших
+_CHAT_SLOTS_SWEEP_THRESHOLD = 10000
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        """Дождаться и забрать один токен"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # Ожидающие обслуживаются по очереди, без гонки за токенами
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _OutgoingMessage:
+    """Сообщение в очереди на отправку"""
+
+    __slots__ = ('kwargs', 'future', 'chat_id', 'attempts', 'released')
+
+    def __init__(self, kwargs: Dict[str, Any], future: asyncio.Future):
+        self.kwargs = kwargs
+        self.future = future
+        self.chat_id = kwargs.get('chat_id')
+        self.attempts = 0
+        # Сообщение вернул в очередь таймер своего чата (оно первое в очереди чата)
+        self.released = False
+
+
+# Попытка отправки не состоялась: сообщение отложено до слота чата
+_DEFERRED = object()
+
+
+class OutboundSender:
+    """
+    Диспетчер исходящих сообщений
+
+    Все ответы клиентам проходят через очередь, которую разбирают
+    несколько воркеров; сообщений в работе не больше queue_size, дальше
+    отправитель ждёт (backpressure). Воркер ждёт только глобальный лимит
+    Telegram (token bucket). Сообщение в чат, которому ещё рано писать
+    (интервал между сообщениями в один чат, retry_after или пауза после
+    сетевой ошибки), воркер не ждёт, а откладывает в очередь этого чата:
+    таймер чата вернёт его в общую очередь, когда подойдёт слот, а
+    остальные чаты тем временем отправляются. TelegramRetryAfter
+    откладывает только чат, в который не удалось отправить.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        per_chat_interval: float = SEND_PER_CHAT_INTERVAL,
+        queue_size: int = SEND_QUEUE_SIZE,
+        workers: int = SEND_WORKERS,
+        max_retries: int = SEND_MAX_RETRIES
+    ):
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.queue_size = max(1, queue_size)
+        self.workers_count = max(1, workers)
+        self.max_retries = max_retries
+
+        self.bot: Optional[Bot] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._capacity: Optional[asyncio.Semaphore] = None
+        self._workers: List[asyncio.Task] = []
+        self._bucket = TokenBucket(global_rate)
+        # chat_id -> время (monotonic), раньше которого в чат писать нельзя
+        self._chat_slots: Dict[Any, float] = {}
+        # chat_id -> отложенные сообщения чата по порядку
+        self._waiting: Dict[Any, Deque[_OutgoingMessage]] = {}
+        # chat_id -> таймер, который вернёт первое из них в очередь
+        self._timers: Dict[Any, asyncio.TimerHandle] = {}
+        # Сообщения от постановки в очередь до завершения
+        self._depth = 0
+        self._closing = False
+
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'retry_after': 0,
+            'deferred': 0,
+            'backpressure_waits': 0,
+            'max_queue_depth': 0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return self._depth
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, bot: Bot, global_rate: Optional[float] = None):
+        """
+        Запустить воркеры (вызывается из работающего event loop)
+
+        global_rate переопределяет глобальный лимит, например, когда
+        лимит токена делится между несколькими процессами.
+        """
+        if self._workers:
+            return
+
+        if global_rate is not None:
+            self.global_rate = global_rate
+            self._bucket = TokenBucket(global_rate)
+        self.bot = bot
+        self._closing = False
+        self._queue = asyncio.Queue()
+        self._capacity = asyncio.Semaphore(self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"sender-worker-{i}")
+            for i in range(self.workers_count)
+        ]
+        logger.info(
+            f"Очередь отправки запущена: {self.workers_count} воркеров, "
+            f"{self.global_rate} сообщ./с, очередь до {self.queue_size}"
+        )
+
+    async def close(self, timeout: float = SEND_DRAIN_TIMEOUT):
+        """Дождаться отправки накопленных сообщений и остановить воркеры"""
+        if not self._workers:
+            return
+
+        self._closing = True
+        try:
+            # Отложенные сообщения тоже не завершены в очереди
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь отправки не разобрана за {timeout} с, осталось {self.queue_depth}")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        unsent = [item for waiting in self._waiting.values() for item in waiting]
+        self._waiting = {}
+        while not self._queue.empty():
+            unsent.append(self._queue.get_nowait())
+
+        # Всё, что не успели отправить, завершаем ошибкой
+        for item in unsent:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Очередь отправки остановлена"))
+        self._depth = 0
+
+        logger.info(f"Очередь отправки остановлена: {self.stats}")
+
+    async def send_message(self, **kwargs) -> Message:
+        """
+        Поставить сообщение в очередь и дождаться отправки
+
+        Принимает те же аргументы, что и Bot.send_message. Если в работе
+        уже queue_size сообщений, вызывающий ждёт освобождения места
+        (backpressure).
+        """
+        if not self._workers or self._closing:
+            raise RuntimeError("Очередь отправки не запущена")
+
+        item = _OutgoingMessage(kwargs, asyncio.get_running_loop().create_future())
+        if self._capacity.locked():
+            self.stats['backpressure_waits'] += 1
+        await self._capacity.acquire()
+        self._queue.put_nowait(item)
+
+        self.stats['enqueued'] += 1
+        self._depth += 1
+        if self._depth > self.stats['max_queue_depth']:
+            self.stats['max_queue_depth'] = self._depth
+
+        return await item.future
+
+    def _arm(self, chat_id: Any):
+        """Запустить таймер чата, если у него есть отложенные сообщения"""
+        if chat_id in self._timers or not self._waiting.get(chat_id):
+            return
+        delay = max(0.0, self._chat_slots.get(chat_id, 0.0) - time.monotonic())
+        self._timers[chat_id] = asyncio.get_running_loop().call_later(delay, self._release, chat_id)
+
+    def _defer(self, item: _OutgoingMessage, first: bool = False):
+        """Отложить сообщение в очередь его чата до слота"""
+        waiting = self._waiting.setdefault(item.chat_id, deque())
+        if first:
+            waiting.appendleft(item)
+        else:
+            waiting.append(item)
+        self.stats['deferred'] += 1
+
+        # Слот мог отодвинуться (retry_after) - перезапускаем таймер
+        timer = self._timers.pop(item.chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._arm(item.chat_id)
+
+    def _release(self, chat_id: Any):
+        """Таймер чата: вернуть первое отложенное сообщение в общую очередь"""
+        self._timers.pop(chat_id, None)
+        waiting = self._waiting.get(chat_id)
+        if not waiting:
+            return
+        item = waiting.popleft()
+        if not waiting:
+            del self._waiting[chat_id]
+        item.released = True
+        self._queue.put_nowait(item)
+        # Закрываем get, после которого сообщение было отложено
+        self._queue.task_done()
+
+    def _take_chat_slot(self, item: _OutgoingMessage) -> bool:
+        """
+        Занять слот чата для отправки сейчас
+
+        False - чату ещё рано писать или у него уже есть очередь: сообщение
+        отложено. Между проверкой и резервированием нет await, поэтому
+        параллельные воркеры не займут один слот дважды.
+        """
+        chat_id = item.chat_id
+        was_released, item.released = item.released, False
+        if not was_released and chat_id in self._waiting:
+            # Не обгоняем сообщения, отложенные раньше
+            self._defer(item)
+            return False
+
+        now = time.monotonic()
+        if self._chat_slots.get(chat_id, 0.0) > now:
+            self._defer(item, first=was_released)
+            return False
+
+        if self.per_chat_interval:
+            self._chat_slots[chat_id] = now + self.per_chat_interval
+            if len(self._chat_slots) > _CHAT_SLOTS_SWEEP_THRESHOLD:
+                self._chat_slots = {key: value for key, value in self._chat_slots.items() if value > now}
+        # Следующее отложенное сообщение чата - к новому слоту
+        self._arm(chat_id)
+        return True
+
+    def _postpone(self, item: _OutgoingMessage, delay: float):
+        """Не писать в чат delay секунд и отложить сообщение первым в его очереди"""
+        slot = time.monotonic() + delay
+        self._chat_slots[item.chat_id] = max(self._chat_slots.get(item.chat_id, 0.0), slot)
+        self._defer(item, first=True)
+
+    async def _deliver(self, item: _OutgoingMessage):
+        """Одна попытка отправки; _DEFERRED - сообщение отложено до слота чата"""
+        if not self._take_chat_slot(item):
+            return _DEFERRED
+
+        await self._bucket.acquire()
+        item.attempts += 1
+        try:
+            return await self.bot.send_message(**item.kwargs)
+        except TelegramRetryAfter as e:
+            self.stats['retry_after'] += 1
+            if item.attempts > self.max_retries:
+                raise
+            self.stats['retried'] += 1
+            logger.warning(f"Flood control: повтор в чат {item.chat_id} через {e.retry_after} с")
+            self._postpone(item, e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if item.attempts > self.max_retries:
+                raise
+            self.stats['retried'] += 1
+            logger.warning(f"Сетевая ошибка при отправке, повтор: {e}")
+            self._postpone(item, min(2 ** item.attempts, 30))
+        return _DEFERRED
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            result = None
+            try:
+                if item.future.cancelled():
+                    # Отправитель ушёл - очередь чата переходит к следующему
+                    item.released = False
+                    self._arm(item.chat_id)
+                    continue
+                result = await self._deliver(item)
+            except asyncio.CancelledError:
+                if not item.future.done():
+                    item.future.cancel()
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                if result is _DEFERRED:
+                    # task_done - когда таймер чата вернёт сообщение в очередь
+                    continue
+                self.stats['sent'] += 1
+                if not item.future.done():
+                    item.future.set_result(result)
+            finally:
+                if result is not _DEFERRED:
+                    self._depth -= 1
+                    self._capacity.release()
+                    self._queue.task_done()
+
+
+class ReadReceiptBatcher:
+    """
+    Отметки "прочитано" для бизнес-чатов в фоне
+
+    Вызов read_business_message откладывается на window секунд; все
+    сообщения чата, пришедшие за это время, закрываются одним вызовом
+    с самым свежим message_id.
+    Ошибки не логируются по каждому сообщению, а считаются в stats.
+    """
+
+    def __init__(self, window: float = READ_RECEIPT_WINDOW):
+        self.window = window
+        self.bot: Optional[Bot] = None
+        # (business_connection_id, chat_id) -> отложенный вызов
+        self._pending: Dict[Tuple[str, int], asyncio.Task] = {}
+        # (business_connection_id, chat_id) -> последнее сообщение чата
+        self._message_ids: Dict[Tuple[str, int], int] = {}
+
+        self.stats = {
+            'scheduled': 0,
+            'coalesced': 0,
+            'sent': 0,
+            'failed': 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self, bot: Bot):
+        self.bot = bot
+
+    def schedule(self, business_connection_id: str, chat_id: int, message_id: int):
+        """Отметить сообщение и всё до него прочитанным (не ждёт вызова API)"""
+        if self.bot is None:
+            return
+
+        key = (business_connection_id, chat_id)
+        self._message_ids[key] = max(message_id, self._message_ids.get(key, message_id))
+        if key in self._pending:
+            self.stats['coalesced'] += 1
+            return
+
+        self.stats['scheduled'] += 1
+        self._pending[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: Tuple[str, int]):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            # Новые сообщения после этого момента откроют новое окно
+            self._pending.pop(key, None)
+            message_id = self._message_ids.pop(key, None)
+        await self._send(key, message_id)
+
+    async def _send(self, key: Tuple[str, int], message_id: int):
+        business_connection_id, chat_id = key
+        try:
+            await self.bot.read_business_message(
+                business_connection_id=business_connection_id,
+                chat_id=chat_id,
+                message_id=message_id
+            )
+            self.stats['sent'] += 1
+        except Exception:
+            self.stats['failed'] += 1
+
+    async def close(self, timeout: float = SEND_DRAIN_TIMEOUT):
+        """Сразу отправить отложенные отметки и остановиться"""
+        pending, self._pending = self._pending, {}
+        message_ids, self._message_ids = self._message_ids, {}
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+
+        if pending:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(self._send(key, message_ids[key]) for key in pending)),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Не все отметки о прочтении отправлены при остановке")
+
+        self.bot = None
+        logger.info(f"Отметки о прочтении: {self.stats}")
+
+
+# Глобальная очередь отправки
+sender = OutboundSender()
+
+# Отложенные отметки о прочтении
+read_receipts = ReadReceiptBatcher()
@@ -0,0 +1,9 @@
+"""
+Шардирование чатов между воркерами многопроцессного режима
+"""
+import zlib
+
+
+def shard_index(key: str, workers: int) -> int:
+    """Номер воркера для ключа "business_connection_id:chat_id" (не меняется между перезапусками)"""
+    return zlib.crc32(key.encode()) % workers
@@ -29,3 +29,13 @@ class DeleteScenarioStates(StatesGroup):
     """Состояния для удаления сценария"""
     selecting_scenario = State()         # Выбор сценария для удаления
     confirming_deletion = State()        # Подтверждение удаления
+
+
+class SearchScenarioStates(StatesGroup):
+    """Состояния для поиска сценариев"""
+    entering_query = State()             # Ввод строки поиска
+
+
+class ImportScenarioStates(StatesGroup):
+    """Состояния для импорта сценариев из файла"""
+    waiting_for_file = State()           # Ожидание файла .jsonl или .csv
@@ -0,0 +1,325 @@
+"""
+Многопроцессный режим: приём апдейтов в одном процессе, обработка в воркерах
+
+Главный процесс (Supervisor) получает апдейты через long polling или webhook
+и раздаёт их BOT_WORKERS процессам по ключу "business_connection_id:chat_id".
+Все апдейты одного чата попадают в один воркер и обрабатываются там по
+порядку, поэтому состояние чата (FSM админки, паузы между ответами, склейка
+сообщений) живёт в одном процессе. Изменение сценария или бизнес-подключения
+в одном воркере рассылается остальным, и они обновляют свои снимки.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import queue
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import GetUpdates
+from aiohttp import web
+
+from config import (
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WORKER_QUEUE_SIZE,
+    WORKER_MAX_CONCURRENCY,
+    SEND_DRAIN_TIMEOUT
+)
+from db import db
+from sharding import shard_index
+from webhook import serve_webhook
+
+logger = logging.getLogger(__name__)
+
+# Таймаут long polling в главном процессе (секунды)
+POLLING_TIMEOUT = 30
+
+# Как часто проверять, что воркеры живы (секунды)
+_WATCH_INTERVAL = 1.0
+
+# Сколько элементов воркер забирает из очереди за один переход в поток
+_INBOX_BATCH = 100
+
+
+def shard_key(update: Dict[str, Any]) -> str:
+    """
+    Ключ шардирования апдейта: "business_connection_id:chat_id"
+
+    У сообщений и callback'ов в личке бота (админка) business_connection_id
+    пустой, так что апдейты одного админа тоже попадают в один воркер.
+    """
+    for field in ('business_message', 'edited_business_message', 'deleted_business_messages', 'message'):
+        message = update.get(field)
+        if message:
+            return f"{message.get('business_connection_id', '')}:{message['chat']['id']}"
+
+    callback = update.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        if message:
+            return f"{message.get('business_connection_id', '')}:{message['chat']['id']}"
+        return f":{callback['from']['id']}"
+
+    connection = update.get('business_connection')
+    if connection:
+        return f"{connection['id']}:"
+
+    return ''
+
+
+class KeyedSerializer:
+    """
+    Выполняет корутины с одинаковым ключом строго по очереди
+
+    Корутины с разными ключами выполняются параллельно. Для ключа хранится
+    только последняя поставленная задача, и ключ удаляется, как только
+    его очередь опустела.
+    """
+
+    def __init__(self):
+        self._tails: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    def submit(self, key: str, coro) -> asyncio.Task:
+        task = asyncio.create_task(self._run_after(self._tails.get(key), coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._release(key, done))
+        return task
+
+    @staticmethod
+    async def _run_after(previous: Optional[asyncio.Task], coro):
+        if previous is not None:
+            await asyncio.wait((previous,))
+        return await coro
+
+    def _release(self, key: str, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def join(self):
+        """Дождаться всех поставленных задач"""
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+def _get_batch(inbox) -> list:
+    """Дождаться элемента очереди и забрать вместе с ним уже накопившиеся"""
+    items = [inbox.get()]
+    while len(items) < _INBOX_BATCH:
+        try:
+            items.append(inbox.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+async def consume_updates(
+    dp: Dispatcher,
+    bot: Bot,
+    inbox,
+    max_concurrency: int = WORKER_MAX_CONCURRENCY
+):
+    """
+    Цикл воркера: обрабатывать апдейты и команды из очереди до None
+
+    Апдейты одного чата обрабатываются по порядку, разных чатов - параллельно,
+    но не больше max_concurrency одновременно.
+    """
+    serializer = KeyedSerializer()
+    slots = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def handle(raw: str):
+        try:
+            await dp.feed_raw_update(bot, json.loads(raw))
+        except Exception as e:
+            logger.exception(f"Ошибка обработки апдейта: {e}")
+        finally:
+            slots.release()
+
+    while True:
+        for item in await asyncio.to_thread(_get_batch, inbox):
+            if item is None:
+                await serializer.join()
+                return
+
+            kind = item[0]
+            if kind == 'update':
+                await slots.acquire()
+                serializer.submit(item[1], handle(item[2]))
+            elif kind == 'scenario':
+                # Сценарий изменён в другом воркере (None - массовый импорт)
+                if item[1] is None:
+                    await db.reload_scenarios()
+                else:
+                    await db.refresh_scenario(item[1])
+            elif kind == 'connection':
+                # Подключение изменено в другом воркере
+                await db.refresh_business_connection(item[1])
+
+
+class Supervisor:
+    """
+    Главный процесс многопроцессного режима
+
+    target(index, workers, inbox, events) - функция воркера, запускается
+    в отдельном процессе (spawn). inbox - очередь апдейтов и команд этого
+    воркера, events - общая очередь событий от воркеров к главному процессу.
+    """
+
+    def __init__(self, workers: int, target: Callable, queue_size: int = WORKER_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.target = target
+        self._context = multiprocessing.get_context('spawn')
+        self._inboxes = [self._context.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._events = self._context.Queue()
+        self._processes: List[Any] = [None] * self.workers
+        self._relay_task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.stats = {
+            'dispatched': 0,
+            'backpressure_waits': 0,
+            'broadcasts': 0,
+            'restarts': 0,
+        }
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {str(index): inbox.qsize() for index, inbox in enumerate(self._inboxes)}
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.workers, self._inboxes[index], self._events),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        """Запустить воркеры (вызывается из работающего event loop)"""
+        for index in range(self.workers):
+            self._spawn(index)
+        self._relay_task = asyncio.create_task(self._relay_events())
+        self._watch_task = asyncio.create_task(self._watch_workers())
+        logger.info(f"Запущено воркеров: {self.workers}")
+
+    async def dispatch(self, update: Dict[str, Any], raw: Optional[str] = None):
+        """
+        Передать апдейт воркеру его чата
+
+        Если очередь воркера заполнена, вызывающий ждёт (backpressure).
+        """
+        key = shard_key(update)
+        inbox = self._inboxes[shard_index(key, self.workers)]
+        item = ('update', key, raw if raw is not None else json.dumps(update))
+        try:
+            inbox.put_nowait(item)
+        except queue.Full:
+            self.stats['backpressure_waits'] += 1
+            await asyncio.to_thread(inbox.put, item)
+        self.stats['dispatched'] += 1
+
+    async def _relay_events(self):
+        """Разослать остальным воркерам изменения сценариев и подключений"""
+        while True:
+            event = await asyncio.to_thread(self._events.get)
+            if event is None:
+                return
+
+            kind, source, payload = event
+            if kind in ('scenario', 'connection'):
+                for index, inbox in enumerate(self._inboxes):
+                    if index != source:
+                        await asyncio.to_thread(inbox.put, (kind, payload))
+                self.stats['broadcasts'] += 1
+
+    async def _watch_workers(self):
+        """Перезапустить воркер, если он упал"""
+        while not self._stopping:
+            await asyncio.sleep(_WATCH_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if not self._stopping and not process.is_alive():
+                    logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    self.stats['restarts'] += 1
+                    self._spawn(index)
+
+    async def stop(self, timeout: float = SEND_DRAIN_TIMEOUT + 5):
+        """Дать воркерам обработать очереди и остановить их"""
+        self._stopping = True
+        if self._watch_task:
+            self._watch_task.cancel()
+
+        for inbox in self._inboxes:
+            try:
+                await asyncio.to_thread(inbox.put, None, True, timeout)
+            except queue.Full:
+                pass
+
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Воркер {index} не остановился за {timeout} с, завершаем принудительно")
+                process.terminate()
+
+        self._events.put(None)
+        if self._relay_task:
+            await self._relay_task
+
+        logger.info(f"Воркеры остановлены: {self.stats}")
+
+    async def run_polling(self, bot: Bot, allowed_updates: List[str]):
+        """Long polling в главном процессе, работает до отмены"""
+        # getUpdates не работает, пока зарегистрирован webhook
+        await bot.delete_webhook()
+
+        request_timeout = int(bot.session.timeout + POLLING_TIMEOUT) if bot.session.timeout else None
+        offset: Optional[int] = None
+        backoff = 1.0
+        while True:
+            try:
+                updates = await bot(
+                    GetUpdates(offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates),
+                    request_timeout=request_timeout
+                )
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Ошибка getUpdates, повтор через {backoff} с: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            backoff = 1.0
+            for update in updates:
+                await self.dispatch(update.model_dump(mode='json', by_alias=True, exclude_unset=True))
+                offset = update.update_id + 1
+
+    async def run_webhook(self, bot: Bot, allowed_updates: List[str]):
+        """
+        Приём апдейтов через webhook, работает до отмены
+
+        В отличие от однопроцессного режима, Telegram получает ответ, как
+        только апдейт поставлен в очередь воркера.
+        """
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self._handle_webhook)
+        await serve_webhook(app, bot, allowed_updates)
+
+    async def _handle_webhook(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), WEBHOOK_SECRET
+        ):
+            return web.Response(status=401, text='Unauthorized')
+
+        raw = await request.text()
+        await self.dispatch(json.loads(raw), raw)
+        return web.json_response({})
@@ -0,0 +1,105 @@
+"""
+LRU скомпилированных матчеров сценариев по бизнес-подключениям
+"""
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from matcher import ScenarioMatcher
+
+
+class TenantMatcherCache:
+    """
+    Матчеры сценариев подключений (магазинов), загруженные по требованию
+
+    Подключение - ключ business_connection_id, значение - ScenarioMatcher
+    только с его сценариями. Размер кэша ограничен суммарным числом
+    сценариев в матчерах (max_scenarios): при переполнении вытесняются
+    давно не использованные подключения. Матчер без сценариев тоже
+    хранится (чтобы не ходить в БД на каждое сообщение) и весит как один
+    сценарий. Последний добавленный матчер не вытесняется, даже если один
+    превышает лимит.
+    """
+
+    def __init__(self, max_scenarios: int):
+        self.max_scenarios = max(1, max_scenarios)
+        self._matchers: 'OrderedDict[str, ScenarioMatcher]' = OrderedDict()
+        self._weight = 0
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._matchers)
+
+    @property
+    def scenarios(self) -> int:
+        """Вес кэша: сценарии во всех матчерах (пустой матчер - 1)"""
+        return self._weight
+
+    @staticmethod
+    def _weigh(matcher: ScenarioMatcher) -> int:
+        return max(1, len(matcher))
+
+    def get(self, business_connection_id: str) -> Optional[ScenarioMatcher]:
+        """Матчер подключения с отметкой использования (None - не загружен)"""
+        matcher = self._matchers.get(business_connection_id)
+        if matcher is None:
+            self.stats['misses'] += 1
+            return None
+        self._matchers.move_to_end(business_connection_id)
+        self.stats['hits'] += 1
+        return matcher
+
+    def peek(self, business_connection_id: str) -> Optional[ScenarioMatcher]:
+        """Матчер подключения без отметки использования и статистики"""
+        return self._matchers.get(business_connection_id)
+
+    def put(self, business_connection_id: str, matcher: ScenarioMatcher) -> List[ScenarioMatcher]:
+        """
+        Положить или заменить матчер подключения (как только что использованный)
+
+        Returns:
+            Вытесненные матчеры (их клавиатуры можно убрать из кэша)
+        """
+        old = self._matchers.pop(business_connection_id, None)
+        if old is not None:
+            self._weight -= self._weigh(old)
+        self._matchers[business_connection_id] = matcher
+        self._weight += self._weigh(matcher)
+        return self._evict(business_connection_id)
+
+    def replace(self, business_connection_id: str, matcher: ScenarioMatcher) -> List[ScenarioMatcher]:
+        """Заменить загруженный матчер, не меняя его места в очереди вытеснения"""
+        old = self._matchers.get(business_connection_id)
+        if old is None:
+            return []
+        self._matchers[business_connection_id] = matcher
+        self._weight += self._weigh(matcher) - self._weigh(old)
+        return self._evict(business_connection_id)
+
+    def _evict(self, keep: str) -> List[ScenarioMatcher]:
+        """Вытеснить давно не использованные матчеры, кроме keep, до лимита"""
+        if self._weight <= self.max_scenarios:
+            return []
+        evicted = []
+        for victim_id in list(self._matchers):
+            if self._weight <= self.max_scenarios:
+                break
+            if victim_id == keep:
+                continue
+            victim = self._matchers.pop(victim_id)
+            self._weight -= self._weigh(victim)
+            self.stats['evictions'] += 1
+            evicted.append(victim)
+        return evicted
+
+    def items(self) -> Iterator[Tuple[str, ScenarioMatcher]]:
+        """Снимок пар (подключение, матчер): кэш можно менять во время обхода"""
+        return iter(list(self._matchers.items()))
+
+    def clear(self):
+        self._matchers.clear()
+        self._weight = 0
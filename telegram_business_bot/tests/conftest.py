@@ -0,0 +1,9 @@
+"""
+Общая настройка тестов: модули бота импортируются из каталога telegram_business_bot
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '0:test')
+os.environ.setdefault('ADMIN_IDS', '1')
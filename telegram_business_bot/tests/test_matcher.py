@@ -0,0 +1,132 @@
+"""
+Эквивалентность in-memory снимка сценариев прежнему поиску
+
+Database.find_matching_scenario сравнивается с копией исходной
+реализации: выборка активных сценариев из SQLite по created_at DESC и
+первый подходящий при линейном переборе. Сценарии получают разные
+created_at в порядке, не совпадающем с id, так что проверяется и
+приоритет, а не только сам факт совпадения.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from db import Database
+
+WORDS = [
+    'привет', 'цена', 'Расписание', 'доставка', 'скидка', 'адрес', 'запись',
+    'price', 'Hello', 'menu', 'заказ', 'оплата', 'да', 'нет', 'a', ''
+]
+CALLBACKS = ['schedule_full', 'price', 'menu', 'Menu']
+
+
+async def legacy_find_matching_scenario(database: Database, message_text, callback_data=None):
+    """find_matching_scenario до появления in-memory снимка (без get_all_scenarios)"""
+    async with database.pool.read() as db:
+        async with db.execute("SELECT * FROM scenarios WHERE active = 1 ORDER BY created_at DESC") as cursor:
+            scenarios = [dict(row) for row in await cursor.fetchall()]
+
+    for scenario in scenarios:
+        trigger_type = scenario['trigger_type']
+        trigger_value = scenario['trigger_value'].lower()
+
+        if trigger_type == 'callback' and callback_data:
+            if callback_data == trigger_value:
+                return scenario
+
+        elif message_text and trigger_type in ['exact', 'contains']:
+            message_lower = message_text.lower().strip()
+
+            if trigger_type == 'exact':
+                if message_lower == trigger_value:
+                    return scenario
+
+            elif trigger_type == 'contains':
+                if trigger_value in message_lower:
+                    return scenario
+
+    return None
+
+
+def random_trigger(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 2))).strip() or rng.choice(WORDS[:-1])
+
+
+def random_message(rng: random.Random) -> str:
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 5)))
+    return rng.choice(['', ' ', '  ']) + text + rng.choice(['', ' ', '!'])
+
+
+def random_callback(rng: random.Random):
+    return rng.choice([None, '', 'zzz', *CALLBACKS])
+
+
+async def add_random_scenarios(database: Database, rng: random.Random, count: int) -> list:
+    """Сценарии со случайными триггерами и разными created_at вперемешку с id"""
+    ids = []
+    for _ in range(count):
+        trigger_type = rng.choice(['exact', 'contains', 'contains', 'callback'])
+        trigger_value = rng.choice(CALLBACKS) if trigger_type == 'callback' else random_trigger(rng)
+        ids.append(await database.add_scenario(trigger_type, trigger_value, 'ответ'))
+
+    start = datetime(2024, 1, 1)
+    offsets = rng.sample(range(count * 10), count)
+    async with database.pool.write() as db:
+        await db.executemany("UPDATE scenarios SET created_at = ? WHERE id = ?", [
+            ((start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S'), scenario_id)
+            for scenario_id, offset in zip(ids, offsets)
+        ])
+    await database.reload_scenarios()
+    return ids
+
+
+async def assert_equivalent(database: Database, rng: random.Random, queries: int):
+    for _ in range(queries):
+        message_text = random_message(rng) if rng.random() < 0.8 else None
+        callback_data = random_callback(rng)
+        expected = await legacy_find_matching_scenario(database, message_text, callback_data)
+        actual = await database.find_matching_scenario(message_text, callback_data)
+        assert (actual.id if actual else None) == (expected['id'] if expected else None), (
+            f"message={message_text!r}, callback={callback_data!r}"
+        )
+
+
+def run_with_database(tmp_path, check):
+    async def main():
+        database = Database(str(tmp_path / 'test.db'))
+        await database.init_db()
+        try:
+            await check(database)
+        finally:
+            await database.close()
+    asyncio.run(main())
+
+
+def test_snapshot_matches_legacy(tmp_path):
+    rng = random.Random(1)
+
+    async def check(database):
+        await add_random_scenarios(database, rng, 300)
+        await assert_equivalent(database, rng, 2000)
+
+    run_with_database(tmp_path, check)
+
+
+def test_snapshot_matches_legacy_after_edits(tmp_path):
+    rng = random.Random(2)
+
+    async def check(database):
+        ids = await add_random_scenarios(database, rng, 100)
+        for _ in range(30):
+            target = rng.choice(ids)
+            action = rng.choice(['toggle', 'update', 'delete'])
+            if action == 'toggle':
+                await database.toggle_scenario_active(target)
+            elif action == 'update':
+                await database.update_scenario(target, trigger_value=random_trigger(rng))
+            else:
+                await database.delete_scenario(target)
+                ids.remove(target)
+            await assert_equivalent(database, rng, 50)
+
+    run_with_database(tmp_path, check)
@@ -0,0 +1,71 @@
+"""
+Экспорт и импорт сценариев (scenario_io)
+"""
+import asyncio
+import io
+
+import pytest
+
+from db import Database
+from scenario_io import import_stream, validate_scenario, write_scenarios
+
+
+def run_with_databases(tmp_path, check):
+    async def main():
+        source = Database(str(tmp_path / 'source.db'))
+        target = Database(str(tmp_path / 'target.db'))
+        await source.init_db()
+        await target.init_db()
+        try:
+            await check(source, target)
+        finally:
+            await source.close()
+            await target.close()
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'csv'])
+def test_round_trip_keeps_priority(tmp_path, fmt):
+    async def check(source, target):
+        older = await source.add_scenario('contains', 'цена', 'старый')
+        newer = await source.add_scenario('contains', 'цена доставки', 'новый')
+        async with source.pool.write() as db:
+            await db.execute("UPDATE scenarios SET created_at = '2024-01-01 10:00:00' WHERE id = ?", (older,))
+            await db.execute("UPDATE scenarios SET created_at = '2024-02-01 10:00:00' WHERE id = ?", (newer,))
+        await source.reload_scenarios()
+        assert (await source.find_matching_scenario('цена доставки?')).response_text == 'новый'
+
+        stream = io.StringIO()
+        assert await write_scenarios(source.iter_scenarios(), stream, fmt) == 2
+        stream.seek(0)
+        assert await import_stream(target, stream, fmt) == 2
+
+        assert (await target.find_matching_scenario('цена доставки?')).response_text == 'новый'
+        exported = {row['response_text']: row['created_at'] async for row in target.iter_scenarios()}
+        assert exported == {'старый': '2024-01-01 10:00:00', 'новый': '2024-02-01 10:00:00'}
+
+    run_with_databases(tmp_path, check)
+
+
+def test_import_rejects_bad_row_before_writing(tmp_path):
+    async def check(source, target):
+        document = (
+            '{"trigger_type": "exact", "trigger_value": "a", "response_text": "b"}\n'
+            '{"trigger_type": "callback", "trigger_value": "' + 'x' * 65 + '", "response_text": "b"}\n'
+        )
+        with pytest.raises(ValueError, match='строка 2'):
+            await import_stream(target, io.StringIO(document), 'jsonl')
+        assert await target.count_scenarios() == 0
+
+    run_with_databases(tmp_path, check)
+
+
+def test_created_at_is_normalized():
+    row = validate_scenario({
+        'trigger_type': 'exact', 'trigger_value': 'a', 'response_text': 'b',
+        'created_at': '2024-03-01T12:30:00+03:00',
+    })
+    assert row[-1] == '2024-03-01 09:30:00'
+    assert validate_scenario({'trigger_type': 'exact', 'trigger_value': 'a', 'response_text': 'b'})[-1] is None
+    with pytest.raises(ValueError, match='created_at'):
+        validate_scenario({'trigger_type': 'exact', 'trigger_value': 'a', 'response_text': 'b', 'created_at': 'вчера'})
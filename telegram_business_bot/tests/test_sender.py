@@ -0,0 +1,152 @@
+"""
+Очередь отправки (OutboundSender) против поддельного бота с flood control
+"""
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from sender import OutboundSender
+
+
+class FakeBot:
+    """Bot.send_message с задержкой сети; flood[chat_id] - сколько раз ответить 429"""
+
+    def __init__(self, latency: float = 0.002, retry_after: int = 1):
+        self.latency = latency
+        self.retry_after = retry_after
+        self.flood = {}
+        self.sent = []
+
+    async def send_message(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        chat_id = kwargs['chat_id']
+        if self.flood.get(chat_id):
+            self.flood[chat_id] -= 1
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=chat_id, text=kwargs['text']),
+                message='Too Many Requests',
+                retry_after=self.retry_after,
+            )
+        self.sent.append((chat_id, kwargs['text'], time.monotonic()))
+        return kwargs['text']
+
+
+def run(check, **options):
+    async def main():
+        bot = FakeBot()
+        sender = OutboundSender(**{
+            'global_rate': 1000, 'per_chat_interval': 0.05, 'queue_size': 100, 'workers': 4, 'max_retries': 3,
+            **options,
+        })
+        sender.start(bot)
+        try:
+            await check(bot, sender)
+        finally:
+            await sender.close(timeout=5)
+    asyncio.run(main())
+
+
+def test_retry_after_defers_only_that_chat():
+    async def check(bot, sender):
+        bot.flood['A'] = 1
+        started = time.monotonic()
+        flooded = [asyncio.create_task(sender.send_message(chat_id='A', text=str(i))) for i in range(3)]
+        await asyncio.sleep(0.05)
+
+        # Другой чат не ждёт retry_after чата A
+        assert await sender.send_message(chat_id='B', text='b') == 'b'
+        assert time.monotonic() - started < 0.5
+
+        assert await asyncio.gather(*flooded) == ['0', '1', '2']
+        assert time.monotonic() - started >= bot.retry_after
+        assert [text for chat_id, text, _ in bot.sent if chat_id == 'A'] == ['0', '1', '2']
+        assert sender.stats['retry_after'] == 1
+        assert sender.stats['retried'] == 1
+        assert sender.queue_depth == 0
+
+    run(check)
+
+
+def test_per_chat_interval_keeps_order_without_blocking_other_chats():
+    async def check(bot, sender):
+        burst = [asyncio.create_task(sender.send_message(chat_id='A', text=str(i))) for i in range(5)]
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        await sender.send_message(chat_id='B', text='b')
+        assert time.monotonic() - started < 0.1
+
+        assert await asyncio.gather(*burst) == [str(i) for i in range(5)]
+        # Между отправками в чат - не меньше интервала (с запасом на задержку сети)
+        times = [sent_at for chat_id, _, sent_at in bot.sent if chat_id == 'A']
+        assert all(later - earlier >= 0.15 for earlier, later in zip(times, times[1:]))
+
+    run(check, per_chat_interval=0.2)
+
+
+def test_retry_limit_fails_the_message():
+    async def check(bot, sender):
+        bot.retry_after = 0
+        bot.flood['A'] = 10
+        with pytest.raises(TelegramRetryAfter):
+            await sender.send_message(chat_id='A', text='a')
+        assert bot.flood['A'] == 10 - 2
+        assert sender.stats['failed'] == 1
+        assert sender.queue_depth == 0
+
+        # Очередь чата после ошибки продолжает работать
+        bot.flood['A'] = 0
+        assert await sender.send_message(chat_id='A', text='b') == 'b'
+
+    run(check, max_retries=1)
+
+
+def test_cancelled_caller_does_not_stall_the_chat():
+    async def check(bot, sender):
+        tasks = [asyncio.create_task(sender.send_message(chat_id='A', text=str(i))) for i in range(3)]
+        await asyncio.sleep(0.01)
+        tasks[1].cancel()
+
+        assert await tasks[0] == '0'
+        assert await tasks[2] == '2'
+        with pytest.raises(asyncio.CancelledError):
+            await tasks[1]
+        assert [text for _, text, _ in bot.sent] == ['0', '2']
+        assert sender.queue_depth == 0
+
+    run(check)
+
+
+def test_close_drains_deferred_messages():
+    async def main():
+        bot = FakeBot()
+        sender = OutboundSender(global_rate=1000, per_chat_interval=0.05, queue_size=100, workers=2)
+        sender.start(bot)
+        tasks = [asyncio.create_task(sender.send_message(chat_id='A', text=str(i))) for i in range(4)]
+        await asyncio.sleep(0.01)
+
+        await sender.close(timeout=5)
+        assert [task.result() for task in tasks] == ['0', '1', '2', '3']
+        assert sender.queue_depth == 0
+        with pytest.raises(RuntimeError):
+            await sender.send_message(chat_id='A', text='late')
+
+    asyncio.run(main())
+
+
+def test_close_fails_messages_left_after_timeout():
+    async def main():
+        bot = FakeBot()
+        sender = OutboundSender(global_rate=1000, per_chat_interval=10, queue_size=100, workers=2)
+        sender.start(bot)
+        tasks = [asyncio.create_task(sender.send_message(chat_id='A', text=str(i))) for i in range(2)]
+        await asyncio.sleep(0.01)
+
+        await sender.close(timeout=0.1)
+        first, second = await asyncio.gather(*tasks, return_exceptions=True)
+        assert first == '0'
+        assert isinstance(second, RuntimeError)
+
+    asyncio.run(main())
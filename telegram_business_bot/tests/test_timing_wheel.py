@@ -0,0 +1,114 @@
+"""
+Колесо таймеров против простой модели: словарь ключ -> шаг срабатывания
+"""
+import math
+import random
+
+import pytest
+
+from timing_wheel import TimingWheel
+
+
+class ReferenceWheel:
+    """Та же семантика без уровней: наступило всё, чей шаг не позже текущего"""
+
+    def __init__(self, tick: float, now: float):
+        self.tick = tick
+        self.current = math.floor(now / tick)
+        self.due = {}
+
+    def add(self, key, due_at: float):
+        self.due[key] = math.ceil(due_at / self.tick)
+
+    def cancel(self, key) -> bool:
+        return self.due.pop(key, None) is not None
+
+    def advance(self, now: float) -> set:
+        self.current = max(self.current, math.floor(now / self.tick))
+        expired = {key for key, due_tick in self.due.items() if due_tick <= self.current}
+        for key in expired:
+            del self.due[key]
+        return expired
+
+
+def check_next_expiry(wheel: TimingWheel, model: ReferenceWheel):
+    next_expiry = wheel.next_expiry()
+    if not model.due:
+        assert next_expiry is None
+        return
+    # Оценка снизу: раньше next_expiry ничего не наступает (просроченные
+    # наступают на текущем шаге)
+    assert next_expiry is not None
+    assert next_expiry <= max(min(model.due.values()), model.current) * model.tick
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_reference_model(seed):
+    rng = random.Random(seed)
+    tick = 1.0
+    # Маленькое колесо: 4 слота x 3 уровня = 64 шага, дальше - сроки за верхним уровнем
+    now = rng.uniform(0, 1000)
+    wheel = TimingWheel(tick, wheel_size=4, levels=3, now=now)
+    model = ReferenceWheel(tick, now)
+    keys = range(50)
+
+    for _ in range(400):
+        action = rng.random()
+        key = rng.choice(keys)
+        if action < 0.5:
+            # Прошедшие сроки, ближние, через несколько уровней и за пределами колеса
+            due_at = now + rng.choice([-50, -1, 0, 0.5, 3, 10, 40, 70, 300, 5000]) * rng.random() * tick
+            wheel.add(key, due_at)
+            model.add(key, due_at)
+        elif action < 0.65:
+            assert wheel.cancel(key) == model.cancel(key)
+        else:
+            now += rng.choice([0, 0.3, 1, 5, 20, 100, 1000]) * rng.random()
+            expired = wheel.advance(now)
+            assert len(expired) == len(set(expired))
+            assert set(expired) == model.advance(now)
+
+        assert len(wheel) == len(model.due)
+        assert all((key in wheel) == (key in model.due) for key in keys)
+        check_next_expiry(wheel, model)
+
+    # Всё оставшееся рано или поздно наступает
+    now += 10_000
+    assert set(wheel.advance(now)) == model.advance(now)
+    assert len(wheel) == 0
+    assert wheel.next_expiry() is None
+
+
+def test_fires_not_before_due_and_within_one_tick():
+    wheel = TimingWheel(60.0, now=0.0)
+    wheel.add('a', 90.0)
+    assert wheel.advance(119.0) == []
+    assert wheel.advance(120.0) == ['a']
+
+
+def test_past_deadline_fires_on_next_advance():
+    wheel = TimingWheel(60.0, now=6000.0)
+    wheel.add('late', 10.0)
+    assert wheel.next_expiry() <= 6000.0
+    assert wheel.advance(6000.0) == ['late']
+    assert len(wheel) == 0
+
+
+def test_far_future_deadline_cascades_down():
+    # 64 x 4 уровня с шагом в минуту покрывают годы; срок дальше верхнего уровня
+    # ждёт в его последнем слоте и всё равно срабатывает вовремя
+    wheel = TimingWheel(1.0, wheel_size=4, levels=2, now=0.0)
+    wheel.add('far', 1000.0)
+    wheel.add('near', 5.0)
+    assert wheel.advance(999.0) == ['near']
+    assert 'far' in wheel
+    assert wheel.advance(1000.0) == ['far']
+
+
+def test_add_existing_key_moves_timer():
+    wheel = TimingWheel(1.0, now=0.0)
+    wheel.add('a', 10.0)
+    wheel.add('a', 3.0)
+    assert len(wheel) == 1
+    assert wheel.advance(3.0) == ['a']
+    assert wheel.advance(10.0) == []
@@ -0,0 +1,74 @@
+"""
+Буфер отложенной записи (WriteBehindBuffer): повтор после ошибки и дозапись при остановке
+"""
+import asyncio
+
+from db import Database, WriteBehindBuffer
+
+INSERT = "INSERT INTO events (value) VALUES (?)"
+
+
+async def create_table(database: Database):
+    async with database.pool.write() as db:
+        await db.execute("CREATE TABLE events (value INTEGER)")
+
+
+async def written(database: Database) -> list:
+    async with database.pool.read() as db:
+        async with db.execute("SELECT value FROM events ORDER BY rowid") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+
+def run_with_database(tmp_path, check):
+    async def main():
+        database = Database(str(tmp_path / 'test.db'))
+        await database.init_db()
+        try:
+            await check(database)
+        finally:
+            await database.close()
+    asyncio.run(main())
+
+
+def test_failed_flush_is_retried_in_background(tmp_path):
+    async def check(database):
+        # Таблицы ещё нет - первая запись падает
+        buffer = WriteBehindBuffer(database.pool, INSERT, max_rows=100, interval=0.05)
+        buffer.add((1,))
+        buffer.add((2,))
+        await asyncio.sleep(0.1)
+        assert buffer.stats['errors'] == 1
+        assert len(buffer) == 2
+
+        await create_table(database)
+        buffer.add((3,))
+        # Повтор после паузы без новых вызовов flush
+        for _ in range(50):
+            if not len(buffer):
+                break
+            await asyncio.sleep(0.05)
+        assert await written(database) == [1, 2, 3]
+        assert buffer.stats['rows'] == 3
+        await buffer.close()
+
+    run_with_database(tmp_path, check)
+
+
+def test_close_writes_rows_kept_after_failure(tmp_path):
+    async def check(database):
+        buffer = WriteBehindBuffer(database.pool, INSERT, max_rows=100, interval=60)
+        buffer.add((1,))
+        buffer.add((2,))
+        await buffer.flush()
+        assert len(buffer) == 2
+        assert buffer.stats['errors'] == 1
+
+        await create_table(database)
+        buffer.add((3,))
+        await buffer.close()
+        assert len(buffer) == 0
+        assert await written(database) == [1, 2, 3]
+        assert buffer.stats == {'rows': 3, 'flushes': 1, 'errors': 1, 'dropped': 0}
+
+    run_with_database(tmp_path, check)
+
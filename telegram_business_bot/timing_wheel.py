@@ -0,0 +1,163 @@
+"""
+Иерархическое колесо таймеров для отложенных напоминаний
+"""
+import math
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Слотов на уровне и число уровней: при шаге 60 с четыре уровня по 64 слота
+# покрывают ~32 года, более дальние сроки ждут на верхнем уровне
+_WHEEL_SIZE = 64
+_LEVELS = 4
+
+
+class TimingWheel:
+    """
+    Колесо таймеров с шагом tick секунд
+
+    Уровень 0 - wheel_size слотов по одному шагу, каждый следующий уровень -
+    слоты в wheel_size раз шире. Запись кладётся в слот по своему сроку
+    (округлённому вверх до шага), при переходе на новый слот верхнего уровня
+    его записи опускаются ниже. Вставка и отмена за O(1), advance отдаёт
+    все наступившие за пройденные шаги записи разом. Срок срабатывания -
+    не раньше заданного и не позже чем на шаг.
+    """
+
+    def __init__(self, tick: float = 60.0, wheel_size: int = _WHEEL_SIZE, levels: int = _LEVELS, now: float = 0.0):
+        self.tick = tick
+        self.wheel_size = max(2, wheel_size)
+        self.levels = max(1, levels)
+        # Последний обработанный шаг
+        self._current = math.floor(now / tick)
+        self._slots: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(self.wheel_size)] for _ in range(self.levels)
+        ]
+        # Наступившие при вставке, отдаются следующим advance
+        self._ready: Dict[Hashable, int] = {}
+        # ключ -> (шаг срабатывания, слот); слот None - в _ready
+        self._entries: Dict[Hashable, Tuple[int, Optional[Dict[Hashable, int]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def add(self, key: Hashable, due_at: float):
+        """Поставить таймер (существующий с тем же ключом переносится)"""
+        self.cancel(key)
+        self._place(key, math.ceil(due_at / self.tick))
+
+    def cancel(self, key: Hashable) -> bool:
+        """Снять таймер, False - его не было"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        slot = entry[1]
+        (self._ready if slot is None else slot).pop(key, None)
+        return True
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Продвинуть колесо до now и вернуть ключи наступивших таймеров"""
+        expired = list(self._ready)
+        self._ready.clear()
+        for key in expired:
+            del self._entries[key]
+
+        target = math.floor(now / self.tick)
+        if not self._entries:
+            self._current = max(self._current, target)
+            return expired
+
+        size = self.wheel_size
+        while self._current < target:
+            if target - self._current > size:
+                # Пропускаем пустые шаги до ближайшего непустого слота
+                next_tick = round(self.next_expiry() / self.tick)
+                self._current = max(self._current, min(target, next_tick) - 1)
+            self._current += 1
+            current = self._current
+
+            # Опускаем записи верхних уровней, чей слот начинается с этого шага
+            span = size
+            for level in range(1, self.levels):
+                if current % span:
+                    break
+                slot = self._slots[level][(current // span) % size]
+                if slot:
+                    cascaded = list(slot.items())
+                    slot.clear()
+                    for key, due_tick in cascaded:
+                        self._place(key, due_tick)
+                span *= size
+
+            slot = self._slots[0][current % size]
+            if slot:
+                entries = list(slot.items())
+                slot.clear()
+                for key, due_tick in entries:
+                    if due_tick > current:
+                        # Дальний срок при одном уровне - ждём следующий оборот
+                        self._place(key, due_tick)
+                    else:
+                        expired.append(key)
+                        del self._entries[key]
+
+            if self._ready:
+                # Опущенные записи, чей срок уже наступил
+                expired.extend(self._ready)
+                for key in self._ready:
+                    del self._entries[key]
+                self._ready.clear()
+
+            if not self._entries:
+                self._current = target
+                break
+
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        """
+        Время, когда advance может что-то вернуть (None - таймеров нет)
+
+        Для записей верхних уровней это начало их слота, то есть оценка снизу.
+        """
+        if self._ready:
+            return self._current * self.tick
+        if not self._entries:
+            return None
+
+        # Слот верхнего уровня может опускаться раньше, чем наступит
+        # ближайшая запись нижнего, поэтому смотрим все уровни
+        size = self.wheel_size
+        span = 1
+        earliest: Optional[int] = None
+        for level in range(self.levels):
+            slots = self._slots[level]
+            base = self._current // span
+            for offset in range(1, size + 1):
+                if slots[(base + offset) % size]:
+                    start = (base + offset) * span
+                    if earliest is None or start < earliest:
+                        earliest = start
+                    break
+            span *= size
+        return None if earliest is None else earliest * self.tick
+
+    def _place(self, key: Hashable, due_tick: int):
+        delta = due_tick - self._current
+        if delta <= 0:
+            self._ready[key] = due_tick
+            self._entries[key] = (due_tick, None)
+            return
+
+        size = self.wheel_size
+        span = 1
+        for level in range(self.levels):
+            if delta < span * size or level == self.levels - 1:
+                # Сроки дальше верхнего уровня ждут в его последнем слоте
+                slot_tick = min(due_tick, self._current + span * size - 1)
+                slot = self._slots[level][(slot_tick // span) % size]
+                slot[key] = due_tick
+                self._entries[key] = (due_tick, slot)
+                return
+            span *= size
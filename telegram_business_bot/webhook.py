@@ -0,0 +1,85 @@
+"""
+Приём апдейтов через webhook (альтернатива long polling)
+"""
+import asyncio
+import logging
+from typing import Any, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик webhook с ограничением числа одновременно обрабатываемых апдейтов
+
+    Апдейт обрабатывается до ответа на HTTP-запрос (handle_in_background=False):
+    время ответа webhook равно времени обработки, а когда все слоты заняты,
+    новые запросы ждут, и Telegram сам притормаживает доставку.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=False, **kwargs)
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await super().handle(request)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, allowed_updates: List[str]):
+    """Запустить webhook-сервер и работать до отмены"""
+    app = web.Application()
+    BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    # startup/shutdown диспетчера привязываются к жизненному циклу приложения
+    setup_application(app, dp, bot=bot)
+
+    await serve_webhook(app, bot, allowed_updates)
+
+
+async def serve_webhook(app: web.Application, bot: Bot, allowed_updates: List[str]):
+    """
+    Поднять aiohttp-приложение с обработчиком на WEBHOOK_PATH и работать до отмены
+
+    Если задан WEBHOOK_URL, webhook регистрируется в Telegram.
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info(f"Webhook слушает http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=allowed_updates,
+                max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100)
+            )
+            logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        else:
+            logger.info("WEBHOOK_URL не задан, setWebhook не вызывается")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()